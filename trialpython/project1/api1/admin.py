@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.utils.html import mark_safe
-from .models import CustomUser, TravelOrder, Signature, Fund, Transportation, EmployeePosition
+from .models import CustomUser, TravelOrder, Signature, Fund, Transportation, EmployeePosition, OutboxMessage
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -41,4 +41,11 @@ admin.site.register(CustomUser, CustomUserAdmin)
 
 
 admin.site.register(TravelOrder, TravelOrderAdmin)
-admin.site.register(Signature)
\ No newline at end of file
+admin.site.register(Signature)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['topic', 'created_at', 'available_at', 'attempts']
+    list_filter = ['topic']
+    readonly_fields = ['created_at']
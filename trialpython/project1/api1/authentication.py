@@ -1,4 +1,4 @@
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
 from django.conf import settings
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -10,4 +10,12 @@ class CookieJWTAuthentication(JWTAuthentication):
             return None
         
         validated_token = self.get_validated_token(raw_token)
-        return self.get_user(validated_token), validated_token 
\ No newline at end of file
+        return self.get_user(validated_token), validated_token 
+
+
+class CookieJWTTokenUserAuthentication(CookieJWTAuthentication, JWTStatelessUserAuthentication):
+    """
+    Cookie JWT auth that trusts the token's user id instead of loading the user
+    (request.user is a simplejwt TokenUser). For hot read-only endpoints only:
+    a deactivated user keeps access until the token expires.
+    """
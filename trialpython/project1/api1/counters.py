@@ -0,0 +1,115 @@
+"""
+Per-user dashboard counters.
+
+Views capture an order's counter_state() before changing it and call
+record_transition() with that state inside the same transaction as the save,
+so DashboardCounter rows move together with the orders they summarise.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import DashboardCounter, TravelOrder
+
+COUNTER_FIELDS = ('total_orders', 'approved', 'rejected', 'pending_approvals')
+
+
+def counter_state(order):
+    """The part of an order the counters depend on, or None for an order that does not exist yet."""
+    if order is None or order.pk is None:
+        return None
+    return (order.prepared_by_id, order.current_approver_id, order.status_outcome)
+
+
+def state_counts(state):
+    counts = defaultdict(Counter)
+    if state is None:
+        return counts
+    prepared_by, approver, outcome = state
+    if prepared_by:
+        counts[prepared_by]['total_orders'] += 1
+        if outcome == TravelOrder.OUTCOME_APPROVED:
+            counts[prepared_by]['approved'] += 1
+        elif outcome == TravelOrder.OUTCOME_REJECTED:
+            counts[prepared_by]['rejected'] += 1
+    if approver and outcome == TravelOrder.OUTCOME_PENDING:
+        counts[approver]['pending_approvals'] += 1
+    return counts
+
+
+def record_transition(before, order):
+    """Apply the difference between an order's previous state and its saved state."""
+    record_transitions([(before, order)])
+
+
+def record_transitions(transitions):
+    """record_transition() for many (before, order) pairs, one UPDATE per affected user."""
+    changes = defaultdict(Counter)
+    for before, order in transitions:
+        for user_id, counts in state_counts(counter_state(order)).items():
+            changes[user_id].update(counts)
+        for user_id, counts in state_counts(before).items():
+            changes[user_id].subtract(counts)
+
+    for user_id, change in changes.items():
+        updates = {field: F(field) + n for field, n in change.items() if n}
+        if not updates:
+            continue
+        if not DashboardCounter.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **updates):
+            # First transition for this user since the table was filled: count from source,
+            # which already includes the change saved in this transaction.
+            rebuild_counters([user_id])
+
+
+def source_counts(user_ids):
+    """Counters computed from TravelOrder for the given users, two grouped queries."""
+    counts = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    prepared = TravelOrder.objects.filter(prepared_by__in=user_ids).values('prepared_by').annotate(
+        total_orders=Count('id'),
+        approved=Count('id', filter=Q(status_outcome=TravelOrder.OUTCOME_APPROVED)),
+        rejected=Count('id', filter=Q(status_outcome=TravelOrder.OUTCOME_REJECTED)),
+    ).order_by()
+    for row in prepared:
+        counts[row.pop('prepared_by')].update(row)
+    pending = TravelOrder.objects.filter(
+        current_approver__in=user_ids, status_outcome=TravelOrder.OUTCOME_PENDING,
+    ).values('current_approver').annotate(pending_approvals=Count('id')).order_by()
+    for row in pending:
+        counts[row['current_approver']]['pending_approvals'] = row['pending_approvals']
+    return counts
+
+
+def stale_counters(user_ids):
+    """
+    Return {user_id: (stored, expected)} for users whose row disagrees with the source.
+    A missing row only counts when the user has something to show; get_counters()
+    creates empty rows on first read.
+    """
+    expected = source_counts(user_ids)
+    stored = {
+        row.pop('user_id'): row
+        for row in DashboardCounter.objects.filter(user_id__in=user_ids).values('user_id', *COUNTER_FIELDS)
+    }
+    empty = dict.fromkeys(COUNTER_FIELDS, 0)
+    return {
+        user_id: (stored.get(user_id), counts)
+        for user_id, counts in expected.items()
+        if stored.get(user_id, empty) != counts
+    }
+
+
+def rebuild_counters(user_ids):
+    """Overwrite the counters of the given users from source; returns how many rows changed."""
+    stale = stale_counters(user_ids)
+    for user_id, (stored, counts) in stale.items():
+        DashboardCounter.objects.update_or_create(user_id=user_id, defaults=counts)
+    return len(stale)
+
+
+def get_counters(user):
+    """The user's counter row, built from source the first time it is needed."""
+    counter = DashboardCounter.objects.filter(user=user).first()
+    if counter is None:
+        counter, _ = DashboardCounter.objects.get_or_create(user=user, defaults=source_counts([user.id])[user.id])
+    return counter
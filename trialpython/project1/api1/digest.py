@@ -0,0 +1,88 @@
+"""
+Daily digests: one email per user listing the notifications they received on a
+day and have not read yet, in place of reading each one in the app.
+
+send_digests() walks the users with such notifications in id order, a batch at
+a time: one query for the batch's users, one for their notifications, and a
+single send_messages() call on one open connection of the configured
+EMAIL_BACKEND. So a run costs a fixed number of queries per batch, and with the
+file or locmem backend it runs (and can be timed) without a mail server.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import CustomUser, Notification
+
+
+def digest_period(day):
+    """The [start, end) datetimes of local date `day`."""
+    start = datetime.combine(day, time.min)
+    end = datetime.combine(day + timedelta(days=1), time.min)
+    if settings.USE_TZ:
+        start, end = timezone.make_aware(start), timezone.make_aware(end)
+    return start, end
+
+
+def unread_in(start, end):
+    return Notification.objects.filter(is_read=False, created_at__gte=start, created_at__lt=end)
+
+
+def recipient_batches(start, end, batch_size=500, user_ids=None):
+    """Lists of active users with an email address and unread notifications from [start, end), by id."""
+    users = CustomUser.objects.filter(is_active=True).exclude(email='').filter(
+        Exists(unread_in(start, end).filter(user=OuterRef('pk'))),
+    ).only('id', 'email', 'username', 'first_name', 'last_name').order_by('id')
+    if user_ids:
+        users = users.filter(id__in=user_ids)
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+
+def build_digest(user, day, notifications):
+    """The digest email for `user`, listing `notifications` (newest first), at most NOTIFICATION_DIGEST_MAX_ITEMS of them."""
+    shown = notifications[:settings.NOTIFICATION_DIGEST_MAX_ITEMS]
+    count = len(notifications)
+    lines = [
+        f"Hello {user.first_name or user.username},",
+        "",
+        f"You have {count} unread notification{'s' if count != 1 else ''} from {day:%B %d, %Y}:",
+        "",
+    ]
+    for notification in shown:
+        lines.append(f"- {notification.title} ({notification.travel_order.destination})")
+        lines.append(f"  {notification.message}")
+    if count > len(shown):
+        lines.append(f"...and {count - len(shown)} more.")
+    lines += ["", "Sign in to the travel order system to review them."]
+    return EmailMessage(
+        subject=f"Travel order notifications for {day:%B %d, %Y} ({count})",
+        body="\n".join(lines),
+        to=[user.email],
+    )
+
+
+def send_digests(day, batch_size=500, user_ids=None, connection=None):
+    """Send the digests for local date `day`; yields (users, emails sent) after each batch."""
+    start, end = digest_period(day)
+    connection = connection or get_connection()
+    with connection:
+        for users in recipient_batches(start, end, batch_size, user_ids):
+            by_user = defaultdict(list)
+            rows = unread_in(start, end).filter(user__in=users).select_related('travel_order').only(
+                'user_id', 'title', 'message', 'travel_order__destination',
+            ).order_by('user_id', '-id')
+            for notification in rows:
+                by_user[notification.user_id].append(notification)
+            messages = [build_digest(user, day, by_user[user.id]) for user in users if by_user[user.id]]
+            sent = connection.send_messages(messages) or 0
+            yield len(users), sent
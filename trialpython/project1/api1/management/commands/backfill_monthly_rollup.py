@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api1.models import MonthlyTravelRollup
+from api1.rollups import rebuild_rollup, source_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly travel rollup behind the admin and director charts from the travel order tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First month to rebuild, as YYYY-MM. Defaults to all history.")
+        parser.add_argument('--verify', action='store_true', help="Only compare the rollup with the source; exit non-zero on drift.")
+
+    def handle(self, *args, since=None, verify=False, **options):
+        start = None
+        if since:
+            try:
+                start = datetime.strptime(since, '%Y-%m').date()
+            except ValueError:
+                raise CommandError("--since must look like YYYY-MM.")
+
+        if verify:
+            self.verify(start)
+            return
+
+        rows = rebuild_rollup(start)
+        scope = f"from {since}" if since else "for all months"
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt monthly rollup {scope}: {rows} rows."))
+
+    def verify(self, start):
+        expected = source_rollup(start)
+        stored = MonthlyTravelRollup.objects.exclude(count=0)
+        if start:
+            stored = stored.filter(month__gte=start)
+        stored = {(row.month, row.employee_type): row.count for row in stored}
+
+        drift = sorted(key for key in set(expected) | set(stored) if expected.get(key, 0) != stored.get(key, 0))
+        for month, employee_type in drift:
+            self.stdout.write(
+                f"{month:%Y-%m} {employee_type}: stored {stored.get((month, employee_type), 0)}, "
+                f"expected {expected.get((month, employee_type), 0)}"
+            )
+        if drift:
+            raise CommandError(f"{len(drift)} monthly rollup rows disagree with the source.")
+        self.stdout.write(self.style.SUCCESS(f"Monthly rollup matches the source ({len(stored)} rows)."))
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api1 import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the handlers of queued outbox messages (notifications and other side effects of "
+        "workflow transitions). Keep one or more of these running next to the web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--once', action='store_true', help="Exit once no messages are due.")
+        parser.add_argument('--poll', type=float, default=None,
+                            help="Seconds to wait when idle (default: OUTBOX_POLL_INTERVAL).")
+        parser.add_argument('--max-attempts', type=int, default=None,
+                            help="Give up on a message after this many failures (default: OUTBOX_MAX_ATTEMPTS).")
+
+    def handle(self, *args, batch_size=100, once=False, poll=None, max_attempts=None, **options):
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        poll = settings.OUTBOX_POLL_INTERVAL if poll is None else poll
+        verbosity = options.get('verbosity', 1)
+
+        if once:
+            handled, failed = outbox.drain(batch_size, max_attempts)
+            self.stdout.write(self.style.SUCCESS(f"Handled {handled} outbox messages, {failed} failed."))
+            return
+
+        try:
+            while True:
+                handled, failed = outbox.process_batch(batch_size, max_attempts)
+                if failed:
+                    self.stderr.write(f"{failed} outbox messages failed and will be retried.")
+                if handled and verbosity > 1:
+                    self.stdout.write(f"Handled {handled} outbox messages.")
+                if not handled and not failed:
+                    time.sleep(poll)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped.")
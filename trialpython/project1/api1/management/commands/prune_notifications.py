@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api1.notifications import prune_read_notifications
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete read notifications older than NOTIFICATION_RETENTION_DAYS, in small batches. "
+        "Safe to run while the site is up, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Keep read notifications this many days (default: NOTIFICATION_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0,
+                            help="Seconds to pause between batches, to leave room for other writers.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted.")
+
+    def handle(self, *args, days=None, batch_size=500, sleep=0, dry_run=False, **options):
+        days = settings.NOTIFICATION_RETENTION_DAYS if days is None else days
+        if days < 1:
+            raise CommandError("--days must be at least 1.")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        cutoff = timezone.now() - timedelta(days=days)
+        verb = "Would delete" if dry_run else "Deleted"
+
+        started = last_report = time.monotonic()
+        scanned = deleted = 0
+        for last_id, batch_scanned, batch_deleted in prune_read_notifications(cutoff, batch_size, dry_run):
+            scanned += batch_scanned
+            deleted += batch_deleted
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                self.stdout.write(
+                    f"... up to id {last_id}: {scanned} scanned, {deleted} {verb.lower()}"
+                    f" ({self.rate(deleted, started)} rows/sec)"
+                )
+            if sleep:
+                time.sleep(sleep)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} read notifications older than {days} days"
+            f" ({scanned} scanned, {self.rate(deleted, started)} rows/sec)."
+        ))
+
+    @staticmethod
+    def rate(rows, started):
+        elapsed = time.monotonic() - started
+        return round(rows / elapsed) if elapsed > 0 else rows
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api1.counters import rebuild_counters, stale_counters
+from api1.utils import user_id_batches
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-user dashboard counters from the travel order tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report counters that disagree with the source; exit non-zero if any do.")
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help="Limit to this user id (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, verify=False, user_ids=None, batch_size=500, **options):
+        checked = changed = 0
+        for batch in user_id_batches(batch_size, user_ids):
+            checked += len(batch)
+            if verify:
+                for user_id, (stored, expected) in stale_counters(batch).items():
+                    changed += 1
+                    self.stdout.write(f"user {user_id}: stored {stored}, expected {expected}")
+            else:
+                with transaction.atomic():
+                    changed += rebuild_counters(batch)
+
+        if verify:
+            if changed:
+                raise CommandError(f"{changed} of {checked} users have stale dashboard counters.")
+            self.stdout.write(self.style.SUCCESS(f"All {checked} users' dashboard counters match."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt dashboard counters: {changed} of {checked} users changed."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api1.notifications import reconcile_unread, stale_unread
+from api1.utils import user_id_batches
+
+
+class Command(BaseCommand):
+    help = "Compare the cached unread-notification counts with the notification table and fix the stale ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help="Only report stale counts; exit non-zero if any are.")
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help="Limit to this user id (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, verify=False, user_ids=None, batch_size=500, **options):
+        checked = stale = 0
+        for batch in user_id_batches(batch_size, user_ids):
+            checked += len(batch)
+            if verify:
+                for user_id, (cached, actual) in stale_unread(batch).items():
+                    stale += 1
+                    self.stdout.write(f"user {user_id}: cached {cached}, actual {actual}")
+            else:
+                stale += reconcile_unread(batch)
+
+        if verify:
+            if stale:
+                raise CommandError(f"{stale} of {checked} users have stale unread counts.")
+            self.stdout.write(self.style.SUCCESS(f"All cached unread counts of {checked} users match."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reconciled unread counts: {stale} of {checked} users were stale."))
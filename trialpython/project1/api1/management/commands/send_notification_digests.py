@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api1.digest import send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Email each user one digest of the notifications they received on a day and have not read. "
+        "Run once a day, e.g. from cron shortly after midnight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Day to send digests for, YYYY-MM-DD (default: yesterday).")
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help="Limit to this user id (repeatable).")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, date=None, user_ids=None, batch_size=500, **options):
+        if date:
+            day = parse_date(date)
+            if day is None:
+                raise CommandError("--date must be YYYY-MM-DD.")
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        started = time.monotonic()
+        users = sent = 0
+        for batch_users, batch_sent in send_digests(day, batch_size, user_ids):
+            users += batch_users
+            sent += batch_sent
+            if options.get('verbosity', 1) > 1:
+                self.stdout.write(f"... {users} users, {sent} digests sent")
+
+        elapsed = time.monotonic() - started
+        rate = round(sent / elapsed) if elapsed > 0 else sent
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {sent} digests for {day.isoformat()} to {users} users in {elapsed:.2f}s ({rate} emails/sec)."
+        ))
@@ -0,0 +1,133 @@
+"""
+Approver queue metrics: how many orders wait on each approver and stage, how long
+they have waited, and how many decisions each stage makes per day.
+
+An order's wait starts at its latest TravelOrderEvent (the transition that put it
+in the current queue), or at submission for orders filed before the event log.
+A waiting order counts toward the workflow stage it sits at (its approval_stage
+in the filer's chain), the stage its decision will be recorded under. Its
+approver's own office is not used, because an order whose stage has no head
+goes to the director.
+Everything is read with three grouped queries and cached for APPROVER_METRICS_TTL
+seconds, since the numbers are for spotting slow stages, not for live tracking.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import TravelOrder, TravelOrderEvent
+from .routing import OFFICES, approval_chain
+from .workflow import stage_at
+
+DECISION_ACTIONS = (TravelOrder.STATUS_APPROVED, TravelOrder.STATUS_FINAL_APPROVED, TravelOrder.STATUS_REJECTED)
+PERCENTILES = (50, 90)
+STAGE_LABELS = {office.code: office.label for office in OFFICES}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted, non-empty list."""
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def age_summary(ages):
+    """Depth and wait percentiles, in hours, for a list of waits in seconds."""
+    ages = sorted(ages)
+    summary = {'depth': len(ages)}
+    for p in PERCENTILES:
+        summary[f'p{p}_hours'] = round(percentile(ages, p) / 3600, 1) if ages else None
+    summary['max_hours'] = round(ages[-1] / 3600, 1) if ages else None
+    return summary
+
+
+def pending_waits(now):
+    """(approver id, approver name, stage, seconds waiting) for every order in an approver's queue."""
+    rows = TravelOrder.objects.filter(
+        status_outcome=TravelOrder.OUTCOME_PENDING, current_approver__isnull=False,
+    ).annotate(
+        entered_at=Coalesce(Max('events__created_at'), 'submitted_at'),
+    ).values_list(
+        'current_approver', 'current_approver__first_name', 'current_approver__last_name',
+        'prepared_by__employee_type', 'prepared_by__user_level', 'approval_stage', 'entered_at',
+    ).order_by()
+    return [
+        (
+            approver, f"{first} {last}".strip(),
+            stage_at(approval_chain(filer_type, filer_level), approval_stage),
+            max((now - entered_at).total_seconds(), 0),
+        )
+        for approver, first, last, filer_type, filer_level, approval_stage, entered_at in rows
+    ]
+
+
+def compute_metrics(days=30):
+    """Queue depth and waits per stage and approver, and decisions per day over the last `days` days."""
+    now = timezone.now()
+    day_list = [timezone.localdate(now) - timedelta(days=i) for i in reversed(range(days))]
+    since = datetime.combine(day_list[0], time.min)
+    if settings.USE_TZ:
+        since = timezone.make_aware(since)
+
+    by_stage, by_approver, approver_info = defaultdict(list), defaultdict(list), {}
+    for approver, name, stage, seconds in pending_waits(now):
+        by_stage[stage].append(seconds)
+        by_approver[approver].append(seconds)
+        approver_info[approver] = (name, stage)
+
+    decisions = TravelOrderEvent.objects.filter(created_at__gte=since, action__in=DECISION_ACTIONS)
+    daily = Counter()
+    for row in decisions.annotate(day=TruncDate('created_at')).values('day', 'stage').annotate(n=Count('id')).order_by():
+        daily[row['day'], row['stage']] = row['n']
+    decided = {
+        row['actor']: row['n']
+        for row in decisions.filter(actor__isnull=False).values('actor').annotate(n=Count('id')).order_by()
+    }
+
+    stages = [office.code for office in OFFICES]
+    approvers = [
+        {
+            'approver': approver,
+            'name': approver_info[approver][0],
+            'stage': approver_info[approver][1],
+            'decided': decided.get(approver, 0),
+            **age_summary(ages),
+        }
+        for approver, ages in by_approver.items()
+    ]
+    # Longest waits first: these are the queues holding travel up
+    approvers.sort(key=lambda row: (-row['max_hours'], row['approver']))
+
+    return {
+        'generated_at': now,
+        'days': days,
+        'stages': [
+            {
+                'stage': stage,
+                'label': STAGE_LABELS[stage],
+                'decided': sum(daily[day, stage] for day in day_list),
+                **age_summary(by_stage.get(stage, [])),
+            }
+            for stage in stages
+        ],
+        'approvers': approvers,
+        'throughput': {
+            'labels': [day.isoformat() for day in day_list],
+            'datasets': [
+                {'label': STAGE_LABELS[stage], 'data': [daily[day, stage] for day in day_list]}
+                for stage in stages
+            ],
+        },
+    }
+
+
+def approver_metrics(days=30):
+    """compute_metrics(), served from the cache for APPROVER_METRICS_TTL seconds."""
+    return cache.get_or_set(
+        f'api1:approver-metrics:{days}', lambda: compute_metrics(days), settings.APPROVER_METRICS_TTL,
+    )
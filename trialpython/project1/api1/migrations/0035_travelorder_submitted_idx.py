@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0034_travelorder_distance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['submitted_at', 'id'], name='travelorder_submitted_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import base64
+import binascii
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def parse_data_url(data_url):
+    header, sep, payload = data_url.partition(',')
+    if sep and header.startswith('data:') and header.endswith(';base64'):
+        try:
+            return header[5:-7] or 'application/octet-stream', base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            pass
+    return 'application/octet-stream', data_url.encode('utf-8')
+
+
+def move_signatures_to_image_store(apps, schema_editor):
+    SignatureImage = apps.get_model('api1', 'SignatureImage')
+    image_ids = {}
+
+    def image_id_for(data_url):
+        content_type, data = parse_data_url(data_url or '')
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in image_ids:
+            image, _ = SignatureImage.objects.get_or_create(
+                digest=digest,
+                defaults={'content_type': content_type, 'data': data},
+            )
+            image_ids[digest] = image.id
+        return image_ids[digest]
+
+    for model_name in ('Signature', 'EmployeeSignature'):
+        model = apps.get_model('api1', model_name)
+        rows = model.objects.filter(image__isnull=True).only('id', 'signature_data').order_by('id')
+        for row in rows.iterator(chunk_size=500):
+            model.objects.filter(id=row.id).update(image_id=image_id_for(row.signature_data))
+
+
+def restore_inline_signatures(apps, schema_editor):
+    for model_name in ('Signature', 'EmployeeSignature'):
+        model = apps.get_model('api1', model_name)
+        for row in model.objects.select_related('image').order_by('id').iterator(chunk_size=500):
+            encoded = base64.b64encode(bytes(row.image.data)).decode('ascii')
+            model.objects.filter(id=row.id).update(
+                signature_data=f"data:{row.image.content_type};base64,{encoded}"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0035_travelorder_submitted_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignatureImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('content_type', models.CharField(default='image/png', max_length=50)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='employeesignature',
+            name='image',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='employee_signatures', to='api1.signatureimage'),
+        ),
+        migrations.AddField(
+            model_name='signature',
+            name='image',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='api1.signatureimage'),
+        ),
+        migrations.RunPython(move_signatures_to_image_store, restore_inline_signatures),
+    ]
@@ -0,0 +1,41 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0036_signatureimage'),
+    ]
+
+    operations = [
+        # Give the inline columns a default first so this migration can be reversed.
+        migrations.AlterField(
+            model_name='employeesignature',
+            name='signature_data',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='signature',
+            name='signature_data',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='employeesignature',
+            name='signature_data',
+        ),
+        migrations.RemoveField(
+            model_name='signature',
+            name='signature_data',
+        ),
+        migrations.AlterField(
+            model_name='employeesignature',
+            name='image',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='employee_signatures', to='api1.signatureimage'),
+        ),
+        migrations.AlterField(
+            model_name='signature',
+            name='image',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='api1.signatureimage'),
+        ),
+    ]
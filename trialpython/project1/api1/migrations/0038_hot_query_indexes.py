@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0037_remove_inline_signature_data'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['current_approver', 'status', 'submitted_at'], name='travelorder_approver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['prepared_by', 'submitted_at'], name='travelorder_prepared_by_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['date_travel_from', 'date_travel_to'], name='travelorder_travel_dates_idx'),
+        ),
+    ]
@@ -0,0 +1,137 @@
+from django.db import migrations, models
+
+PLACED, RESUBMITTED, APPROVED, FINAL_APPROVED, REJECTED = range(5)
+PENDING, OUTCOME_APPROVED, OUTCOME_REJECTED = range(3)
+
+OFFICES = [
+    ('urdaneta_csc', 'Urdaneta CSC'),
+    ('sison_csc', 'Sison CSC'),
+    ('pugo_csc', 'Pugo CSC'),
+    ('sudipen_csc', 'Sudipen CSC'),
+    ('tagudin_csc', 'Tagudin CSC'),
+    ('banayoyo_csc', 'Banayoyo CSC'),
+    ('dingras_csc', 'Dingras CSC'),
+    ('pangasinan_po', 'Pangasinan PO'),
+    ('ilocossur_po', 'Ilocos Sur PO'),
+    ('ilocosnorte_po', 'Ilocos Norte PO'),
+    ('launion_po', 'La Union PO'),
+    ('tmsd', 'TMSD'),
+    ('afsd', 'AFSD'),
+    ('regional', 'Regional'),
+]
+
+PLACED_LABEL = 'Travel order is placed'
+RESUBMITTED_LABEL = 'Travel Order Resubmitted'
+
+
+def office_labels(code, label):
+    """The approve/reject sentences the approval view wrote for an office, frozen here."""
+    if code == 'regional':
+        title = 'Regional Director'
+    elif code == 'tmsd':
+        title = f'{label} chief'
+    elif code == 'afsd':
+        title = f'{label} Chief'
+    else:
+        title = f'{label} head'
+    return (
+        f'The travel order has been approved by the {title}',
+        f'The travel order has been rejected by the {title}',
+    )
+
+
+def label_table():
+    """(code, stage) -> label, for every status sentence the app has produced."""
+    table = {(PLACED, None): PLACED_LABEL, (RESUBMITTED, None): RESUBMITTED_LABEL}
+    for code, label in OFFICES:
+        approve, reject = office_labels(code, label)
+        table[(FINAL_APPROVED if code == 'regional' else APPROVED, code)] = approve
+        table[(REJECTED, code)] = reject
+    return table
+
+
+def outcome_for(code):
+    if code == REJECTED:
+        return OUTCOME_REJECTED
+    if code == FINAL_APPROVED:
+        return OUTCOME_APPROVED
+    return PENDING
+
+
+def parse_status(status):
+    """Map a stored status sentence to (code, stage); unknown sentences keep only their verb."""
+    by_label = {label.lower(): key for key, label in label_table().items()}
+    text = (status or '').strip().rstrip('.').lower()
+    if text in by_label:
+        return by_label[text]
+    if 'rejected' in text:
+        return REJECTED, None
+    if 'approved' in text:
+        return APPROVED, None
+    if 'resubmitted' in text:
+        return RESUBMITTED, None
+    return PLACED, None
+
+
+def split_status(apps, schema_editor):
+    TravelOrder = apps.get_model('api1', 'TravelOrder')
+    for status in TravelOrder.objects.values_list('status', flat=True).distinct():
+        code, stage = parse_status(status)
+        TravelOrder.objects.filter(status=status).update(
+            status_code=code, status_stage=stage, status_outcome=outcome_for(code),
+        )
+
+
+def join_status(apps, schema_editor):
+    TravelOrder = apps.get_model('api1', 'TravelOrder')
+    table = label_table()
+    pairs = TravelOrder.objects.values_list('status_code', 'status_stage').distinct()
+    for code, stage in pairs:
+        label = table.get((code, stage)) or ('Rejected' if code == REJECTED else 'Approved')
+        TravelOrder.objects.filter(status_code=code, status_stage=stage).update(status=label)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0038_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='travelorder',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Placed'), (1, 'Resubmitted'), (2, 'Approved'), (3, 'Final approved'), (4, 'Rejected')], default=0),
+        ),
+        migrations.AddField(
+            model_name='travelorder',
+            name='status_stage',
+            field=models.CharField(blank=True, choices=[('urdaneta_csc', 'Urdaneta CSC'), ('sison_csc', 'Sison CSC'), ('pugo_csc', 'Pugo CSC'), ('sudipen_csc', 'Sudipen CSC'), ('tagudin_csc', 'Tagudin CSC'), ('banayoyo_csc', 'Banayoyo CSC'), ('dingras_csc', 'Dingras CSC'), ('pangasinan_po', 'Pangasinan PO'), ('ilocossur_po', 'Ilocos Sur PO'), ('ilocosnorte_po', 'Ilocos Norte PO'), ('launion_po', 'La Union PO'), ('tmsd', 'TMSD'), ('afsd', 'AFSD'), ('regional', 'Regional')], max_length=30, null=True),
+        ),
+        migrations.AddField(
+            model_name='travelorder',
+            name='status_outcome',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Approved'), (2, 'Rejected')], default=0),
+        ),
+        migrations.RunPython(split_status, join_status),
+        migrations.RemoveIndex(
+            model_name='travelorder',
+            name='travelorder_approver_idx',
+        ),
+        migrations.RemoveField(
+            model_name='travelorder',
+            name='status',
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['current_approver', 'status_outcome', 'submitted_at'], name='travelorder_approver_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['prepared_by', 'status_outcome'], name='travelorder_prepared_outc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='travelorder',
+            index=models.Index(fields=['status_outcome', 'status_stage'], name='travelorder_outcome_idx'),
+        ),
+    ]
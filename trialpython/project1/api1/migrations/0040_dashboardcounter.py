@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+PENDING, APPROVED, REJECTED = range(3)
+
+
+def fill_counters(apps, schema_editor):
+    TravelOrder = apps.get_model('api1', 'TravelOrder')
+    DashboardCounter = apps.get_model('api1', 'DashboardCounter')
+    counters = {}
+
+    def counter(user_id):
+        if user_id not in counters:
+            counters[user_id] = DashboardCounter(user_id=user_id)
+        return counters[user_id]
+
+    prepared = TravelOrder.objects.filter(prepared_by__isnull=False).values('prepared_by').annotate(
+        total=Count('id'),
+        approved=Count('id', filter=Q(status_outcome=APPROVED)),
+        rejected=Count('id', filter=Q(status_outcome=REJECTED)),
+    ).order_by()
+    for row in prepared:
+        item = counter(row['prepared_by'])
+        item.total_orders, item.approved, item.rejected = row['total'], row['approved'], row['rejected']
+
+    pending = TravelOrder.objects.filter(current_approver__isnull=False, status_outcome=PENDING).values(
+        'current_approver'
+    ).annotate(total=Count('id')).order_by()
+    for row in pending:
+        counter(row['current_approver']).pending_approvals = row['total']
+
+    DashboardCounter.objects.bulk_create(counters.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0039_travelorder_status_code'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dashboard_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_orders', models.IntegerField(default=0)),
+                ('approved', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+                ('pending_approvals', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:23
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def fill_rollup(apps, schema_editor):
+    TravelOrder = apps.get_model('api1', 'TravelOrder')
+    MonthlyTravelRollup = apps.get_model('api1', 'MonthlyTravelRollup')
+    rows = TravelOrder.objects.filter(employees__employee_type__isnull=False).annotate(
+        month=TruncMonth('submitted_at')
+    ).values('month', 'employees__employee_type').annotate(count=Count('id')).order_by()
+    counts = {}
+    for row in rows:
+        month = row['month']
+        if timezone.is_aware(month):
+            month = timezone.localtime(month)
+        key = (month.date(), row['employees__employee_type'])
+        counts[key] = counts.get(key, 0) + row['count']
+    MonthlyTravelRollup.objects.bulk_create(
+        [MonthlyTravelRollup(month=month, employee_type=t, count=n) for (month, t), n in counts.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0040_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyTravelRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('employee_type', models.CharField(choices=[('urdaneta_csc', 'Urdaneta CSC'), ('sison_csc', 'Sison CSC'), ('pugo_csc', 'Pugo CSC'), ('sudipen_csc', 'Sudipen CSC'), ('tagudin_csc', 'Tagudin CSC'), ('banayoyo_csc', 'Banayoyo CSC'), ('dingras_csc', 'Dingras CSC'), ('pangasinan_po', 'Pangasinan PO'), ('ilocossur_po', 'Ilocos Sur PO'), ('ilocosnorte_po', 'Ilocos Norte PO'), ('launion_po', 'La Union PO'), ('tmsd', 'TMSD'), ('afsd', 'AFSD'), ('regional', 'Regional')], max_length=30)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'employee_type'), name='monthly_rollup_month_type_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_rollup, migrations.RunPython.noop),
+    ]
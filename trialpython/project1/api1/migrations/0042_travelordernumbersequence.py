@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0041_monthlytravelrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelOrderNumberSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0042_travelordernumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='travelorder',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
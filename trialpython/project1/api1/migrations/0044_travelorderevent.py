@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+PLACED, RESUBMITTED, APPROVED, FINAL_APPROVED, REJECTED = range(5)
+
+
+def order_history(order, signatures):
+    """
+    The events an existing order's rows still show: its filing, one approval per
+    signature, and its current rejection or resubmission. Earlier rounds that a
+    resubmission cleared are gone and cannot be recovered.
+    """
+    events = [dict(action=PLACED, actor_id=order['prepared_by_id'], created_at=order['submitted_at'])]
+    for signed_by_id, signed_at, comment in signatures:
+        events.append(dict(action=APPROVED, actor_id=signed_by_id, created_at=signed_at, comment=comment or ''))
+
+    if order['status_code'] == FINAL_APPROVED and signatures:
+        events[-1].update(action=FINAL_APPROVED, stage=order['status_stage'])
+    elif order['status_code'] == REJECTED and order['rejected_at']:
+        events.append(dict(
+            action=REJECTED, actor_id=order['rejected_by_id'], created_at=order['rejected_at'],
+            stage=order['status_stage'], comment=order['rejection_comment'] or '',
+        ))
+    elif order['is_resubmitted'] and order['status_code'] in (PLACED, RESUBMITTED):
+        # Not approved since, so every signature belongs to the rounds before it
+        events.append(dict(action=RESUBMITTED, actor_id=order['prepared_by_id'], created_at=events[-1]['created_at']))
+    return events
+
+
+def fill_events(apps, schema_editor):
+    TravelOrder = apps.get_model('api1', 'TravelOrder')
+    TravelOrderEvent = apps.get_model('api1', 'TravelOrderEvent')
+    Signature = apps.get_model('api1', 'Signature')
+
+    orders = TravelOrder.objects.order_by('id').values(
+        'id', 'prepared_by_id', 'submitted_at', 'status_code', 'status_stage', 'is_resubmitted',
+        'rejected_by_id', 'rejected_at', 'rejection_comment',
+    )
+    batch = []
+    for order in orders.iterator(chunk_size=500):
+        batch.append(order)
+        if len(batch) == 500:
+            write_events(TravelOrderEvent, Signature, batch)
+            batch = []
+    write_events(TravelOrderEvent, Signature, batch)
+
+
+def write_events(TravelOrderEvent, Signature, orders):
+    if not orders:
+        return
+    signatures = {order['id']: [] for order in orders}
+    rows = Signature.objects.filter(order_id__in=signatures).order_by('signed_at', 'id').values_list(
+        'order_id', 'signed_by_id', 'signed_at', 'comment'
+    )
+    for order_id, *signature in rows:
+        signatures[order_id].append(signature)
+
+    TravelOrderEvent.objects.bulk_create(
+        [
+            TravelOrderEvent(travel_order_id=order['id'], **event)
+            for order in orders
+            for event in order_history(order, signatures[order['id']])
+        ],
+        batch_size=500,
+    )
+
+
+def drop_events(apps, schema_editor):
+    apps.get_model('api1', 'TravelOrderEvent').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0043_travelorder_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TravelOrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.PositiveSmallIntegerField(choices=[(0, 'Placed'), (1, 'Resubmitted'), (2, 'Approved'), (3, 'Final approved'), (4, 'Rejected')])),
+                ('stage', models.CharField(blank=True, choices=[('urdaneta_csc', 'Urdaneta CSC'), ('sison_csc', 'Sison CSC'), ('pugo_csc', 'Pugo CSC'), ('sudipen_csc', 'Sudipen CSC'), ('tagudin_csc', 'Tagudin CSC'), ('banayoyo_csc', 'Banayoyo CSC'), ('dingras_csc', 'Dingras CSC'), ('pangasinan_po', 'Pangasinan PO'), ('ilocossur_po', 'Ilocos Sur PO'), ('ilocosnorte_po', 'Ilocos Norte PO'), ('launion_po', 'La Union PO'), ('tmsd', 'TMSD'), ('afsd', 'AFSD'), ('regional', 'Regional')], max_length=30, null=True)),
+                ('comment', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='travel_order_events', to=settings.AUTH_USER_MODEL)),
+                ('travel_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api1.travelorder')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['travel_order', 'created_at', 'id'], name='travelorderevent_order_idx')],
+            },
+        ),
+        migrations.RunPython(fill_events, drop_events),
+    ]
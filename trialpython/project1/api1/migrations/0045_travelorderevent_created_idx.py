@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api1', '0044_travelorderevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='travelorderevent',
+            index=models.Index(fields=['created_at', 'action'], name='travelorderevent_created_idx'),
+        ),
+    ]
@@ -1,11 +1,18 @@
 # models.py
-from django.db import models
+import base64
+import binascii
+import hashlib
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.conf import settings
 from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.core.validators import FileExtensionValidator
 from django.contrib.auth.models import AbstractUser
 
+from .routing import OFFICES, STATUS_LABELS
+
 class EmployeePosition(models.Model):
     position_name = models.CharField(max_length=100)
     is_archived = models.BooleanField(default=False)
@@ -23,22 +30,8 @@ USER_LEVEL_CHOICES = [
     ('accountant', 'accountant'),
 ]
 
-EMPLOYEE_TYPE_CHOICES = [
-    ('urdaneta_csc', 'Urdaneta CSC'),
-    ('sison_csc', 'Sison CSC'),
-    ('pugo_csc', 'Pugo CSC'),
-    ('sudipen_csc', 'Sudipen CSC'),
-    ('tagudin_csc', 'Tagudin CSC'),
-    ('banayoyo_csc', 'Banayoyo CSC'),
-    ('dingras_csc', 'Dingras CSC'),
-    ('pangasinan_po', 'Pangasinan PO'),
-    ('ilocossur_po', 'Ilocos Sur PO'),
-    ('ilocosnorte_po', 'Ilocos Norte PO'),
-    ('launion_po', 'La Union PO'),
-    ('tmsd', 'TMSD'),
-    ('afsd', 'AFSD'),
-    ('regional', 'Regional')
-]
+# Office codes, in the order of the routing hierarchy (see routing.py)
+EMPLOYEE_TYPE_CHOICES = [(office.code, office.label) for office in OFFICES]
 
 TYPE_OF_USER = [
     ('Community Service Center Employee', 'Community service Center Employee'),
@@ -75,18 +68,28 @@ class Fund(models.Model):
 
 # --- TRAVEL ORDER ---
 class TravelOrder(models.Model):
-    STATUS_CHOICES = [
-        ('Travel order is placed', 'Travel order is placed'),
-        ('The travel order has been approved by the CSC head', 'The travel order has been approved by the CSC head'),
-        ('The travel order has been rejected by the CSC head.', 'The travel order has been rejected by the CSC head'),
-        ('The travel order has been approved by the PO head', 'The travel order has been approved by the PO head'),
-        ('The travel order has been rejected by the PO head', 'The travel order has been rejected by the PO head'),
-        ('The travel order has been approved by the TMSD chief', 'The travel order has been approved by the TMSD chief'),
-        ('The travel order has been rejected by the TMSD chief', 'The travel order has been rejected by the TMSD chief'),
-        ('The travel order has been approved by the AFSD chief', 'The travel order has been approved by the AFSD chief'),
-        ('The travel order has been rejected by the AFSD Chief', 'The travel order has been rejected by the AFSD Chief'),
-        ('The travel order has been approved by the Regional Director', 'The travel order has been approved by the Regional Director'),
-        ('The travel order has been rejected by the Regional Director', 'The travel order has been rejected by the Regional Director'),
+    # Last workflow action. The status sentence shown to users is derived from it
+    # and status_stage; status_outcome is the overall result, kept for filtering.
+    STATUS_PLACED = 0
+    STATUS_RESUBMITTED = 1
+    STATUS_APPROVED = 2         # approved by status_stage, moving up the chain
+    STATUS_FINAL_APPROVED = 3   # approved by the last approver
+    STATUS_REJECTED = 4         # rejected by status_stage
+    STATUS_CODE_CHOICES = [
+        (STATUS_PLACED, 'Placed'),
+        (STATUS_RESUBMITTED, 'Resubmitted'),
+        (STATUS_APPROVED, 'Approved'),
+        (STATUS_FINAL_APPROVED, 'Final approved'),
+        (STATUS_REJECTED, 'Rejected'),
+    ]
+
+    OUTCOME_PENDING = 0
+    OUTCOME_APPROVED = 1
+    OUTCOME_REJECTED = 2
+    OUTCOME_CHOICES = [
+        (OUTCOME_PENDING, 'Pending'),
+        (OUTCOME_APPROVED, 'Approved'),
+        (OUTCOME_REJECTED, 'Rejected'),
     ]
 
     MODE_OF_FILING = [
@@ -124,7 +127,9 @@ class TravelOrder(models.Model):
     prepared_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='prepared_travel_order')
     employee_position = models.ForeignKey(EmployeePosition, on_delete=models.SET_NULL, null=True, blank=True, related_name='travel_orders')
     
-    status = models.CharField(max_length=100, choices=STATUS_CHOICES, default='Travel order is placed')
+    status_code = models.PositiveSmallIntegerField(choices=STATUS_CODE_CHOICES, default=STATUS_PLACED)
+    status_stage = models.CharField(max_length=30, choices=EMPLOYEE_TYPE_CHOICES, blank=True, null=True)
+    status_outcome = models.PositiveSmallIntegerField(choices=OUTCOME_CHOICES, default=OUTCOME_PENDING)
     approval_stage = models.IntegerField(default=0)
     current_approver = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='approving_orders')
 
@@ -132,9 +137,71 @@ class TravelOrder(models.Model):
     rejected_at = models.DateTimeField(null=True, blank=True)
     rejected_by = models.ForeignKey(CustomUser,null=True, blank=True, on_delete=models.SET_NULL, related_name='rejected_orders')
     is_resubmitted = models.BooleanField(default=False)
+    # Bumped by every workflow transition, so two requests cannot both act on what they read
+    version = models.PositiveIntegerField(default=0)
 
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination on the travel order lists
+            models.Index(fields=['submitted_at', 'id'], name='travelorder_submitted_idx'),
+            # Approver queue: current_approver=user, still pending, newest first
+            models.Index(fields=['current_approver', 'status_outcome', 'submitted_at'], name='travelorder_approver_idx'),
+            # "My travel orders" and the per-user dashboards
+            models.Index(fields=['prepared_by', 'submitted_at'], name='travelorder_prepared_by_idx'),
+            models.Index(fields=['prepared_by', 'status_outcome'], name='travelorder_prepared_outc_idx'),
+            # Organisation-wide approved/rejected counts
+            models.Index(fields=['status_outcome', 'status_stage'], name='travelorder_outcome_idx'),
+            # Travel date range reports
+            models.Index(fields=['date_travel_from', 'date_travel_to'], name='travelorder_travel_dates_idx'),
+        ]
+
+    @staticmethod
+    def status_fields(code, stage=None):
+        """Column values for a status change, for use with save(**kwargs) or update()."""
+        if code == TravelOrder.STATUS_REJECTED:
+            outcome = TravelOrder.OUTCOME_REJECTED
+        elif code == TravelOrder.STATUS_FINAL_APPROVED:
+            outcome = TravelOrder.OUTCOME_APPROVED
+        else:
+            outcome = TravelOrder.OUTCOME_PENDING
+        return {'status_code': code, 'status_stage': stage, 'status_outcome': outcome}
+
+    def set_status(self, code, stage=None):
+        for attr, value in self.status_fields(code, stage).items():
+            setattr(self, attr, value)
+
+    def save_transition(self, fields):
+        """
+        Write `fields` with one conditional UPDATE, only if the row is still at the version
+        this instance was read at, and bump the version. Returns False, leaving the row
+        alone, when another request changed the order first.
+        """
+        updated = TravelOrder.objects.filter(pk=self.pk, version=self.version).update(
+            version=F('version') + 1, **{name: getattr(self, name) for name in fields}
+        )
+        if updated:
+            self.version += 1
+        return bool(updated)
+
+    @property
+    def status(self):
+        return self.status_label(self.status_code, self.status_stage)
+
+    @staticmethod
+    def status_label(code, stage):
+        if code == TravelOrder.STATUS_PLACED:
+            return 'Travel order is placed'
+        if code == TravelOrder.STATUS_RESUBMITTED:
+            return 'Travel Order Resubmitted'
+        if code == TravelOrder.STATUS_FINAL_APPROVED:
+            return STATUS_LABELS['regional']['approve']
+        decision = 'approve' if code == TravelOrder.STATUS_APPROVED else 'reject'
+        if stage in STATUS_LABELS:
+            return STATUS_LABELS[stage][decision]
+        return 'Approved' if decision == 'approve' else 'Rejected'
+
     def __str__(self):
         return f"TravelOrder to {self.destination} by {', '.join([e.full_name for e in self.employees.all()])}"
 
@@ -157,12 +224,112 @@ class Itinerary(models.Model):
     other_expense = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
 
+# -- Travel order numbers --
+class TravelOrderNumberSequence(models.Model):
+    """
+    Last number handed out per prefix (e.g. "R1-202501-"). Allocating bumps the
+    row in place, which holds its row lock until the caller's transaction ends,
+    so concurrent approvals queue on this one row and never reuse a number.
+
+    A missing row is created before anything locks it. Updating a row that does
+    not exist would take a gap lock on MySQL (InnoDB, REPEATABLE READ), and two
+    first approvals of a month would then deadlock on their INSERTs.
+    """
+    prefix = models.CharField(max_length=40, primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix}{self.last_number:04d}"
+
+    @classmethod
+    def allocate(cls, prefix, count=1):
+        """Reserve `count` consecutive numbers under `prefix`; returns them as a range."""
+        with transaction.atomic():
+            rows = cls.objects.filter(prefix=prefix)
+            # A plain read locks nothing, so only the first allocation of a prefix pays for start()
+            if not rows.exists():
+                cls.start(prefix)
+            rows.update(last_number=F('last_number') + count)
+            last = rows.values_list('last_number', flat=True).get()
+        return range(last - count + 1, last + 1)
+
+    @classmethod
+    def start(cls, prefix):
+        """Create the prefix's row, continuing after any numbers already issued under it."""
+        last_issued = TravelOrder.objects.filter(
+            travel_order_number__gte=prefix,
+            travel_order_number__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1),
+        ).order_by('-travel_order_number').values_list('travel_order_number', flat=True).first()
+        try:
+            last_number = int(last_issued[len(prefix):]) if last_issued else 0
+        except ValueError:
+            last_number = 0
+        try:
+            with transaction.atomic():
+                cls.objects.create(prefix=prefix, last_number=last_number)
+        except IntegrityError:
+            pass  # another transaction started it first
+
+
+# -- Signature images, stored once per distinct drawing --
+class SignatureImage(models.Model):
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of the decoded image
+    content_type = models.CharField(max_length=50, default='image/png')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # The only types accepted and served back; anything else could be rendered as a page
+    CONTENT_TYPES = ('image/png', 'image/jpeg')
+    EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg'}
+
+    def __str__(self):
+        return self.digest
+
+    @classmethod
+    def parse_data_url(cls, data_url):
+        """
+        Split a `data:<type>;base64,<payload>` string into (content_type, bytes).
+        Raises ValueError unless it is a well-formed PNG or JPEG data URL.
+        """
+        header, sep, payload = data_url.partition(',')
+        if not (sep and header.startswith('data:') and header.endswith(';base64')):
+            raise ValueError("Signature must be a base64 data URL.")
+        content_type = header[5:-7].lower()
+        if content_type not in cls.CONTENT_TYPES:
+            raise ValueError("Signature must be a PNG or JPEG image.")
+        try:
+            return content_type, base64.b64decode(payload, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Signature is not valid base64.")
+
+    @classmethod
+    def from_data_url(cls, data_url):
+        """Return the stored image for this data URL, inserting it only if it is new."""
+        content_type, data = cls.parse_data_url(data_url)
+        image, _ = cls.objects.get_or_create(
+            digest=hashlib.sha256(data).hexdigest(),
+            defaults={'content_type': content_type, 'data': data},
+        )
+        return image
+
+    @property
+    def filename(self):
+        return f"signature-{self.digest[:12]}.{self.EXTENSIONS.get(self.content_type, 'bin')}"
+
+    def as_data_url(self):
+        return f"data:{self.content_type};base64,{base64.b64encode(bytes(self.data)).decode('ascii')}"
+
+
 class EmployeeSignature(models.Model):
     order = models.OneToOneField(TravelOrder, on_delete=models.CASCADE, related_name='employee_signature')
     signed_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    signature_data = models.TextField()  # Base64
+    image = models.ForeignKey(SignatureImage, on_delete=models.PROTECT, related_name='employee_signatures')
     signed_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def signature_data(self):
+        return self.image.as_data_url()
+
     def __str__(self):
         return f"Employee Signature by {self.signed_by.username} for order {self.order.id}"
     
@@ -170,12 +337,51 @@ class EmployeeSignature(models.Model):
 class Signature(models.Model):
     order = models.ForeignKey(TravelOrder, on_delete=models.CASCADE)
     signed_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    signature_data = models.TextField()  # Base64
+    image = models.ForeignKey(SignatureImage, on_delete=models.PROTECT, related_name='signatures')
     signed_at = models.DateTimeField(auto_now_add=True)
     comment = models.TextField(null=True, blank=True)  
 
+    @property
+    def signature_data(self):
+        return self.image.as_data_url()
+
     def __str__(self):
         return f"Signed by {self.signed_by.username} for order {self.order.id}"
+
+
+# -- Workflow event log --
+class TravelOrderEvent(models.Model):
+    """
+    One row per workflow transition, written in the transaction that makes it and
+    never changed afterwards. `action` uses the TravelOrder status codes; `stage` is
+    the office whose approver acted, as in TravelOrder.status_stage.
+    """
+    travel_order = models.ForeignKey(TravelOrder, on_delete=models.CASCADE, related_name='events')
+    actor = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='travel_order_events')
+    action = models.PositiveSmallIntegerField(choices=TravelOrder.STATUS_CODE_CHOICES)
+    stage = models.CharField(max_length=30, choices=EMPLOYEE_TYPE_CHOICES, blank=True, null=True)
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # An order's timeline, oldest first
+            models.Index(fields=['travel_order', 'created_at', 'id'], name='travelorderevent_order_idx'),
+            # Decisions per day over a recent window (approver metrics)
+            models.Index(fields=['created_at', 'action'], name='travelorderevent_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Travel order events are append-only")
+        super().save(*args, **kwargs)
+
+    @property
+    def status(self):
+        return TravelOrder.status_label(self.action, self.stage)
+
+    def __str__(self):
+        return f"{self.get_action_display()} on order {self.travel_order_id}"
     
 
     
@@ -191,6 +397,7 @@ class Liquidation(models.Model):
 ]
     status = models.CharField(max_length=50, choices=LIQUIDATION_STATUSES, default='Pending')
 
+    DOCUMENT_FIELDS = ('certificate_of_travel', 'certificate_of_appearance', 'after_travel_report')
 
     travel_order = models.OneToOneField('TravelOrder', on_delete=models.CASCADE, related_name='liquidation')
     uploaded_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='uploaded_liquidations')
@@ -213,6 +420,17 @@ class Liquidation(models.Model):
 
     status = models.CharField(max_length=50, default='Pending')
 
+    def review(self, from_status, **fields):
+        """
+        Apply a review's fields with one conditional UPDATE, only while the liquidation is
+        still in `from_status`. Returns False when another review moved it on first.
+        """
+        if not Liquidation.objects.filter(pk=self.pk, status=from_status).update(**fields):
+            return False
+        for attr, value in fields.items():
+            setattr(self, attr, value)
+        return True
+
     def update_status(self):
         if self.is_bookkeeper_approved is True and self.is_accountant_approved is True:
             self.status = 'Ready for Claim'
@@ -246,6 +464,72 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread counts and the per-user feed, newest first
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+            # Keyset pages of the feed (see NotificationFeedPagination)
+            models.Index(fields=['user', 'id'], name='notification_user_id_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.title} - {self.user.username}"
\ No newline at end of file
+        return f"{self.title} - {self.user.username}"
+
+# --- DASHBOARD COUNTERS ---
+class DashboardCounter(models.Model):
+    """
+    Per-user dashboard figures, adjusted in the same transaction as the travel
+    order transition that changes them (see counters.py).
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='dashboard_counter')
+    total_orders = models.IntegerField(default=0)       # orders prepared by the user
+    approved = models.IntegerField(default=0)           # ...finally approved
+    rejected = models.IntegerField(default=0)           # ...currently rejected
+    pending_approvals = models.IntegerField(default=0)  # orders waiting on the user
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard counters - {self.user.username}"
+
+
+# --- MONTHLY ROLLUP ---
+class MonthlyTravelRollup(models.Model):
+    """
+    Travellers per month and office, counted once per employee on each order
+    (the same figure as grouping TravelOrder ⨝ employees by TruncMonth and
+    employee_type). Kept up to date by signals in signals.py.
+    """
+    month = models.DateField()  # first day of the month submitted_at falls in
+    employee_type = models.CharField(max_length=30, choices=EMPLOYEE_TYPE_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'employee_type'], name='monthly_rollup_month_type_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.employee_type}: {self.count}"
+
+
+# --- OUTBOX ---
+class OutboxMessage(models.Model):
+    """
+    A side effect of a committed change (sending notifications, and later emails
+    or PDFs), written in the same transaction as the change and carried out by
+    the process_outbox worker (see outbox.py). Deleted once handled.
+    """
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(default=timezone.now)  # not retried before this
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: due messages, oldest first
+            models.Index(fields=['available_at', 'id'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({self.attempts} attempts)"
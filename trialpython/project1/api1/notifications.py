@@ -0,0 +1,232 @@
+"""
+Notification fan-out for workflow transitions.
+
+A view collects every recipient of a transition (or of a batch of them) on one
+NotificationFanout and calls defer() inside the transition's transaction. That
+writes a single outbox message (see outbox.py). The process_outbox worker then
+saves all of the rows with one bulk INSERT (send_queued()). send() does the
+insert directly instead. A user gets at most one notification per
+travel order and fan-out: the first one added wins. Someone reached through two
+roles, such as the filer who also approved, or an approver who signed twice,
+hears about it once.
+
+Once the transaction commits, the recipients' unread counts are bumped and the
+new notifications are pushed to any open streams (see push.py).
+
+Unread counts live in the cache, one key per user, so reading one costs no
+SQL. The cache is shared by every process (settings.CACHES), so the counts the
+outbox worker bumps are the ones web workers read. Writers adjust them with atomic incr/decr after their transaction commits.
+A count missing from the cache (new, evicted, or past UNREAD_COUNT_TTL) is
+recounted on its next read, which bounds any drift. The reconcile_unread_counts
+command repairs the rest.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted by the
+prune_notifications command (see prune_read_notifications).
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from . import outbox, push
+from .models import Notification, TravelOrder
+from .serializers import NotificationSerializer
+
+
+def unread_key(user_id):
+    return f'api1:unread:{user_id}'
+
+
+def count_unread(user_ids):
+    """{user id: unread notifications} from the table, one grouped query."""
+    counts = dict.fromkeys(user_ids, 0)
+    rows = Notification.objects.filter(user__in=user_ids, is_read=False).values('user').annotate(n=Count('id')).order_by()
+    for row in rows:
+        counts[row['user']] = row['n']
+    return counts
+
+
+def unread_counts(user_ids):
+    """{user id: unread notifications} from the cache, counting (and caching) only the users missing there."""
+    user_ids = list(user_ids)
+    cached = cache.get_many([unread_key(user_id) for user_id in user_ids])
+    counts, missing = {}, []
+    for user_id in user_ids:
+        count = cached.get(unread_key(user_id))
+        if count is None or count < 0:
+            missing.append(user_id)
+        else:
+            counts[user_id] = count
+    if missing:
+        fresh = count_unread(missing)
+        cache.set_many({unread_key(user_id): n for user_id, n in fresh.items()}, settings.UNREAD_COUNT_TTL)
+        counts.update(fresh)
+    return counts
+
+
+def unread_count(user_id):
+    return unread_counts([user_id])[user_id]
+
+
+def adjust_unread(changes):
+    """Add {user id: n} (n may be negative) to the cached counts; uncached users are counted on their next read."""
+    for user_id, n in changes.items():
+        try:
+            if n > 0:
+                cache.incr(unread_key(user_id), n)
+            elif n < 0:
+                cache.decr(unread_key(user_id), -n)
+        except ValueError:
+            pass
+
+
+def stale_unread(user_ids):
+    """{user id: (cached, actual)} for users whose cached count disagrees with the table."""
+    cached = cache.get_many([unread_key(user_id) for user_id in user_ids])
+    actual = count_unread(user_ids)
+    return {
+        user_id: (cached[unread_key(user_id)], n)
+        for user_id, n in actual.items()
+        if unread_key(user_id) in cached and cached[unread_key(user_id)] != n
+    }
+
+
+def reconcile_unread(user_ids):
+    """Overwrite stale cached counts of the given users; returns how many were stale."""
+    stale = stale_unread(user_ids)
+    cache.set_many({unread_key(user_id): n for user_id, (_, n) in stale.items()}, settings.UNREAD_COUNT_TTL)
+    return len(stale)
+
+
+def unread_changed(user_id, change):
+    """After a commit that changed a user's unread notifications: adjust the count and push it."""
+    adjust_unread({user_id: change})
+    publish_unread_counts([user_id])
+
+
+def publish_unread_counts(user_ids):
+    """Push the users' current unread counts to their open streams, e.g. after marking read."""
+    if not push.listening():
+        return
+    push.publish([
+        {'user': user_id, 'event': 'unread_count', 'data': {'unread_count': count}}
+        for user_id, count in unread_counts(user_ids).items()
+    ])
+
+
+def notifications_committed(notifications):
+    adjust_unread(Counter(notification.user_id for notification in notifications))
+    publish_notifications(notifications)
+
+
+def publish_notifications(notifications):
+    if not push.listening():
+        return
+    counts = unread_counts({notification.user_id for notification in notifications})
+    push.publish([
+        {
+            'user': notification.user_id,
+            'event': 'notification',
+            # The id is missing on backends that don't return ids from bulk inserts (MySQL);
+            # clients refetch the list then.
+            'data': {
+                'notification': NotificationSerializer(notification).data,
+                'unread_count': counts[notification.user_id],
+            },
+        }
+        for notification in notifications
+    ])
+
+
+def prune_read_notifications(cutoff, batch_size=500, dry_run=False):
+    """
+    Delete read notifications created before `cutoff`, walking the table in
+    primary-key order `batch_size` rows at a time. Yields (last id, rows scanned,
+    rows deleted) after each batch.
+
+    Each batch is a short primary-key range read and a delete of those rows by
+    id, each committed on its own, so no lock is held for longer than one
+    batch. Ids grow with created_at, so the walk stops at the first batch that
+    reaches `cutoff`. Unread rows are never deleted, so unread counts are unchanged.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            Notification.objects.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'created_at', 'is_read')[:batch_size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        ids = [pk for pk, created_at, is_read in rows if is_read and created_at < cutoff]
+        deleted = len(ids)
+        if ids and not dry_run:
+            deleted, _ = Notification.objects.filter(id__in=ids, is_read=True).delete()
+        yield last_id, len(rows), deleted
+        if rows[-1][1] >= cutoff:
+            return
+
+
+class NotificationFanout:
+    def __init__(self):
+        self.notifications = {}
+
+    def __len__(self):
+        return len(self.notifications)
+
+    def add(self, user, travel_order, notification_type, title, message):
+        """Queue a notification for `user` (a user or a user id); False if they already have one for this order."""
+        user_id = getattr(user, 'pk', user)
+        key = (user_id, travel_order.pk)
+        if user_id is None or key in self.notifications:
+            return False
+        self.notifications[key] = Notification(
+            user_id=user_id,
+            travel_order=travel_order,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+        )
+        return True
+
+    def send(self):
+        """Write everything queued with one bulk insert and start over; returns the saved rows."""
+        notifications = list(self.notifications.values())
+        self.notifications = {}
+        if notifications:
+            Notification.objects.bulk_create(notifications, batch_size=500)
+            transaction.on_commit(lambda: notifications_committed(notifications))
+        return notifications
+
+    def defer(self):
+        """Hand everything queued to the outbox worker as one message and start over."""
+        notifications = list(self.notifications.values())
+        self.notifications = {}
+        if not notifications:
+            return None
+        return outbox.enqueue('notifications.send', {
+            'notifications': [
+                {
+                    'user': notification.user_id,
+                    'travel_order': notification.travel_order_id,
+                    'notification_type': notification.notification_type,
+                    'title': notification.title,
+                    'message': notification.message,
+                }
+                for notification in notifications
+            ],
+        })
+
+
+def send_queued(payload):
+    """Outbox handler for NotificationFanout.defer(): save the notifications, skipping orders deleted since."""
+    rows = payload['notifications']
+    orders = TravelOrder.objects.only('id', 'destination').in_bulk({row['travel_order'] for row in rows})
+    fanout = NotificationFanout()
+    for row in rows:
+        order = orders.get(row['travel_order'])
+        if order is not None:
+            fanout.add(row['user'], order, row['notification_type'], row['title'], row['message'])
+    fanout.send()
@@ -0,0 +1,82 @@
+"""
+Transactional outbox for the side effects of workflow transitions.
+
+A view calls enqueue() inside the transaction that makes its change, so the
+OutboxMessage commits or rolls back with it: a side effect is never lost to a
+crash after the commit, and never runs for a change that did not commit. The
+request returns as soon as that transaction commits. The process_outbox
+command runs HANDLERS for due messages in batches.
+
+Each message is handled in a savepoint of the batch's transaction, and deleted
+in that same transaction, so its database writes happen exactly once. Effects
+outside the database (pushes, mail) may repeat if the worker dies between
+running the handler and committing. A handler that raises is retried with
+exponential backoff up to OUTBOX_MAX_ATTEMPTS times; after that the message
+stays in the table with its last error, for an admin to look at.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxMessage
+
+# topic -> dotted path of a function taking the message payload
+HANDLERS = {
+    'notifications.send': 'api1.notifications.send_queued',
+}
+
+
+def enqueue(topic, payload):
+    """Queue `payload` for the `topic` handler; call inside the transaction whose effects it follows."""
+    if topic not in HANDLERS:
+        raise ValueError(f"No outbox handler for {topic!r}")
+    return OutboxMessage.objects.create(topic=topic, payload=payload)
+
+
+def retry_delay(attempts):
+    """Backoff after the `attempts`-th failure: OUTBOX_RETRY_DELAY doubled each time, at most an hour."""
+    return timedelta(seconds=min(settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), 3600))
+
+
+def process_batch(batch_size=100, max_attempts=None):
+    """Handle up to `batch_size` due messages, oldest first; returns (handled, failed)."""
+    max_attempts = settings.OUTBOX_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    now = timezone.now()
+    handled, failed = [], 0
+    with transaction.atomic():
+        # skip_locked lets several workers share the queue without taking each other's messages
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+                available_at__lte=now, attempts__lt=max_attempts,
+            ).order_by('available_at', 'id')[:batch_size]
+        )
+        for message in messages:
+            try:
+                with transaction.atomic():
+                    import_string(HANDLERS[message.topic])(message.payload)
+            except Exception:
+                failed += 1
+                message.attempts += 1
+                message.last_error = traceback.format_exc()
+                message.available_at = now + retry_delay(message.attempts)
+                message.save(update_fields=['attempts', 'last_error', 'available_at'])
+            else:
+                handled.append(message.pk)
+        if handled:
+            OutboxMessage.objects.filter(pk__in=handled).delete()
+    return len(handled), failed
+
+
+def drain(batch_size=100, max_attempts=None):
+    """Process batches until none are due; returns the totals (handled, failed)."""
+    handled = failed = 0
+    while True:
+        batch_handled, batch_failed = process_batch(batch_size, max_attempts)
+        handled += batch_handled
+        failed += batch_failed
+        if not batch_handled and not batch_failed:
+            return handled, failed
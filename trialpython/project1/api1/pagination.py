@@ -0,0 +1,198 @@
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """What the keyset paginators share: the client-set page size and reading one row past the page."""
+    page_size = 25
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def fetch_page(self, queryset):
+        """The first page_size rows of an ordered, filtered queryset, and whether more follow."""
+        results = list(queryset[:self.page_size + 1])
+        return results[:self.page_size], len(results) > self.page_size
+
+
+class TravelOrderCursorPagination(KeysetPagination):
+    """
+    Keyset pagination over (submitted_at, id), newest first.
+
+    The cursor is an opaque token holding the boundary row's key and the
+    direction to read in, so every page is a bounded index range scan
+    no matter how deep the client has paged.
+    """
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            reverse = False
+            queryset = queryset.order_by('-submitted_at', '-id')
+        else:
+            submitted_at, pk, reverse = self.cursor
+            if reverse:
+                # Rows newer than the boundary, read oldest first then flipped.
+                queryset = queryset.filter(submitted_at__gte=submitted_at).filter(
+                    Q(submitted_at__gt=submitted_at) | Q(id__gt=pk)
+                ).order_by('submitted_at', 'id')
+            else:
+                queryset = queryset.filter(submitted_at__lte=submitted_at).filter(
+                    Q(submitted_at__lt=submitted_at) | Q(id__lt=pk)
+                ).order_by('-submitted_at', '-id')
+
+        self.page, has_more = self.fetch_page(queryset)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return self.encode_cursor(last.submitted_at, last.id, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        first = self.page[0]
+        return self.encode_cursor(first.submitted_at, first.id, reverse=True)
+
+    def encode_cursor(self, submitted_at, pk, reverse):
+        payload = json.dumps({'t': submitted_at.isoformat(), 'i': pk, 'r': int(reverse)})
+        token = base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+            submitted_at = parse_datetime(payload['t'])
+            pk = int(payload['i'])
+            reverse = bool(int(payload.get('r', 0)))
+        except (TypeError, ValueError, KeyError, UnicodeError, json.JSONDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if submitted_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return submitted_at, pk, reverse
+
+
+class NotificationFeedPagination(KeysetPagination):
+    """
+    Keyset pagination over a user's notifications by id, newest first.
+
+    Ids only grow, so `before` (the last id of the previous page) is the whole
+    cursor and each page is one range scan of the (user, id) index. With
+    `since_id` it returns only the notifications newer than that id instead,
+    for clients that already hold the top of the feed. If more arrived than fit
+    on a page, `truncated` tells the client to reload from the top.
+    """
+    page_size = 20
+    cursor_query_param = 'before'
+    since_query_param = 'since_id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.before = self.get_id_param(request, self.cursor_query_param)
+        self.since_id = self.get_id_param(request, self.since_query_param)
+
+        queryset = queryset.order_by('-id')
+        if self.before is not None:
+            queryset = queryset.filter(id__lt=self.before)
+        if self.since_id is not None:
+            queryset = queryset.filter(id__gt=self.since_id)
+
+        self.page, self.has_more = self.fetch_page(queryset)
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('truncated', self.since_id is not None and self.has_more),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'truncated': {'type': 'boolean'},
+                'results': schema,
+            },
+        }
+
+    def get_id_param(self, request, name):
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return _positive_int(value)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        # A delta has no older pages: the client already holds them
+        if self.since_id is not None or not self.has_more or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.page[-1].id)
+
+    def get_etag(self):
+        """A validator for this page: its rows' ids and read flags, and whether more follow."""
+        key = ','.join(f'{row.id}:{int(row.is_read)}' for row in self.page)
+        digest = hashlib.md5(f'{key}|{int(self.has_more)}'.encode(), usedforsecurity=False).hexdigest()
+        return f'"{digest}"'
@@ -0,0 +1,187 @@
+"""
+Server push for notifications, as server-sent events over ASGI.
+
+Every worker process with open streams binds one Unix datagram socket in
+NOTIFICATION_PUSH_DIR. publish() sends each message to every socket there. So
+a notification saved by any process reaches the streams of every worker on the
+host, whether it was saved by an ASGI or WSGI worker or by a management
+command, and there is no broker to run. A socket whose process has gone away
+refuses the datagram and is removed.
+
+Pushes are best effort: the rows are saved before anything is published, and
+a client that missed a message catches up from /notifications/ when it reconnects.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+SUPPORTED = hasattr(socket, 'AF_UNIX')
+# Messages are packed into datagrams of about this size; Linux and macOS accept far more.
+MAX_DATAGRAM = 60000
+RECEIVE_SIZE = 262144
+# Messages a stream may have waiting before newer ones are dropped for it
+QUEUE_SIZE = 100
+RETRY_MS = 5000
+
+
+def datagrams(messages):
+    """JSON arrays of messages, each array at most about MAX_DATAGRAM bytes."""
+    batch, size = [], 2
+    for message in messages:
+        encoded = json.dumps(message, cls=DjangoJSONEncoder, separators=(',', ':'))
+        if batch and size + len(encoded) + 1 > MAX_DATAGRAM:
+            yield f"[{','.join(batch)}]".encode()
+            batch, size = [], 2
+        batch.append(encoded)
+        size += len(encoded) + 1
+    if batch:
+        yield f"[{','.join(batch)}]".encode()
+
+
+def subscriber_sockets(directory=None):
+    directory = directory or settings.NOTIFICATION_PUSH_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names if name.endswith('.sock')]
+
+
+def listening(directory=None):
+    """Whether any process on this host has a stream open; lets callers skip building messages."""
+    return SUPPORTED and bool(subscriber_sockets(directory))
+
+
+def publish(messages, directory=None):
+    """Send [{'user': id, 'event': name, 'data': {...}}, ...] to every process with open streams."""
+    paths = subscriber_sockets(directory) if SUPPORTED and messages else []
+    if not paths:
+        return
+    payloads = list(datagrams(messages))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for path in paths:
+            for payload in payloads:
+                try:
+                    sock.sendto(payload, path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Left behind by a process that has exited
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(path)
+                    break
+                except OSError:
+                    # Its receive buffer is full: drop the rest rather than hold up the request
+                    break
+
+
+class PushHub:
+    """This process's end: one socket, fanned out to the queues of the streams open here."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.queues = defaultdict(set)
+        self.sock = None
+        self.path = None
+        self.loop = None
+
+    def subscribe(self, user_id):
+        self.listen()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.queues[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.queues.get(user_id, set())
+        queues.discard(queue)
+        if not queues:
+            self.queues.pop(user_id, None)
+        if not self.queues:
+            self.close()
+
+    def listen(self):
+        loop = asyncio.get_running_loop()
+        if self.sock is not None and self.loop is loop:
+            return
+        self.close()
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = os.path.join(self.directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.bind(path)
+        loop.add_reader(sock.fileno(), self.receive)
+        self.sock, self.path, self.loop = sock, path, loop
+
+    def close(self):
+        if self.sock is None:
+            return
+        if not self.loop.is_closed():
+            self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        self.sock = self.path = self.loop = None
+
+    def receive(self):
+        while self.sock is not None:
+            try:
+                payload = self.sock.recv(RECEIVE_SIZE)
+            except BlockingIOError:
+                return
+            for message in json.loads(payload):
+                for queue in self.queues.get(message['user'], ()):
+                    with contextlib.suppress(asyncio.QueueFull):
+                        queue.put_nowait(message)
+
+
+_hubs = {}
+
+
+def get_hub():
+    directory = str(settings.NOTIFICATION_PUSH_DIR)
+    if directory not in _hubs:
+        _hubs[directory] = PushHub(directory)
+    return _hubs[directory]
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def event_stream(user_id, first_events=(), expires_at=None):
+    """
+    The text/event-stream body for one user: `first_events`, then everything
+    published for them, with a comment line every NOTIFICATION_STREAM_HEARTBEAT
+    seconds so proxies keep the connection open. When the access token expires at
+    `expires_at` (a Unix time) it sends "expired" and ends, so the client refreshes
+    its cookie and reconnects.
+    """
+    hub = get_hub()
+    queue = hub.subscribe(user_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        for event, data in first_events:
+            yield sse(event, data)
+        while True:
+            timeout = settings.NOTIFICATION_STREAM_HEARTBEAT
+            if expires_at is not None:
+                remaining = expires_at - time.time()
+                if remaining <= 0:
+                    yield sse('expired', {})
+                    return
+                timeout = min(timeout, remaining)
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse(message['event'], message['data'])
+    finally:
+        hub.unsubscribe(user_id, queue)
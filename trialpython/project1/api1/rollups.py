@@ -0,0 +1,121 @@
+"""
+Monthly travel rollup behind the admin and director charts.
+
+MonthlyTravelRollup holds one row per (month, employee_type). signals.py adjusts
+it as employees are attached to or removed from orders, so the dashboards read a
+handful of pre-aggregated rows instead of grouping the TravelOrder ⨝ employees join.
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import CustomUser, MonthlyTravelRollup, TravelOrder
+
+OFFICE_GROUPS = {
+    "Pangasinan PO + CSCs": ['pangasinan_po', 'urdaneta_csc', 'sison_csc'],
+    "La Union PO + CSCs": ['launion_po', 'sudipen_csc', 'pugo_csc'],
+    "Ilocos Sur PO + CSCs": ['ilocossur_po', 'tagudin_csc', 'banayoyo_csc'],
+    "Ilocos Norte PO + CSCs": ['ilocosnorte_po', 'dingras_csc'],
+}
+
+
+def rollup_month(submitted_at):
+    """First day of the month an order was submitted in, in the current time zone like TruncMonth."""
+    if timezone.is_aware(submitted_at):
+        submitted_at = timezone.localtime(submitted_at)
+    return submitted_at.date().replace(day=1)
+
+
+def month_start(month):
+    """The first instant of a month (given as its first day) in the current time zone."""
+    start = datetime.combine(month, time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def bump_rollup(month, type_counts):
+    """Add {employee_type: n} to the month's rows, creating rows that do not exist yet."""
+    for employee_type, n in type_counts.items():
+        if not employee_type or not n:
+            continue
+        rows = MonthlyTravelRollup.objects.filter(month=month, employee_type=employee_type)
+        if rows.update(count=F('count') + n):
+            continue
+        try:
+            with transaction.atomic():
+                MonthlyTravelRollup.objects.create(month=month, employee_type=employee_type, count=n)
+        except IntegrityError:
+            # Another transaction created the row first
+            rows.update(count=F('count') + n)
+
+
+def record_employees(order, user_ids, sign=1):
+    """Count (sign=1) or uncount (sign=-1) the given employees on an order."""
+    if not user_ids:
+        return
+    types = Counter(CustomUser.objects.filter(id__in=user_ids).values_list('employee_type', flat=True))
+    bump_rollup(rollup_month(order.submitted_at), {t: sign * n for t, n in types.items()})
+
+
+def record_orders(user, order_ids, sign=1):
+    """Count or uncount one employee on the given orders (the reverse side of the relation)."""
+    if not order_ids or not user.employee_type:
+        return
+    submitted = TravelOrder.objects.filter(id__in=order_ids).values_list('submitted_at', flat=True)
+    for month, n in Counter(rollup_month(s) for s in submitted).items():
+        bump_rollup(month, {user.employee_type: sign * n})
+
+
+def source_rollup(since=None):
+    """{(month, employee_type): count} computed from the join, as the charts used to."""
+    orders = TravelOrder.objects.filter(employees__employee_type__isnull=False)
+    if since:
+        orders = orders.filter(submitted_at__gte=month_start(since))
+    rows = orders.annotate(month=TruncMonth('submitted_at')).values(
+        'month', 'employees__employee_type'
+    ).annotate(count=Count('id')).order_by()
+    return {
+        (rollup_month(row['month']), row['employees__employee_type']): row['count']
+        for row in rows
+    }
+
+
+@transaction.atomic
+def rebuild_rollup(since=None):
+    """Replace the rollup rows from `since` (a month start, or everything) with source counts."""
+    counts = source_rollup(since)
+    existing = MonthlyTravelRollup.objects.all()
+    if since:
+        existing = existing.filter(month__gte=since)
+    existing.delete()
+    MonthlyTravelRollup.objects.bulk_create(
+        [MonthlyTravelRollup(month=month, employee_type=t, count=n) for (month, t), n in counts.items()],
+        batch_size=500,
+    )
+    return len(counts)
+
+
+def office_chart(month_list):
+    """Chart datasets per office group for the given "YYYY-MM" labels."""
+    type_group = {t: group for group, types in OFFICE_GROUPS.items() for t in types}
+    result = defaultdict(lambda: {month: 0 for month in month_list})
+    rows = MonthlyTravelRollup.objects.filter(
+        month__gte=date.fromisoformat(f"{month_list[0]}-01"),
+        employee_type__in=type_group,
+    ).values_list('month', 'employee_type', 'count')
+    for month, employee_type, count in rows:
+        result[type_group[employee_type]][month.strftime('%Y-%m')] += count
+
+    return {
+        "labels": month_list,
+        "datasets": [
+            {
+                "label": group,
+                "data": [result[group].get(month, 0) for month in month_list]
+            } for group in OFFICE_GROUPS
+        ]
+    }
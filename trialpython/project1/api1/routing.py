@@ -0,0 +1,89 @@
+"""
+Approval routing, kept as data.
+
+OFFICES is the office hierarchy: each office, the office its travel orders go
+to next, and the title its approver signs with. The role rules below say who
+skips which part of that chain. Both are compiled once, at import, into
+ROUTING_TABLE and STATUS_LABELS; adding a CSC or PO is one more Office line.
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+Office = namedtuple('Office', 'code label parent approver')
+
+OFFICES = (
+    # Community Service Centers report to their Provincial Office
+    Office('urdaneta_csc', 'Urdaneta CSC', 'pangasinan_po', 'Urdaneta CSC head'),
+    Office('sison_csc', 'Sison CSC', 'pangasinan_po', 'Sison CSC head'),
+    Office('pugo_csc', 'Pugo CSC', 'launion_po', 'Pugo CSC head'),
+    Office('sudipen_csc', 'Sudipen CSC', 'launion_po', 'Sudipen CSC head'),
+    Office('tagudin_csc', 'Tagudin CSC', 'ilocossur_po', 'Tagudin CSC head'),
+    Office('banayoyo_csc', 'Banayoyo CSC', 'ilocossur_po', 'Banayoyo CSC head'),
+    Office('dingras_csc', 'Dingras CSC', 'ilocosnorte_po', 'Dingras CSC head'),
+    # Provincial Offices report to TMSD
+    Office('pangasinan_po', 'Pangasinan PO', 'tmsd', 'Pangasinan PO head'),
+    Office('ilocossur_po', 'Ilocos Sur PO', 'tmsd', 'Ilocos Sur PO head'),
+    Office('ilocosnorte_po', 'Ilocos Norte PO', 'tmsd', 'Ilocos Norte PO head'),
+    Office('launion_po', 'La Union PO', 'tmsd', 'La Union PO head'),
+    # Regional Office divisions
+    Office('tmsd', 'TMSD', 'afsd', 'TMSD chief'),
+    Office('afsd', 'AFSD', 'regional', 'AFSD Chief'),
+    Office('regional', 'Regional', None, 'Regional Director'),
+)
+
+# Levels that file no approval chain at all.
+NO_CHAIN_LEVELS = frozenset({'director'})
+# Levels that approve for their own office, so their orders start one office up...
+SKIP_OWN_OFFICE_LEVELS = frozenset({'head'})
+# ...except in these offices, whose heads still sign their own orders first.
+SIGNS_OWN_ORDERS = frozenset({'afsd', 'regional'})
+
+# Table key for every user_level without a rule of its own
+ANY_LEVEL = None
+
+
+def office_chain(code, parents):
+    chain = []
+    while code is not None:
+        if code in chain:
+            raise ValueError(f"Approval routing loops back to {code!r}")
+        chain.append(code)
+        code = parents[code]
+    return tuple(chain)
+
+
+def compile_routing(offices):
+    """(employee_type, user_level) -> approval chain, for every office and every level with a rule."""
+    parents = {office.code: office.parent for office in offices}
+    table = {}
+    for office in offices:
+        chain = office_chain(office.code, parents)
+        table[office.code, ANY_LEVEL] = chain
+        for level in NO_CHAIN_LEVELS:
+            table[office.code, level] = ()
+        for level in SKIP_OWN_OFFICE_LEVELS - NO_CHAIN_LEVELS:
+            table[office.code, level] = chain if office.code in SIGNS_OWN_ORDERS else chain[1:]
+    return MappingProxyType(table)
+
+
+def compile_status_labels(offices):
+    """The approve/reject sentence for each office's approver."""
+    return MappingProxyType({
+        office.code: MappingProxyType({
+            'approve': f'The travel order has been approved by the {office.approver}',
+            'reject': f'The travel order has been rejected by the {office.approver}',
+        })
+        for office in offices
+    })
+
+
+ROUTING_TABLE = compile_routing(OFFICES)
+STATUS_LABELS = compile_status_labels(OFFICES)
+
+
+def approval_chain(employee_type, user_level):
+    """The offices an order filed by this kind of user passes through, in order."""
+    try:
+        return ROUTING_TABLE[employee_type, user_level]
+    except KeyError:
+        return ROUTING_TABLE.get((employee_type, ANY_LEVEL), ())
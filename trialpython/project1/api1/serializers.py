@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import TravelOrder, Signature, CustomUser, Itinerary, Fund, Transportation, EmployeePosition, Liquidation,EmployeeSignature, Notification
+from django.db import transaction
+from django.db.models import Prefetch
+from django.urls import reverse
+from .models import TravelOrder, Signature, CustomUser, Itinerary, Fund, Transportation, EmployeePosition, Liquidation,EmployeeSignature, Notification, TravelOrderEvent, SignatureImage
 from django.contrib.auth.hashers import make_password
 
 class TransportationSerializer(serializers.ModelSerializer):
@@ -16,6 +19,70 @@ class ItinerarySerializer(serializers.ModelSerializer):
             'travel_order': {'required': False}
         }
 
+class TravelOrderItinerarySerializer(ItinerarySerializer):
+    """An itinerary row nested in a travel order; on update, `id` names the existing row it replaces."""
+    id = serializers.IntegerField(required=False)
+
+
+# Columns of an itinerary row that a travel order edit may change
+ITINERARY_FIELDS = [
+    'transportation', 'itinerary_date', 'departure_time', 'arrival_time',
+    'transportation_allowance', 'per_diem', 'other_expense', 'total_amount',
+]
+
+
+def itinerary_values(item):
+    """An itinerary row's editable values, from a model instance or validated data, for comparing rows."""
+    # The transportation is compared by id: validated data holds an instance, a row may not have loaded it
+    if isinstance(item, dict):
+        transportation = item.get('transportation')
+        return (getattr(transportation, 'pk', transportation), *(item.get(name) for name in ITINERARY_FIELDS[1:]))
+    return (item.transportation_id, *(getattr(item, name) for name in ITINERARY_FIELDS[1:]))
+
+
+def save_itinerary(travel_order, items, existing=()):
+    """
+    Bring `travel_order`'s itinerary to `items` (validated rows), touching only what
+    changed: a row is kept if the item names its id or has exactly its values,
+    updated if named but different, and the rest are inserted or deleted, each
+    with one bulk query.
+    """
+    existing = {row.id: row for row in existing}
+    by_values = {}
+    for row in existing.values():
+        by_values.setdefault(itinerary_values(row), []).append(row)
+
+    kept, changed, added = set(), [], []
+    unnamed = []
+    for item in items:
+        row = existing.get(item.get('id'))
+        if row is None or row.id in kept:
+            unnamed.append(item)
+            continue
+        kept.add(row.id)
+        if itinerary_values(row) != itinerary_values(item):
+            for name in ITINERARY_FIELDS:
+                if name in item:
+                    setattr(row, name, item[name])
+            changed.append(row)
+    for item in unnamed:
+        # An unchanged row sent back without its id is still the same row
+        matches = [row for row in by_values.get(itinerary_values(item), []) if row.id not in kept]
+        if matches:
+            kept.add(matches[0].id)
+            continue
+        fields = {name: item[name] for name in ITINERARY_FIELDS if name in item}
+        added.append(Itinerary(travel_order=travel_order, **fields))
+
+    removed = [pk for pk in existing if pk not in kept]
+    if removed:
+        Itinerary.objects.filter(id__in=removed).delete()
+    if changed:
+        Itinerary.objects.bulk_update(changed, ITINERARY_FIELDS, batch_size=100)
+    if added:
+        Itinerary.objects.bulk_create(added, batch_size=100)
+
+
 class FundSerializer(serializers.ModelSerializer):
     class Meta:
         model = Fund
@@ -46,22 +113,55 @@ class TravelOrderReportSerializer(serializers.ModelSerializer):
             return f"{obj.prepared_by.first_name} {obj.prepared_by.last_name}"
         return "—"
 
+class SignatureDataUrlField(serializers.CharField):
+    """A drawn signature, as a PNG or JPEG `data:` URL (see SignatureImage.parse_data_url)."""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        try:
+            SignatureImage.parse_data_url(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value
+
+
+class SignatureUploadSerializer(serializers.Serializer):
+    """The optional signature sent with a filing or a decision."""
+    signature = SignatureDataUrlField(required=False, allow_blank=True, allow_null=True)
+
+
+class SignatureImageUrlField(serializers.Field):
+    """URL of the cacheable image endpoint for a stored signature."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'image.digest')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, digest):
+        url = reverse('signature-image', args=[digest])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
 class SignatureSerializer(serializers.ModelSerializer):
     signed_by_name = serializers.CharField(source="signed_by.full_name", read_only=True)
     position = serializers.CharField(source="signed_by.employee_position.position_name", read_only=True)
+    signature_url = SignatureImageUrlField()
 
     class Meta:
         model = Signature
-        fields = ["id", "signed_by_name", "position", "signature_data", "signed_at", "comment"]
+        fields = ["id", "signed_by_name", "position", "signature_data", "signature_url", "signed_at", "comment"]
 
 
 class EmployeeSignatureSerializer(serializers.ModelSerializer):
     signed_by_name = serializers.CharField(source="signed_by.full_name", read_only=True)
     position = serializers.CharField(source="signed_by.employee_position.position_name", read_only=True)
+    signature_url = SignatureImageUrlField()
 
     class Meta:
         model = EmployeeSignature
-        fields = ["id", "signed_by_name", "position", "signature_data", "signed_at"]
+        fields = ["id", "signed_by_name", "position", "signature_data", "signature_url", "signed_at"]
 
 
 
@@ -69,17 +169,32 @@ class TravelOrderSerializer(serializers.ModelSerializer):
     employees = serializers.PrimaryKeyRelatedField(many=True, queryset=CustomUser.objects.all())
     employee_names = serializers.SerializerMethodField()
     prepared_by = serializers.PrimaryKeyRelatedField(queryset=CustomUser.objects.all())
-    itinerary = ItinerarySerializer(many=True)
+    itinerary = TravelOrderItinerarySerializer(many=True)
     employee_position = serializers.PrimaryKeyRelatedField(queryset=EmployeePosition.objects.all(), allow_null=True, required=False)
     prepared_by_name = serializers.SerializerMethodField()
 
     # 👇 NEW
     approvals = SignatureSerializer(source="signature_set", many=True, read_only=True)  
     employee_signature = EmployeeSignatureSerializer(read_only=True)
+    status = serializers.ReadOnlyField()
 
     class Meta:
         model = TravelOrder
         fields = '__all__'
+        read_only_fields = ['status_code', 'status_stage', 'status_outcome', 'version']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load every relation the serializer reads so a list costs a fixed number of queries."""
+        return queryset.select_related(
+            'prepared_by',
+            'employee_signature__signed_by__employee_position',
+            'employee_signature__image',
+        ).prefetch_related(
+            'employees',
+            'itinerary',
+            Prefetch('signature_set', queryset=Signature.objects.select_related('signed_by__employee_position', 'image')),
+        )
 
     def get_prepared_by_name(self, obj):
         return f"{obj.prepared_by.first_name} {obj.prepared_by.last_name}" if obj.prepared_by else None
@@ -91,36 +206,95 @@ class TravelOrderSerializer(serializers.ModelSerializer):
         itinerary_data = validated_data.pop('itinerary')
         employees_data = validated_data.pop('employees')
 
-        travel_order = TravelOrder.objects.create(**validated_data)
-        travel_order.employees.set(employees_data)
-
-        for item in itinerary_data:
-            Itinerary.objects.create(travel_order=travel_order, **item)
+        # Joins the caller's transaction if there is one
+        with transaction.atomic(savepoint=False):
+            travel_order = TravelOrder.objects.create(**validated_data)
+            travel_order.employees.set(employees_data)
+            save_itinerary(travel_order, itinerary_data)
 
         return travel_order
 
     def update(self, instance, validated_data):
-        itinerary_data = validated_data.pop('itinerary', [])
+        itinerary_data = validated_data.pop('itinerary', None)
         employees_data = validated_data.pop('employees', [])
 
-        # Update TravelOrder fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic(savepoint=False):
+            # Update TravelOrder fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
 
-        # Update ManyToMany employees
-        instance.employees.set(employees_data)
+            # Update ManyToMany employees
+            instance.employees.set(employees_data)
 
-        # Refresh itineraries
-        instance.itinerary.all().delete()
-        for item in itinerary_data:
-            item.pop('travel_order', None)
-            Itinerary.objects.create(travel_order=instance, **item)
+            # Write only the itinerary rows that changed
+            if itinerary_data is not None:
+                save_itinerary(instance, itinerary_data, Itinerary.objects.filter(travel_order=instance))
+                # Any prefetched rows are stale now
+                getattr(instance, '_prefetched_objects_cache', {}).pop('itinerary', None)
 
         return instance
 
 
 
+class TravelOrderSummarySerializer(serializers.ModelSerializer):
+    """Compact list row: no itinerary and no signature images, only who signed."""
+    employee_names = serializers.SerializerMethodField()
+    prepared_by_name = serializers.SerializerMethodField()
+    signed_by_names = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TravelOrder
+        fields = [
+            'id', 'travel_order_number', 'status', 'status_code', 'status_stage', 'status_outcome',
+            'approval_stage', 'current_approver',
+            'date_of_filing', 'submitted_at', 'date_travel_from', 'date_travel_to',
+            'destination', 'purpose', 'employees', 'employee_names',
+            'prepared_by', 'prepared_by_name', 'signed_by_names',
+            'rejection_comment', 'is_resubmitted',
+        ]
+        read_only_fields = fields
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load names only; signature images are never read for list rows."""
+        return queryset.select_related('prepared_by').prefetch_related(
+            'employees',
+            Prefetch(
+                'signature_set',
+                queryset=Signature.objects.select_related('signed_by').order_by('signed_at', 'id'),
+            ),
+        )
+
+    def get_employee_names(self, obj):
+        return [f"{u.first_name} {u.last_name}" for u in obj.employees.all()]
+
+    def get_prepared_by_name(self, obj):
+        return f"{obj.prepared_by.first_name} {obj.prepared_by.last_name}" if obj.prepared_by else None
+
+    def get_signed_by_names(self, obj):
+        return [s.signed_by.full_name for s in obj.signature_set.all()]
+
+
+class TravelOrderSignaturesSerializer(serializers.ModelSerializer):
+    approvals = SignatureSerializer(source="signature_set", many=True, read_only=True)
+    employee_signature = EmployeeSignatureSerializer(read_only=True)
+
+    class Meta:
+        model = TravelOrder
+        fields = ['id', 'employee_signature', 'approvals']
+
+
+class TravelOrderEventSerializer(serializers.ModelSerializer):
+    actor_name = serializers.CharField(source="actor.full_name", read_only=True, default=None)
+    action_label = serializers.CharField(source="get_action_display", read_only=True)
+    status = serializers.ReadOnlyField()
+
+    class Meta:
+        model = TravelOrderEvent
+        fields = ["id", "action", "action_label", "stage", "status", "actor", "actor_name", "comment", "created_at"]
+
+
 class EmployeePositionSerializer(serializers.ModelSerializer):
     class Meta:
         model = EmployeePosition
@@ -198,6 +372,9 @@ class LiquidationSerializer(serializers.ModelSerializer):
     certificate_of_appearance = serializers.FileField(use_url=True)
     after_travel_report = serializers.FileField(use_url=True)
 
+    # Authenticated, streaming download links for the three documents
+    document_urls = serializers.SerializerMethodField()
+
     class Meta:
         model = Liquidation
         fields = '__all__'
@@ -207,14 +384,31 @@ class LiquidationSerializer(serializers.ModelSerializer):
             'reviewed_by_accountant', 'reviewed_at_accountant'
         )
 
+    def get_document_urls(self, obj):
+        request = self.context.get('request')
+        urls = {}
+        for document in Liquidation.DOCUMENT_FIELDS:
+            if getattr(obj, document):
+                url = reverse('liquidation-document', args=[obj.pk, document])
+                urls[document] = request.build_absolute_uri(url) if request else url
+        return urls
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     travel_order_destination = serializers.CharField(source='travel_order.destination', read_only=True)
-    travel_order_id = serializers.IntegerField(source='travel_order.id', read_only=True)
+    travel_order_id = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Notification
         fields = [
             'id', 'notification_type', 'title', 'message', 
             'is_read', 'created_at', 'travel_order_destination', 'travel_order_id'
-        ]
\ No newline at end of file
+        ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Join the order's destination into the same query, leaving the rest of the order row unread."""
+        return queryset.select_related('travel_order').only(
+            'id', 'notification_type', 'title', 'message', 'is_read', 'created_at',
+            'travel_order__destination',
+        )
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import CustomUser, TravelOrder
+from .rollups import record_employees, record_orders
+from .utils import invalidate_head_directory
+
+
+@receiver(m2m_changed, sender=TravelOrder.employees.through)
+def travel_order_employees_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep MonthlyTravelRollup in step with who travels on which order."""
+    if action in ('post_add', 'post_remove'):
+        sign = 1 if action == 'post_add' else -1
+        if reverse:
+            record_orders(instance, pk_set, sign)
+        else:
+            record_employees(instance, pk_set, sign)
+    elif action == 'pre_clear':
+        if reverse:
+            record_orders(instance, list(instance.travel_orders.values_list('id', flat=True)), -1)
+        else:
+            record_employees(instance, list(instance.employees.values_list('id', flat=True)), -1)
+
+
+@receiver(pre_delete, sender=TravelOrder)
+def travel_order_deleted(sender, instance, **kwargs):
+    # The cascade removes the employee links without sending m2m_changed
+    record_employees(instance, list(instance.employees.values_list('id', flat=True)), -1)
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_routing_fields(sender, instance, **kwargs):
+    # Read __dict__ so instances loaded with only()/defer() don't fetch the fields here
+    instance._routing_fields = (instance.__dict__.get('user_level'), instance.__dict__.get('employee_type'))
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, created, **kwargs):
+    """Drop the cached head directory when someone's place in it may have changed."""
+    routing_fields = (instance.user_level, instance.employee_type)
+    if created or routing_fields != getattr(instance, '_routing_fields', None):
+        invalidate_head_directory()
+        # Again once committed, in case another request reloaded it from the old rows meanwhile
+        transaction.on_commit(invalidate_head_directory)
+    instance._routing_fields = routing_fields
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_head_directory()
+    transaction.on_commit(invalidate_head_directory)
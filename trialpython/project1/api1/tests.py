@@ -1,3 +1,2268 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time as clock
+import re
+import threading
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    EMPLOYEE_TYPE_CHOICES, USER_LEVEL_CHOICES,
+    CustomUser, TravelOrder, Itinerary, Signature, EmployeeSignature, EmployeePosition, SignatureImage,
+    Liquidation, Notification, DashboardCounter, MonthlyTravelRollup, TravelOrderEvent, OutboxMessage,
+)
+from . import workflow
+from . import digest, outbox, push
+from .serializers import TravelOrderSerializer
+from .notifications import NotificationFanout, notifications_committed, prune_read_notifications, unread_key
+from .counters import COUNTER_FIELDS, get_counters, stale_counters
+from .rollups import source_rollup
+from .routing import ANY_LEVEL, OFFICES, ROUTING_TABLE, STATUS_LABELS, Office, compile_routing, compile_status_labels
+from .utils import (
+    APPROVAL_CHAIN_MAP, generate_travel_order_number, generate_travel_order_numbers, get_approval_chain, get_next_head,
+    invalidate_head_directory,
+)
+
+
+def make_user(username, user_level='employee', employee_type='urdaneta_csc', **extra):
+    return CustomUser.objects.create_user(
+        username=username,
+        password='password123',
+        first_name=username.title(),
+        last_name='Tester',
+        user_level=user_level,
+        employee_type=employee_type,
+        **extra
+    )
+
+
+def make_order(prepared_by, employees=None, current_approver=None, signers=(), **extra):
+    fields = {
+        'destination': 'Baguio City',
+        'purpose': 'Field validation',
+        'date_travel_from': date(2025, 1, 6),
+        'date_travel_to': date(2025, 1, 8),
+        'prepared_by': prepared_by,
+        'current_approver': current_approver,
+    }
+    fields.update(extra)
+    order = TravelOrder.objects.create(**fields)
+    order.employees.set(employees or [prepared_by])
+    Itinerary.objects.create(
+        travel_order=order,
+        itinerary_date=date(2025, 1, 6),
+        departure_time=time(8, 0),
+        arrival_time=time(12, 0),
+        transportation_allowance=100,
+        per_diem=200,
+        other_expense=0,
+        total_amount=300,
+    )
+    EmployeeSignature.objects.create(
+        order=order, signed_by=prepared_by, image=SignatureImage.from_data_url('data:image/png;base64,AAAA')
+    )
+    for signer in signers:
+        Signature.objects.create(
+            order=order, signed_by=signer, image=SignatureImage.from_data_url('data:image/png;base64,BBBB')
+        )
+        TravelOrderEvent.objects.create(travel_order=order, actor=signer, action=TravelOrder.STATUS_APPROVED)
+    return order
+
+
+class ApprovalRoutingTests(SimpleTestCase):
+    """The compiled routing table reproduces the chains get_approval_chain used to spell out."""
+
+    # Chains from the original if-ladder: (non-head chain, head chain) per office
+    LEGACY_CHAINS = {
+        'urdaneta_csc': (['urdaneta_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional'], ['pangasinan_po', 'tmsd', 'afsd', 'regional']),
+        'sison_csc': (['sison_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional'], ['pangasinan_po', 'tmsd', 'afsd', 'regional']),
+        'pugo_csc': (['pugo_csc', 'launion_po', 'tmsd', 'afsd', 'regional'], ['launion_po', 'tmsd', 'afsd', 'regional']),
+        'sudipen_csc': (['sudipen_csc', 'launion_po', 'tmsd', 'afsd', 'regional'], ['launion_po', 'tmsd', 'afsd', 'regional']),
+        'tagudin_csc': (['tagudin_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional'], ['ilocossur_po', 'tmsd', 'afsd', 'regional']),
+        'banayoyo_csc': (['banayoyo_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional'], ['ilocossur_po', 'tmsd', 'afsd', 'regional']),
+        'dingras_csc': (['dingras_csc', 'ilocosnorte_po', 'tmsd', 'afsd', 'regional'], ['ilocosnorte_po', 'tmsd', 'afsd', 'regional']),
+        'pangasinan_po': (['pangasinan_po', 'tmsd', 'afsd', 'regional'], ['tmsd', 'afsd', 'regional']),
+        'ilocossur_po': (['ilocossur_po', 'tmsd', 'afsd', 'regional'], ['tmsd', 'afsd', 'regional']),
+        'ilocosnorte_po': (['ilocosnorte_po', 'tmsd', 'afsd', 'regional'], ['tmsd', 'afsd', 'regional']),
+        'launion_po': (['launion_po', 'tmsd', 'afsd', 'regional'], ['tmsd', 'afsd', 'regional']),
+        'tmsd': (['tmsd', 'afsd', 'regional'], ['afsd', 'regional']),
+        'afsd': (['afsd', 'regional'], ['afsd', 'regional']),
+        'regional': (['regional'], ['regional']),
+    }
+
+    def test_compiled_table_matches_legacy_chains(self):
+        levels = [code for code, _ in USER_LEVEL_CHOICES]
+        for employee_type in [code for code, _ in EMPLOYEE_TYPE_CHOICES] + [None, 'unknown_office']:
+            employee_chain, head_chain = self.LEGACY_CHAINS.get(employee_type, ([], []))
+            for level in levels:
+                user = CustomUser(user_level=level, employee_type=employee_type)
+                if level == 'director':
+                    expected = []
+                elif level == 'head':
+                    expected = head_chain
+                else:
+                    expected = employee_chain
+                with self.subTest(employee_type=employee_type, user_level=level):
+                    self.assertEqual(list(get_approval_chain(user)), expected)
+        self.assertEqual(APPROVAL_CHAIN_MAP, {code: chain for code, (chain, _) in self.LEGACY_CHAINS.items()})
+
+    def test_table_and_labels_are_immutable(self):
+        with self.assertRaises(TypeError):
+            ROUTING_TABLE['urdaneta_csc', 'employee'] = ()
+        with self.assertRaises(TypeError):
+            STATUS_LABELS['regional']['approve'] = ''
+        self.assertIsInstance(get_approval_chain(CustomUser(user_level='employee', employee_type='tmsd')), tuple)
+
+    def test_new_office_needs_only_data(self):
+        offices = OFFICES + (Office('alaminos_csc', 'Alaminos CSC', 'pangasinan_po', 'Alaminos CSC head'),)
+        table = compile_routing(offices)
+        self.assertEqual(table['alaminos_csc', ANY_LEVEL], ('alaminos_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional'))
+        self.assertEqual(table['alaminos_csc', 'head'], ('pangasinan_po', 'tmsd', 'afsd', 'regional'))
+        self.assertEqual(
+            compile_status_labels(offices)['alaminos_csc']['reject'],
+            'The travel order has been rejected by the Alaminos CSC head',
+        )
+
+
+class HeadDirectoryTests(TestCase):
+    """get_next_head answers from a cached directory that user changes invalidate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.second_head = make_user('secondhead', user_level='head')
+        cls.po_head = make_user('pohead', user_level='head', employee_type='pangasinan_po')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        invalidate_head_directory()
+
+    def test_resolves_without_queries_once_loaded(self):
+        chain = get_approval_chain(self.employee)
+        self.assertEqual(get_next_head(chain, 0, current_user=self.employee), self.head)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_next_head(chain, 0, current_user=self.employee), self.head)
+            self.assertEqual(get_next_head(chain, 1, current_user=self.head), self.po_head)
+            self.assertEqual(get_next_head(chain, 2, current_user=self.po_head), self.director)
+            self.assertIsNone(get_next_head(['regional'], 0, current_user=self.director))
+
+    def test_lowest_id_wins_and_current_user_is_skipped(self):
+        chain = get_approval_chain(self.employee)
+        self.assertEqual(get_next_head(chain, 0, current_user=self.employee), self.head)
+        self.assertEqual(get_next_head(chain, 0, current_user=self.head), self.second_head)
+
+    def test_role_and_office_changes_invalidate(self):
+        chain = get_approval_chain(self.employee)
+        get_next_head(chain, 0)
+
+        self.head.user_level = 'employee'
+        self.head.save()
+        self.assertEqual(get_next_head(chain, 0), self.second_head)
+
+        self.second_head.employee_type = 'sison_csc'
+        self.second_head.save()
+        self.assertEqual(get_next_head(chain, 0), self.po_head)
+
+    def test_unrelated_saves_keep_the_cache(self):
+        get_next_head(['urdaneta_csc'], 0)
+        self.head.first_name = 'Renamed'
+        self.head.save()
+        with self.assertNumQueries(0):
+            get_next_head(['urdaneta_csc'], 0)
+
+    def test_returned_head_is_a_copy(self):
+        head = get_next_head(['urdaneta_csc'], 0)
+        head.first_name = 'Changed'
+        self.assertEqual(get_next_head(['urdaneta_csc'], 0).first_name, 'Head')
+
+
+class TravelOrderListQueryBudgetTests(TestCase):
+    """List endpoints must cost the same number of queries no matter how many orders they return."""
+
+    @classmethod
+    def setUpTestData(cls):
+        position = EmployeePosition.objects.create(position_name='Engineer')
+        cls.employee = make_user('employee', employee_position=position)
+        cls.coworker = make_user('coworker', employee_position=position)
+        cls.head = make_user('head', user_level='head', employee_position=position)
+        cls.po_head = make_user('pohead', user_level='head', employee_type='pangasinan_po', employee_position=position)
+        cls.admin = make_user('admin', user_level='admin', employee_type=None)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def seed(self, count):
+        for _ in range(count):
+            make_order(
+                self.employee,
+                employees=[self.employee, self.coworker],
+                current_approver=self.po_head,
+                signers=[self.head, self.po_head],
+            )
+
+    def assertBudget(self, user, url, budget):
+        self.client.force_authenticate(user)
+        for count in (1, 5):
+            self.seed(count)
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_my_travel_orders(self):
+        self.assertBudget(self.employee, '/api1/my-travel-orders/', 3)
+
+    def test_my_travel_orders_for_admin(self):
+        self.assertBudget(self.admin, '/api1/my-travel-orders/', 3)
+
+    def test_admin_travels(self):
+        self.assertBudget(self.admin, '/api1/admin/travels/', 3)
+
+    def test_pending_approvals(self):
+        self.assertBudget(self.po_head, '/api1/my-pending-approvals/', 3)
+
+
+class TravelOrderCursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.admin = make_user('admin', user_level='admin', employee_type=None)
+        base = timezone.now()
+        cls.orders = [make_order(cls.employee) for _ in range(7)]
+        # Two orders share a timestamp so the id tie-breaker is exercised.
+        for offset, order in enumerate(cls.orders):
+            TravelOrder.objects.filter(pk=order.pk).update(submitted_at=base - timedelta(minutes=offset // 2))
+        cls.expected = list(TravelOrder.objects.order_by('-submitted_at', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([row['id'] for row in response.data['results']])
+            url = response.data[link]
+        return pages, response
+
+    def test_forward_walk_covers_every_order_once(self):
+        pages, _ = self.walk('/api1/admin/travels/?page_size=3', 'next')
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_links_walk_back_to_first_page(self):
+        pages, last = self.walk('/api1/admin/travels/?page_size=3', 'next')
+        back, first = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(back, pages[-2::-1])
+        self.assertIsNone(first.data['previous'])
+
+    def test_my_travel_orders_is_paginated(self):
+        self.client.force_authenticate(self.employee)
+        response = self.client.get('/api1/my-travel-orders/?page_size=5')
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[:5])
+        self.assertIsNotNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_my_travel_orders_filters_by_outcome(self):
+        rejected = self.orders[1::3]
+        TravelOrder.objects.filter(pk__in=[order.pk for order in rejected]).update(status_outcome=TravelOrder.OUTCOME_REJECTED)
+        self.client.force_authenticate(self.employee)
+        pages, _ = self.walk('/api1/my-travel-orders/?status_outcome=rejected&page_size=1', 'next')
+        self.assertEqual([len(page) for page in pages], [1, 1])
+        self.assertEqual(sum(pages, []), [pk for pk in self.expected if pk in {order.pk for order in rejected}])
+        self.assertEqual(self.client.get('/api1/my-travel-orders/?status_outcome=lost').status_code, 400)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api1/admin/travels/?page_size=100000')
+        self.assertEqual(len(response.data['results']), len(self.expected))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api1/admin/travels/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class TravelOrderRepresentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.po_head = make_user('pohead', user_level='head', employee_type='pangasinan_po')
+        cls.order = make_order(cls.employee, current_approver=cls.po_head, signers=[cls.head])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_rows_carry_signer_names_not_images(self):
+        self.client.force_authenticate(self.po_head)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api1/my-pending-approvals/')
+        row = response.data[0]
+        self.assertEqual(row['signed_by_names'], ['Head Tester'])
+        self.assertNotIn('approvals', row)
+        self.assertNotIn('employee_signature', row)
+        self.assertFalse(any('signatureimage' in q['sql'] for q in queries.captured_queries))
+
+    def test_list_size_does_not_grow_with_signature_payloads(self):
+        self.client.force_authenticate(self.employee)
+        before = len(self.client.get('/api1/my-travel-orders/').content)
+        large = SignatureImage.from_data_url('data:image/png;base64,' + 'A' * 50000)
+        Signature.objects.filter(order=self.order).update(image=large)
+        after = len(self.client.get('/api1/my-travel-orders/').content)
+        self.assertEqual(before, after)
+
+    def test_signatures_endpoint_returns_images(self):
+        self.client.force_authenticate(self.employee)
+        response = self.client.get(f'/api1/travel-orders/{self.order.pk}/signatures/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['employee_signature']['signature_data'], 'data:image/png;base64,AAAA')
+        self.assertEqual([a['signed_by_name'] for a in response.data['approvals']], ['Head Tester'])
+
+    def test_detail_keeps_full_representation(self):
+        self.client.force_authenticate(self.employee)
+        response = self.client.get(f'/api1/travel-orders/{self.order.pk}/')
+        self.assertEqual(len(response.data['itinerary']), 1)
+        self.assertEqual(len(response.data['approvals']), 1)
+
+
+class TravelOrderEditTests(TestCase):
+    """The filer edits and resubmits a rejected order through the detail endpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+
+    def test_put_resubmits_rejected_order(self):
+        order = make_order(
+            self.employee, rejected_by=self.head, rejection_comment='Wrong dates',
+            **TravelOrder.status_fields(TravelOrder.STATUS_REJECTED, 'urdaneta_csc'),
+        )
+        itinerary = [{
+            'itinerary_date': '2025-01-07', 'departure_time': '08:00', 'arrival_time': '12:00',
+            'transportation': None, 'transportation_allowance': '100.00', 'per_diem': '200.00',
+            'other_expense': '0.00', 'total_amount': '300.00',
+        }]
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        response = client.put(f'/api1/travel-orders/{order.id}/', {
+            'destination': 'Vigan City',
+            'purpose': 'Field validation',
+            'date_travel_from': '2025-01-07',
+            'date_travel_to': '2025-01-08',
+            'prepared_by': self.employee.id,
+            'employees': json.dumps([self.employee.id]),
+            'itinerary': json.dumps(itinerary),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        order.refresh_from_db()
+        self.assertEqual(order.destination, 'Vigan City')
+        self.assertEqual(order.status_code, TravelOrder.STATUS_RESUBMITTED)
+        self.assertEqual(order.current_approver, self.head)
+        self.assertIsNone(order.rejected_by)
+        self.assertEqual(list(order.itinerary.values_list('itinerary_date', flat=True)), [date(2025, 1, 7)])
+
+
+class ItineraryWriteTests(TestCase):
+    """Itinerary rows are inserted in bulk and, on edit, only the changed ones are written."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee)
+
+    def day(self, n, **values):
+        return {
+            'itinerary_date': f'2025-02-{n:02d}', 'departure_time': '08:00:00', 'arrival_time': '12:00:00',
+            'transportation': None, 'transportation_allowance': '100.00', 'per_diem': '200.00',
+            'other_expense': '0.00', 'total_amount': '300.00', **values,
+        }
+
+    def itinerary_writes(self, queries):
+        return [
+            q['sql'].split()[0] for q in queries.captured_queries
+            if '"api1_itinerary"' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+
+    def rejected_order(self, days):
+        order = make_order(
+            self.employee, rejected_by=self.head, rejection_comment='Wrong dates',
+            **TravelOrder.status_fields(TravelOrder.STATUS_REJECTED, 'urdaneta_csc'),
+        )
+        order.itinerary.all().delete()
+        serializer = TravelOrderSerializer(order, data={
+            'destination': 'Vigan City', 'purpose': 'Field validation',
+            'date_travel_from': '2025-02-01', 'date_travel_to': '2025-02-28',
+            'prepared_by': self.employee.id, 'employees': [self.employee.id],
+            'itinerary': [self.day(n) for n in days],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return order
+
+    def put(self, order, itinerary):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(f'/api1/travel-orders/{order.id}/', {
+                'destination': 'Vigan City', 'purpose': 'Field validation',
+                'date_travel_from': '2025-02-01', 'date_travel_to': '2025-02-28',
+                'prepared_by': self.employee.id,
+                'employees': json.dumps([self.employee.id]),
+                'itinerary': json.dumps(itinerary),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        return self.itinerary_writes(queries)
+
+    def test_create_inserts_in_bulk(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api1/travel-orders/', {
+                'destination': 'Vigan City', 'purpose': 'Field validation',
+                'date_travel_from': '2025-02-01', 'date_travel_to': '2025-02-28',
+                'prepared_by': self.employee.id,
+                'employees': json.dumps([self.employee.id]),
+                'itinerary': json.dumps([self.day(n) for n in range(1, 21)]),
+            }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.itinerary_writes(queries), ['INSERT'])
+        self.assertEqual(Itinerary.objects.filter(travel_order_id=response.data['id']).count(), 20)
+
+    def test_unchanged_itinerary_is_not_written(self):
+        order = self.rejected_order(range(1, 11))
+        rows = list(order.itinerary.order_by('id').values('id'))
+        # With ids, as the edit form sends them, and without
+        self.assertEqual(self.put(order, [dict(self.day(n), **row) for n, row in zip(range(1, 11), rows)]), [])
+        self.assertEqual(self.put(order, [self.day(n) for n in range(1, 11)]), [])
+        self.assertEqual(list(order.itinerary.order_by('id').values('id')), rows)
+
+    def test_only_changes_are_written(self):
+        order = self.rejected_order(range(1, 6))
+        rows = list(order.itinerary.order_by('id'))
+        itinerary = [dict(self.day(n), id=row.id) for n, row in zip(range(1, 6), rows)]
+        itinerary[1]['per_diem'] = '250.00'       # changed
+        del itinerary[3]                           # removed
+        itinerary.append(self.day(9))              # added
+        self.assertEqual(sorted(self.put(order, itinerary)), ['DELETE', 'INSERT', 'UPDATE'])
+
+        current = {row.id: row for row in order.itinerary.all()}
+        self.assertEqual(len(current), 5)
+        self.assertEqual(current[rows[1].id].per_diem, Decimal('250.00'))
+        self.assertNotIn(rows[3].id, current)
+        self.assertEqual({row.id for row in rows} - {rows[3].id}, set(current) & {row.id for row in rows})
+
+    def test_foreign_ids_are_new_rows(self):
+        other = make_order(self.employee)
+        order = self.rejected_order([1])
+        stranger = other.itinerary.get()
+        self.put(order, [self.day(1), dict(self.day(2), id=stranger.id)])
+        self.assertEqual(order.itinerary.count(), 2)
+        stranger.refresh_from_db()
+        self.assertEqual(stranger.travel_order, other)
+
+
+class SignatureImageStoreTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+
+    def test_identical_signatures_share_one_image(self):
+        make_order(self.employee, signers=[self.head])
+        make_order(self.employee, signers=[self.head])
+        self.assertEqual(Signature.objects.count(), 2)
+        self.assertEqual(SignatureImage.objects.filter(signatures__isnull=False).distinct().count(), 1)
+
+    def test_data_url_round_trips(self):
+        image = SignatureImage.from_data_url('data:image/png;base64,iVBORw0K')
+        self.assertEqual(image.content_type, 'image/png')
+        self.assertEqual(bytes(image.data), b'\x89PNG\r\n')
+        self.assertEqual(image.as_data_url(), 'data:image/png;base64,iVBORw0K')
+
+    def test_image_endpoint_serves_bytes_and_honours_etag(self):
+        image = SignatureImage.from_data_url('data:image/png;base64,iVBORw0K')
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        url = f'/api1/signature-images/{image.digest}/'
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'\x89PNG\r\n')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+        self.assertEqual(response['Content-Disposition'], f'inline; filename="signature-{image.digest[:12]}.png"')
+
+        with self.assertNumQueries(0):
+            cached = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_only_png_and_jpeg_are_accepted(self):
+        self.assertEqual(SignatureImage.parse_data_url('data:image/jpeg;base64,/9j/')[0], 'image/jpeg')
+        for data_url in [
+            'data:text/html;base64,PHNjcmlwdD5hbGVydCgxKTwvc2NyaXB0Pg==',
+            'data:image/svg+xml;base64,PHN2Zy8+',
+            f'data:image/{"x" * 60};base64,AAAA',
+            'data:image/png,not-base64',
+            'data:image/png;base64,@@@@',
+            'just a string',
+        ]:
+            with self.subTest(data_url=data_url), self.assertRaises(ValueError):
+                SignatureImage.parse_data_url(data_url)
+
+    def test_decision_with_bad_signature_is_refused(self):
+        order = make_order(self.employee, current_approver=self.head)
+        client = APIClient()
+        client.force_authenticate(self.head)
+        response = client.patch(f'/api1/approve-travel-order/{order.id}/', {
+            'decision': 'approve', 'signature': 'data:text/html;base64,PHNjcmlwdD5hbGVydCgxKTwvc2NyaXB0Pg==',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('PNG or JPEG', response.data['error'])
+        order.refresh_from_db()
+        self.assertEqual(order.current_approver, self.head)
+        self.assertFalse(SignatureImage.objects.filter(content_type='text/html').exists())
+
+        response = client.post('/api1/approve-travel-orders/bulk/', {
+            'ids': [order.id], 'decision': 'approve', 'signature': 'data:text/html;base64,PGI+',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_filing_with_bad_signature_is_refused(self):
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        response = client.post('/api1/travel-orders/', {
+            'destination': 'Vigan City', 'purpose': 'Field validation',
+            'date_travel_from': '2025-02-01', 'date_travel_to': '2025-02-02',
+            'prepared_by': self.employee.id,
+            'employees': json.dumps([self.employee.id]),
+            'itinerary': json.dumps([]),
+            'signature': 'data:text/html;base64,PGI+',
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('signature', response.data)
+        self.assertFalse(TravelOrder.objects.filter(destination='Vigan City').exists())
+
+    def test_stored_non_image_is_not_served(self):
+        image = SignatureImage.objects.create(digest='f' * 64, content_type='text/html', data=b'<script></script>')
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        self.assertEqual(client.get(f'/api1/signature-images/{image.digest}/').status_code, 404)
+
+    def test_signatures_payload_links_to_image_endpoint(self):
+        order = make_order(self.employee, signers=[self.head])
+        client = APIClient()
+        client.force_authenticate(self.employee)
+        response = client.get(f'/api1/travel-orders/{order.pk}/signatures/')
+        digest = Signature.objects.get(order=order).image.digest
+        self.assertTrue(response.data['approvals'][0]['signature_url'].endswith(f'/api1/signature-images/{digest}/'))
+
+
+class ProtectedDownloadTestCase(TestCase):
+    """Points MEDIA_ROOT at a throwaway directory for tests that write files."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+class EvidenceDownloadTests(ProtectedDownloadTestCase):
+    payload = bytes(range(256)) * 1024  # 256 KiB, several chunks
+
+    def setUp(self):
+        self.employee = make_user('employee')
+        self.order = make_order(self.employee)
+        self.order.evidence.save('scan.pdf', ContentFile(self.payload))
+        self.client = APIClient()
+        self.client.force_authenticate(self.employee)
+        self.url = f'/api1/travel-orders/{self.order.pk}/evidence/'
+
+    def test_full_download_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Length'], str(len(self.payload)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(self.body(response), self.payload)
+
+    def test_byte_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+        self.assertEqual(self.body(response), self.payload[100:200])
+
+    def test_suffix_and_open_ended_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(self.body(response), self.payload[-10:])
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload) - 5}-')
+        self.assertEqual(self.body(response), self.payload[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.payload)}')
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD='x-accel-redirect', FILE_DOWNLOAD_ACCEL_PREFIX='/protected/')
+    def test_accel_redirect_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected/' + self.order.evidence.name)
+        self.assertEqual(response.content, b'')
+
+    @override_settings(FILE_DOWNLOAD_OFFLOAD='x-sendfile')
+    def test_sendfile_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], self.order.evidence.path)
+
+    def test_outsiders_are_refused(self):
+        self.client.force_authenticate(make_user('outsider'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class LiquidationDocumentDownloadTests(ProtectedDownloadTestCase):
+    payload = b'%PDF-1.4 ' + b'x' * 200000
+
+    def setUp(self):
+        self.employee = make_user('employee')
+        self.bookkeeper = make_user('bookkeeper', user_level='bookkeeper', employee_type=None)
+        order = make_order(self.employee, travel_order_number='R1-202501-0001')
+        self.liquidation = Liquidation(travel_order=order, uploaded_by=self.employee)
+        for document in Liquidation.DOCUMENT_FIELDS:
+            getattr(self.liquidation, document).save(f'{document}.pdf', ContentFile(self.payload), save=False)
+        self.liquidation.save()
+        self.client = APIClient()
+        self.url = f'/api1/liquidations/{self.liquidation.pk}/documents/certificate_of_travel/'
+
+    def test_reviewer_streams_document_inline(self):
+        self.client.force_authenticate(self.bookkeeper)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('inline;', response['Content-Disposition'])
+        self.assertEqual(self.body(response), self.payload)
+
+    def test_range_and_validators(self):
+        self.client.force_authenticate(self.employee)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-7')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), b'%PDF-1.4')
+        cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_unrelated_employee_is_refused(self):
+        self.client.force_authenticate(make_user('outsider'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_unknown_document_is_404(self):
+        self.client.force_authenticate(self.bookkeeper)
+        response = self.client.get(f'/api1/liquidations/{self.liquidation.pk}/documents/evidence/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_links_to_download_endpoint(self):
+        self.client.force_authenticate(self.bookkeeper)
+        response = self.client.get(f'/api1/liquidations/{self.liquidation.pk}/')
+        self.assertEqual(
+            sorted(response.data['document_urls']), sorted(Liquidation.DOCUMENT_FIELDS)
+        )
+        self.assertTrue(response.data['document_urls']['certificate_of_travel'].endswith(self.url))
+
+
+class TravelOrderStatusTests(TestCase):
+    """Status is stored as code/stage/outcome columns and rendered as the old sentence."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_labels_match_legacy_sentences(self):
+        cases = [
+            ((TravelOrder.STATUS_PLACED, None), 'Travel order is placed'),
+            ((TravelOrder.STATUS_RESUBMITTED, None), 'Travel Order Resubmitted'),
+            ((TravelOrder.STATUS_APPROVED, 'urdaneta_csc'), 'The travel order has been approved by the Urdaneta CSC head'),
+            ((TravelOrder.STATUS_REJECTED, 'tmsd'), 'The travel order has been rejected by the TMSD chief'),
+            ((TravelOrder.STATUS_REJECTED, 'afsd'), 'The travel order has been rejected by the AFSD Chief'),
+            ((TravelOrder.STATUS_FINAL_APPROVED, 'regional'), 'The travel order has been approved by the Regional Director'),
+        ]
+        for (code, stage), label in cases:
+            self.assertEqual(TravelOrder.status_label(code, stage), label)
+
+    def test_outcome_follows_code(self):
+        order = make_order(self.employee)
+        order.set_status(TravelOrder.STATUS_APPROVED, 'urdaneta_csc')
+        self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_PENDING)
+        order.set_status(TravelOrder.STATUS_FINAL_APPROVED, 'regional')
+        self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_APPROVED)
+        order.set_status(TravelOrder.STATUS_REJECTED, 'regional')
+        self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_REJECTED)
+
+    def test_backfill_parses_stored_sentences(self):
+        migration = importlib.import_module('api1.migrations.0039_travelorder_status_code')
+        self.assertEqual(
+            migration.parse_status('The travel order has been approved by the Pangasinan PO head'),
+            (TravelOrder.STATUS_APPROVED, 'pangasinan_po'),
+        )
+        self.assertEqual(
+            migration.parse_status('The travel order has been approved by the Regional Director'),
+            (TravelOrder.STATUS_FINAL_APPROVED, 'regional'),
+        )
+        self.assertEqual(
+            migration.parse_status('The travel order has been rejected by the CSC head.'),
+            (TravelOrder.STATUS_REJECTED, None),
+        )
+        self.assertEqual(migration.parse_status('Travel Order Resubmitted'), (TravelOrder.STATUS_RESUBMITTED, None))
+        self.assertEqual(migration.parse_status('Travel order is placed'), (TravelOrder.STATUS_PLACED, None))
+        for (code, stage), label in migration.label_table().items():
+            self.assertEqual(TravelOrder.status_label(code, stage), label)
+
+    def test_pending_queue_skips_decided_orders(self):
+        pending = make_order(self.employee, current_approver=self.head)
+        make_order(
+            self.employee, current_approver=self.head,
+            **TravelOrder.status_fields(TravelOrder.STATUS_FINAL_APPROVED, 'regional'),
+        )
+        self.client.force_authenticate(self.head)
+        response = self.client.get('/api1/my-pending-approvals/')
+        self.assertEqual([row['id'] for row in response.data], [pending.id])
+        self.assertEqual(response.data[0]['status'], 'Travel order is placed')
+
+    def test_employee_dashboard_counts_by_outcome(self):
+        today = timezone.localdate()
+        make_order(self.employee, **TravelOrder.status_fields(TravelOrder.STATUS_FINAL_APPROVED, 'regional'))
+        make_order(self.employee, **TravelOrder.status_fields(TravelOrder.STATUS_REJECTED, 'urdaneta_csc'))
+        make_order(
+            self.employee, date_travel_from=today, date_travel_to=today,
+            **TravelOrder.status_fields(TravelOrder.STATUS_APPROVED, 'urdaneta_csc'),
+        )
+        self.client.force_authenticate(self.employee)
+        response = self.client.get('/api1/employee-dashboard/')
+        self.assertEqual(response.data['approved_by_director'], 1)
+        self.assertEqual(response.data['disapproved'], 1)
+        self.assertEqual(
+            [row['status'] for row in response.data['upcoming_travels']],
+            ['The travel order has been approved by the Urdaneta CSC head'],
+        )
+
+
+class DashboardCounterTests(TestCase):
+    """Counters follow each workflow transition and can be verified against the source tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def counters(self, user):
+        counter = get_counters(user)
+        return {field: getattr(counter, field) for field in COUNTER_FIELDS}
+
+    def assertCountersMatchSource(self):
+        users = [self.employee.id, self.head.id, self.director.id]
+        self.assertEqual(stale_counters(users), {})
+
+    def file_order(self):
+        self.client.force_authenticate(self.employee)
+        itinerary = [{
+            'itinerary_date': '2025-01-06', 'departure_time': '08:00', 'arrival_time': '12:00',
+            'transportation': None, 'transportation_allowance': '100.00', 'per_diem': '200.00',
+            'other_expense': '0.00', 'total_amount': '300.00',
+        }]
+        response = self.client.post('/api1/travel-orders/', {
+            'destination': 'Baguio City',
+            'purpose': 'Field validation',
+            'date_travel_from': '2025-01-06',
+            'date_travel_to': '2025-01-08',
+            'prepared_by': self.employee.id,
+            'employees': json.dumps([self.employee.id]),
+            'itinerary': json.dumps(itinerary),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def decide(self, user, order_id, decision, comment=None):
+        self.client.force_authenticate(user)
+        data = {'decision': decision}
+        if comment:
+            data['comment'] = comment
+        response = self.client.patch(f'/api1/approve-travel-order/{order_id}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_counters_follow_workflow(self):
+        order_id = self.file_order()
+        self.assertEqual(self.counters(self.employee)['total_orders'], 1)
+        self.assertEqual(self.counters(self.head)['pending_approvals'], 1)
+        self.assertCountersMatchSource()
+
+        self.decide(self.head, order_id, 'approve')
+        self.assertEqual(self.counters(self.head)['pending_approvals'], 0)
+        self.assertEqual(self.counters(self.director)['pending_approvals'], 1)
+        self.assertCountersMatchSource()
+
+        self.decide(self.director, order_id, 'reject', 'Missing itinerary')
+        self.assertEqual(self.counters(self.employee)['rejected'], 1)
+        self.assertEqual(self.counters(self.director)['pending_approvals'], 0)
+        self.assertCountersMatchSource()
+
+        self.client.force_authenticate(self.employee)
+        response = self.client.patch(f'/api1/resubmit-travel-order/{order_id}/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.counters(self.employee)['rejected'], 0)
+        self.assertEqual(self.counters(self.head)['pending_approvals'], 1)
+        self.assertCountersMatchSource()
+
+        self.decide(self.head, order_id, 'approve')
+        self.decide(self.director, order_id, 'approve')
+        self.assertEqual(
+            self.counters(self.employee),
+            {'total_orders': 1, 'approved': 1, 'rejected': 0, 'pending_approvals': 0},
+        )
+        self.assertCountersMatchSource()
+
+    def test_dashboards_read_one_counter_row(self):
+        make_order(self.employee, **TravelOrder.status_fields(TravelOrder.STATUS_REJECTED, 'urdaneta_csc'))
+        make_order(self.employee, current_approver=self.head)
+        get_counters(self.employee)
+        self.client.force_authenticate(self.employee)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api1/employee-dashboard/')
+        self.assertEqual(response.data['total_orders'], 2)
+        self.assertEqual(response.data['disapproved'], 1)
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+        self.client.force_authenticate(self.head)
+        response = self.client.get('/api1/head-dashboard/')
+        self.assertEqual(response.data['counts']['pending'], 1)
+
+    def test_badge_counts_are_one_row_read(self):
+        make_order(self.employee, **TravelOrder.status_fields(TravelOrder.STATUS_REJECTED, 'urdaneta_csc'))
+        make_order(self.employee, current_approver=self.head)
+        get_counters(self.head)
+        self.client.force_authenticate(self.head)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api1/dashboard-counters/')
+        self.assertEqual(response.data, {'total_orders': 0, 'approved': 0, 'rejected': 0, 'pending_approvals': 1})
+
+        self.client.force_authenticate(self.employee)
+        self.assertEqual(self.client.get('/api1/dashboard-counters/').data['rejected'], 1)
+
+    def test_user_without_orders_gets_empty_counters(self):
+        self.client.force_authenticate(self.director)
+        response = self.client.get('/api1/director-dashboard/')
+        self.assertEqual(response.data['stats']['pending'], 0)
+        self.assertTrue(DashboardCounter.objects.filter(user=self.director).exists())
+
+    def test_command_verifies_and_rebuilds(self):
+        make_order(self.employee, current_approver=self.head)
+        get_counters(self.employee)
+        DashboardCounter.objects.filter(user=self.employee).update(total_orders=7)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_dashboard_counters', '--verify', stdout=StringIO())
+        call_command('rebuild_dashboard_counters', stdout=StringIO())
+        call_command('rebuild_dashboard_counters', '--verify', stdout=StringIO())
+        self.assertEqual(self.counters(self.employee)['total_orders'], 1)
+        self.assertEqual(self.counters(self.head)['pending_approvals'], 1)
+
+
+class BulkDecisionTests(TestCase):
+    """Approvers decide many orders in one request, at a fixed number of queries."""
+    url = '/api1/approve-travel-orders/bulk/'
+    signature = 'data:image/png;base64,CCCC'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        invalidate_head_directory()
+        self.client = APIClient()
+
+    def decide(self, user, ids, decision='approve', **extra):
+        self.client.force_authenticate(user)
+        return self.client.post(self.url, {'ids': ids, 'decision': decision, **extra}, format='json')
+
+    def test_approves_only_orders_waiting_on_caller(self):
+        mine = [make_order(self.employee, current_approver=self.head) for _ in range(3)]
+        other = make_order(self.employee, current_approver=self.director)
+        for user in (self.employee, self.head, self.director):
+            get_counters(user)
+        response = self.decide(self.head, [o.id for o in mine] + [other.id, 999999], signature=self.signature)
+
+        self.assertEqual(response.status_code, 200)
+        results = {row['id']: row for row in response.data['results']}
+        self.assertTrue(all(results[o.id]['ok'] for o in mine))
+        self.assertFalse(results[other.id]['ok'])
+        self.assertFalse(results[999999]['ok'])
+
+        for order in mine:
+            order.refresh_from_db()
+            self.assertEqual(order.current_approver, self.director)
+            self.assertEqual(order.status_stage, 'urdaneta_csc')
+        self.assertEqual(Signature.objects.filter(signed_by=self.head).count(), 3)
+        self.assertEqual(Signature.objects.filter(signed_by=self.head).values('image').distinct().count(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        outbox.drain()
+        self.assertEqual(Notification.objects.filter(user=self.director).count(), 3)
+        self.assertEqual(TravelOrderEvent.objects.filter(actor=self.head, action=TravelOrder.STATUS_APPROVED).count(), 3)
+        self.assertEqual(stale_counters([self.employee.id, self.head.id, self.director.id]), {})
+
+    def test_final_approval_numbers_are_sequential(self):
+        orders = [make_order(self.employee, current_approver=self.director) for _ in range(3)]
+        response = self.decide(self.director, [o.id for o in orders])
+        numbers = [row['travel_order_number'] for row in response.data['results']]
+        prefix = f"R1-{timezone.now():%Y%m}-"
+        self.assertEqual(numbers, [f'{prefix}0001', f'{prefix}0002', f'{prefix}0003'])
+        self.assertEqual(
+            TravelOrder.objects.filter(status_outcome=TravelOrder.OUTCOME_APPROVED).count(), 3
+        )
+
+    def test_reject_notifies_filer_and_previous_signers(self):
+        orders = [make_order(self.employee, current_approver=self.director, signers=[self.head]) for _ in range(2)]
+        self.assertEqual(self.decide(self.director, [o.id for o in orders], 'reject').status_code, 400)
+
+        response = self.decide(self.director, [o.id for o in orders], 'reject', comment='Over budget')
+        self.assertTrue(all(row['ok'] for row in response.data['results']))
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_REJECTED)
+            self.assertEqual(order.rejected_by, self.director)
+        outbox.drain()
+        self.assertEqual(Notification.objects.filter(user=self.employee, notification_type='travel_rejected').count(), 2)
+        self.assertEqual(Notification.objects.filter(user=self.head, notification_type='travel_rejected_by_next_approver').count(), 2)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        def queries_for(count):
+            ids = [make_order(self.employee, current_approver=self.head).id for _ in range(count)]
+            get_next_head(['urdaneta_csc'], 0)
+            with CaptureQueriesContext(connection) as queries:
+                self.decide(self.head, ids, signature=self.signature)
+            return len(queries.captured_queries)
+
+        queries_for(1)  # counter rows and the signature image now exist
+        self.assertEqual(queries_for(2), queries_for(12))
+
+    def test_rejects_malformed_requests(self):
+        self.assertEqual(self.decide(self.head, []).status_code, 400)
+        self.assertEqual(self.decide(self.head, ['x']).status_code, 400)
+        self.assertEqual(self.decide(self.head, [1], 'maybe').status_code, 400)
+
+
+class TravelOrderEventTests(TestCase):
+    """Every committed transition lands in the event log, and the timeline reads it back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.po_head = make_user('po_head', user_level='head', employee_type='pangasinan_po')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        invalidate_head_directory()
+        self.client = APIClient()
+
+    def act(self, user, url, data=None):
+        self.client.force_authenticate(user)
+        response = self.client.patch(url, data or {}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def decide(self, user, order, decision, comment=None):
+        data = {'decision': decision}
+        if comment:
+            data['comment'] = comment
+        self.act(user, f'/api1/approve-travel-order/{order.id}/', data)
+
+    def timeline(self, order):
+        self.client.force_authenticate(self.employee)
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api1/travel-orders/{order.id}/timeline/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_timeline_keeps_rejections_across_resubmission(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.decide(self.head, order, 'approve')
+        self.decide(self.po_head, order, 'reject', 'Wrong dates')
+        self.act(self.employee, f'/api1/resubmit-travel-order/{order.id}/')
+        self.decide(self.head, order, 'approve')
+
+        events = self.timeline(order)
+        self.assertEqual(
+            [(e['action'], e['stage'], e['actor']) for e in events],
+            [
+                (TravelOrder.STATUS_APPROVED, 'urdaneta_csc', self.head.id),
+                (TravelOrder.STATUS_REJECTED, 'pangasinan_po', self.po_head.id),
+                (TravelOrder.STATUS_RESUBMITTED, None, self.employee.id),
+                (TravelOrder.STATUS_APPROVED, 'urdaneta_csc', self.head.id),
+            ],
+        )
+        self.assertEqual(events[1]['comment'], 'Wrong dates')
+        self.assertEqual(events[1]['status'], STATUS_LABELS['pangasinan_po']['reject'])
+        self.assertEqual(events[1]['actor_name'], self.po_head.full_name)
+
+    def test_rejection_notifies_approvers_of_the_current_round(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.decide(self.head, order, 'approve')
+        self.decide(self.po_head, order, 'reject', 'Wrong dates')
+        self.act(self.employee, f'/api1/resubmit-travel-order/{order.id}/')
+        self.decide(self.head, order, 'approve')
+        self.decide(self.po_head, order, 'approve')
+        self.decide(self.director, order, 'reject', 'No budget')
+        outbox.drain()
+
+        notified = Notification.objects.filter(notification_type='travel_rejected_by_next_approver', message__contains='No budget')
+        self.assertEqual(sorted(notified.values_list('user_id', flat=True)), sorted([self.head.id, self.po_head.id]))
+
+    def test_previous_approvers_in_one_query(self):
+        orders = [make_order(self.employee, signers=[self.head, self.po_head]) for _ in range(3)]
+        TravelOrderEvent.objects.create(travel_order=orders[0], actor=self.employee, action=TravelOrder.STATUS_RESUBMITTED)
+        with self.assertNumQueries(1):
+            approvers = workflow.previous_approvers(orders)
+        self.assertEqual(approvers[orders[0].id], [])
+        self.assertEqual(approvers[orders[1].id], [self.po_head.id, self.head.id])
+
+    def test_events_are_append_only(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.decide(self.head, order, 'approve')
+        event = TravelOrderEvent.objects.get(travel_order=order)
+        event.comment = 'edited'
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_timeline_of_missing_order(self):
+        self.client.force_authenticate(self.employee)
+        self.assertEqual(self.client.get('/api1/travel-orders/999999/timeline/').status_code, 404)
+
+
+class NotificationFanoutTests(TestCase):
+    """A transition notifies each user at most once, with a single insert."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        invalidate_head_directory()
+        self.client = APIClient()
+
+    def decide(self, user, order, data):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(f'/api1/approve-travel-order/{order.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "api1_outboxmessage"')]
+        self.assertEqual(len(inserts), 1)
+        with CaptureQueriesContext(connection) as queries:
+            outbox.drain()
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "api1_notification"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_final_approval_notifies_filer_once(self):
+        order = make_order(self.employee, current_approver=self.director)
+        self.decide(self.director, order, {'decision': 'approve'})
+        self.assertEqual(
+            list(Notification.objects.filter(travel_order=order).values_list('user', 'notification_type')),
+            [(self.employee.id, 'travel_final_approved')],
+        )
+
+    def test_rejection_notifies_each_approver_once(self):
+        # The head signed twice in this round, and the filer approved too
+        order = make_order(self.employee, current_approver=self.director, signers=[self.head, self.employee, self.head])
+        self.decide(self.director, order, {'decision': 'reject', 'comment': 'No budget'})
+        self.assertEqual(
+            sorted(Notification.objects.filter(travel_order=order).values_list('user', 'notification_type')),
+            sorted([(self.employee.id, 'travel_rejected'), (self.head.id, 'travel_rejected_by_next_approver')]),
+        )
+
+    def test_fanout_dedupes_by_user_and_order(self):
+        orders = [make_order(self.employee), make_order(self.employee)]
+        fanout = NotificationFanout()
+        self.assertTrue(fanout.add(self.head, orders[0], 'travel_approved', 'First', ''))
+        self.assertFalse(fanout.add(self.head.id, orders[0], 'travel_rejected', 'Second', ''))
+        self.assertTrue(fanout.add(self.head, orders[1], 'travel_approved', 'Other order', ''))
+        self.assertFalse(fanout.add(None, orders[1], 'travel_approved', 'Nobody', ''))
+        with self.assertNumQueries(1):
+            fanout.send()
+        self.assertEqual(sorted(Notification.objects.values_list('title', flat=True)), ['First', 'Other order'])
+        with self.assertNumQueries(0):
+            fanout.send()
+
+
+def failing_handler(payload):
+    raise RuntimeError(payload['reason'])
+
+
+@override_settings(OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_DELAY=30)
+class OutboxTests(TestCase):
+    """Side effects are queued with the transition and handled, with retries, by the worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        invalidate_head_directory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.head)
+
+    def approve(self, order):
+        return self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+
+    def test_approval_queues_its_notifications(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.assertEqual(self.approve(order).status_code, 200)
+        self.assertFalse(Notification.objects.exists())
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.topic, 'notifications.send')
+        self.assertEqual(len(message.payload['notifications']), 2)
+
+        out = StringIO()
+        call_command('process_outbox', '--once', stdout=out)
+        self.assertIn('Handled 1 outbox messages, 0 failed', out.getvalue())
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user', flat=True)), sorted([self.employee.id, self.director.id]),
+        )
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_lost_race_queues_nothing(self):
+        order = make_order(self.employee, current_approver=self.head)
+        TravelOrder.objects.filter(pk=order.pk).update(version=F('version') + 1)
+        with mock.patch('api1.views.get_object_or_404', return_value=order):
+            self.assertEqual(self.approve(order).status_code, 409)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_failures_back_off_then_give_up(self):
+        message = OutboxMessage.objects.create(topic='test.fail', payload={'reason': 'mail server down'})
+        with mock.patch.dict(outbox.HANDLERS, {'test.fail': 'api1.tests.failing_handler'}):
+            self.assertEqual(outbox.drain(), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, 1)
+            self.assertIn('mail server down', message.last_error)
+            self.assertGreater(message.available_at, timezone.now() + timedelta(seconds=25))
+            # Not due again until the backoff has passed
+            self.assertEqual(outbox.drain(), (0, 0))
+
+            for attempts in (2, 3):
+                OutboxMessage.objects.update(available_at=timezone.now())
+                self.assertEqual(outbox.drain(), (0, 1))
+            message.refresh_from_db()
+            self.assertEqual(message.attempts, 3)
+            self.assertEqual(outbox.retry_delay(3), timedelta(seconds=120))
+
+            OutboxMessage.objects.update(available_at=timezone.now())
+            self.assertEqual(outbox.drain(), (0, 0))
+        self.assertTrue(OutboxMessage.objects.filter(pk=message.pk).exists())
+
+    def test_failure_rolls_back_only_its_own_message(self):
+        order = make_order(self.employee)
+        fanout = NotificationFanout()
+        fanout.add(self.head, order, 'travel_approved', 'Queued', '')
+        fanout.defer()
+        OutboxMessage.objects.create(topic='test.fail', payload={'reason': 'boom'})
+        with mock.patch.dict(outbox.HANDLERS, {'test.fail': 'api1.tests.failing_handler'}):
+            self.assertEqual(outbox.process_batch(), (1, 1))
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['Queued'])
+        self.assertEqual(list(OutboxMessage.objects.values_list('topic', flat=True)), ['test.fail'])
+
+    def test_deleted_orders_are_skipped(self):
+        orders = [make_order(self.employee), make_order(self.employee)]
+        fanout = NotificationFanout()
+        for order in orders:
+            fanout.add(self.head, order, 'travel_approved', str(order.id), '')
+        fanout.defer()
+        orders[0].delete()
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), [str(orders[1].id)])
+
+    def test_unknown_topic_is_refused(self):
+        with self.assertRaises(ValueError):
+            outbox.enqueue('no.such.topic', {})
+
+
+class PushDirectoryMixin:
+    """Point NOTIFICATION_PUSH_DIR at a fresh directory for each test."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp(prefix='push')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        override = override_settings(NOTIFICATION_PUSH_DIR=directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.push_dir = directory
+
+
+class PushPubSubTests(PushDirectoryMixin, SimpleTestCase):
+    """Messages published by any process reach the streams subscribed in this one."""
+
+    async def test_publish_reaches_only_the_users_queues(self):
+        hub = push.get_hub()
+        queue = hub.subscribe(7)
+        try:
+            push.publish([
+                {'user': 8, 'event': 'unread_count', 'data': {'unread_count': 9}},
+                {'user': 7, 'event': 'unread_count', 'data': {'unread_count': 3}},
+            ])
+            message = await asyncio.wait_for(queue.get(), 2)
+            self.assertEqual(message['data'], {'unread_count': 3})
+            await asyncio.sleep(0.05)
+            self.assertTrue(queue.empty())
+        finally:
+            hub.unsubscribe(7, queue)
+        self.assertEqual(push.subscriber_sockets(), [])
+        self.assertFalse(push.listening())
+
+    async def test_another_process_can_publish(self):
+        hub = push.get_hub()
+        queue = hub.subscribe(7)
+        try:
+            message = {'user': 7, 'event': 'notification', 'data': {'title': 'From elsewhere'}}
+            subprocess.run(
+                [sys.executable, '-c', 'import json, sys; from api1.push import publish; publish(json.loads(sys.argv[1]), sys.argv[2])',
+                 json.dumps([message]), self.push_dir],
+                cwd=settings.BASE_DIR, check=True,
+            )
+            self.assertEqual(await asyncio.wait_for(queue.get(), 2), message)
+        finally:
+            hub.unsubscribe(7, queue)
+
+    def test_sockets_of_exited_processes_are_removed(self):
+        path = os.path.join(self.push_dir, 'gone.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(path)
+        push.publish([{'user': 1, 'event': 'unread_count', 'data': {}}])
+        self.assertFalse(os.path.exists(path))
+
+    def test_large_batches_are_split(self):
+        messages = [{'user': 1, 'event': 'notification', 'data': {'message': 'x' * 1000}} for _ in range(200)]
+        payloads = list(push.datagrams(messages))
+        self.assertGreater(len(payloads), 1)
+        self.assertTrue(all(len(payload) <= push.MAX_DATAGRAM for payload in payloads))
+        self.assertEqual(sum(len(json.loads(payload)) for payload in payloads), 200)
+
+    async def test_stream_ends_when_the_token_expires(self):
+        chunks = [chunk async for chunk in push.event_stream(7, [('unread_count', {'unread_count': 0})], clock.time() - 1)]
+        self.assertEqual(chunks[0], f'retry: {push.RETRY_MS}\n\n')
+        self.assertEqual(chunks[-1], 'event: expired\ndata: {}\n\n')
+        self.assertFalse(push.listening())
+
+
+class NotificationStreamTests(PushDirectoryMixin, TestCase):
+    """The SSE endpoint authenticates with the access cookie and relays pushed notifications."""
+    url = '/api1/notifications/stream/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.order = make_order(cls.employee, current_approver=cls.head)
+        Notification.objects.create(
+            user=cls.employee, travel_order=cls.order, notification_type='travel_approved', title='Old', message='',
+        )
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    async def test_requires_the_access_cookie(self):
+        response = await AsyncClient().get(self.url)
+        self.assertEqual(response.status_code, 401)
+        client = AsyncClient()
+        client.cookies['access_token'] = 'not-a-token'
+        self.assertEqual((await client.get(self.url)).status_code, 401)
+
+    def test_refused_under_wsgi(self):
+        # The sync test client hands the view a WSGIRequest, as a WSGI server would
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.employee))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+        self.assertFalse(push.listening())
+
+    async def test_streams_count_then_new_notifications(self):
+        client = AsyncClient()
+        client.cookies['access_token'] = str(AccessToken.for_user(self.employee))
+        response = await client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+            self.assertEqual(await anext(chunks), b'event: unread_count\ndata: {"unread_count": 1}\n\n')
+
+            notification = await Notification.objects.acreate(
+                user=self.employee, travel_order=self.order, notification_type='travel_approved', title='New', message='',
+            )
+            notification.travel_order = self.order
+            await sync_to_async(notifications_committed)([notification])
+            event, data = (await asyncio.wait_for(anext(chunks), 2)).decode().split('\n')[:2]
+            self.assertEqual(event, 'event: notification')
+            data = json.loads(data.removeprefix('data: '))
+            self.assertEqual(data['unread_count'], 2)
+            self.assertEqual(data['notification']['id'], notification.id)
+            self.assertEqual(data['notification']['travel_order_destination'], 'Baguio City')
+        finally:
+            # A client disconnect cancels the task waiting on the stream
+            waiting = asyncio.ensure_future(anext(chunks))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await waiting
+        self.assertFalse(push.listening())
+
+
+class NotificationPublishTests(TestCase):
+    """Notification writes publish to open streams once committed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_head_directory()
+        self.client = APIClient()
+        self.published = []
+        for target, replacement in ((push, 'listening'), (push, 'publish')):
+            patcher = mock.patch.object(target, replacement, (lambda *a: True) if replacement == 'listening' else self.published.extend)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_approval_publishes_after_commit(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.client.force_authenticate(self.head)
+        self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+        self.assertEqual(self.published, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.drain()
+        self.assertEqual(
+            sorted((m['user'], m['event'], m['data']['unread_count']) for m in self.published),
+            sorted([(self.employee.id, 'notification', 1), (self.director.id, 'notification', 1)]),
+        )
+
+    def test_marking_read_publishes_the_new_count(self):
+        order = make_order(self.employee)
+        notifications = Notification.objects.bulk_create([
+            Notification(user=self.employee, travel_order=order, notification_type='travel_approved', title=str(i), message='')
+            for i in range(3)
+        ])
+        self.client.force_authenticate(self.employee)
+        for url in [f'/api1/notifications/{notifications[0].id}/mark-read/'] * 2 + ['/api1/notifications/mark-all-read/'] * 2:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(url)
+        self.assertEqual([m['data']['unread_count'] for m in self.published], [2, 0])
+
+
+class UnreadCountTests(TestCase):
+    """Unread counts are cache reads, kept in step by the writes and repaired by reconciliation."""
+    url = '/api1/notifications/count/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_head_directory()
+        self.client = APIClient()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.employee))
+
+    def count(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def notify(self, user, n=1):
+        order = make_order(self.employee)
+        return Notification.objects.bulk_create([
+            Notification(user=user, travel_order=order, notification_type='travel_approved', title='t', message='')
+            for _ in range(n)
+        ])
+
+    def test_count_is_a_cache_read(self):
+        self.notify(self.employee, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.count(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), 2)
+
+    def test_writes_adjust_the_cached_count(self):
+        self.assertEqual(self.count(), 0)
+        order = make_order(self.employee, current_approver=self.head)
+        approver = APIClient()
+        approver.force_authenticate(self.head)
+        with self.captureOnCommitCallbacks(execute=True):
+            approver.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+            outbox.drain()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count(), 1)
+
+        notification = Notification.objects.get(user=self.employee)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api1/notifications/{notification.id}/mark-read/')
+        self.assertEqual(self.count(), 0)
+
+        self.notify(self.employee, 3)
+        cache.set(unread_key(self.employee.id), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api1/notifications/mark-all-read/')
+        self.assertEqual(self.count(), 0)
+
+    def test_worker_increments_are_read_by_other_processes(self):
+        # Two connections to one file-based cache stand in for the outbox worker's process and a web worker's
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(self.count(), 0)
+            order = make_order(self.employee, current_approver=self.head)
+            approver = APIClient()
+            approver.force_authenticate(self.head)
+            approver.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+            with mock.patch('api1.notifications.cache', caches.create_connection('default')), \
+                    self.captureOnCommitCallbacks(execute=True):
+                outbox.drain()
+            with self.assertNumQueries(0):
+                self.assertEqual(self.count(), 1)
+
+    def test_negative_count_is_recounted(self):
+        self.notify(self.employee)
+        cache.set(unread_key(self.employee.id), -1)
+        self.assertEqual(self.count(), 1)
+
+    def test_reconcile_command(self):
+        self.notify(self.employee)
+        self.notify(self.head, 2)
+        cache.set(unread_key(self.employee.id), 5)
+        cache.set(unread_key(self.head.id), 2)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_unread_counts', '--verify', stdout=StringIO())
+
+        out = StringIO()
+        call_command('reconcile_unread_counts', stdout=out)
+        self.assertIn('1 of 3 users were stale', out.getvalue())
+        self.assertEqual(self.count(), 1)
+        call_command('reconcile_unread_counts', '--verify', stdout=StringIO())
+
+
+class NotificationFeedTests(TestCase):
+    """The feed is keyset-paged by id, with since_id deltas and conditional GETs."""
+    url = '/api1/notifications/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.other = make_user('other')
+        cls.order = make_order(cls.employee, destination='Baguio')
+        Notification.objects.bulk_create([
+            Notification(user=cls.employee, travel_order=cls.order, notification_type='travel_approved',
+                         title=f'n{i}', message='')
+            for i in range(25)
+        ] + [
+            Notification(user=cls.other, travel_order=cls.order, notification_type='travel_approved',
+                         title='other', message='')
+        ])
+        cls.ids = list(Notification.objects.filter(user=cls.employee).order_by('-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.cookies['access_token'] = str(AccessToken.for_user(self.employee))
+
+    def test_first_page_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([row['id'] for row in results], self.ids[:20])
+        self.assertEqual(results[0]['travel_order_destination'], 'Baguio')
+        self.assertEqual(results[0]['travel_order_id'], self.order.id)
+        self.assertFalse(response.data['truncated'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[20:])
+        self.assertIsNone(response.data['next'])
+
+    def test_since_id(self):
+        response = self.client.get(self.url, {'since_id': self.ids[3]})
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[:3])
+        self.assertIsNone(response.data['next'])
+        self.assertFalse(response.data['truncated'])
+
+        response = self.client.get(self.url, {'since_id': self.ids[-1], 'page_size': 5})
+        self.assertEqual([row['id'] for row in response.data['results']], self.ids[:5])
+        self.assertTrue(response.data['truncated'])
+
+        response = self.client.get(self.url, {'since_id': self.ids[0]})
+        self.assertEqual(response.data['results'], [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'before': 'x'}).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'since_id': '-1'}).status_code, 404)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Reading a notification changes the page
+        Notification.objects.filter(id=self.ids[0]).update(is_read=True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PruneNotificationsTests(TestCase):
+    """Old read notifications are deleted in primary-key batches; unread and recent ones stay."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        order = make_order(cls.employee)
+        Notification.objects.bulk_create([
+            Notification(user=cls.employee, travel_order=order, notification_type='travel_approved',
+                         title=f'n{i}', message='', is_read=i % 3 != 0)
+            for i in range(30)
+        ])
+        ids = list(Notification.objects.order_by('id').values_list('id', flat=True))
+        # The first 20 are old; ids grow with created_at as they do in production
+        for days, pk in zip(range(120, 100, -1), ids[:20]):
+            Notification.objects.filter(id=pk).update(created_at=timezone.now() - timedelta(days=days))
+        cls.old_read = set(Notification.objects.filter(id__in=ids[:20], is_read=True).values_list('id', flat=True))
+
+    def prune(self, *args):
+        out = StringIO()
+        call_command('prune_notifications', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        out = self.prune('--dry-run', '--batch-size', '7')
+        self.assertIn(f'Would delete {len(self.old_read)} ', out)
+        self.assertEqual(Notification.objects.count(), 30)
+
+    def test_prune(self):
+        out = self.prune('--batch-size', '7', '--days', '90')
+        self.assertIn(f'Deleted {len(self.old_read)} ', out)
+        self.assertIn('rows/sec', out)
+        remaining = Notification.objects.all()
+        self.assertEqual(remaining.count(), 30 - len(self.old_read))
+        self.assertFalse(remaining.filter(id__in=self.old_read).exists())
+        self.assertTrue(remaining.filter(is_read=False, created_at__lt=timezone.now() - timedelta(days=90)).exists())
+
+        self.assertIn('Deleted 0 ', self.prune())
+
+    def test_stops_at_the_cutoff(self):
+        cutoff = timezone.now() - timedelta(days=90)
+        batches = list(prune_read_notifications(cutoff, batch_size=5, dry_run=True))
+        # Four batches cover the 20 old rows; the fifth reaches a recent one and ends the walk
+        self.assertEqual(len(batches), 5)
+        self.assertEqual(sum(scanned for _, scanned, _ in batches), 25)
+
+    def test_rejects_bad_days(self):
+        with self.assertRaises(CommandError):
+            self.prune('--days', '0')
+
+
+@override_settings(NOTIFICATION_DIGEST_MAX_ITEMS=3)
+class NotificationDigestTests(TestCase):
+    """One digest email per user and day, of that day's unread notifications, sent a batch at a time."""
+    day = date(2025, 3, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [make_user(f'approver{i}', email=f'approver{i}@example.com') for i in range(5)]
+        cls.no_email = make_user('noemail', email='')
+        cls.order = make_order(cls.users[0], destination='Vigan')
+        start, _ = digest.digest_period(cls.day)
+
+        def notify(user, title, at, is_read=False):
+            notification = Notification.objects.create(
+                user=user, travel_order=cls.order, notification_type='travel_approved',
+                title=title, message=f'{title} message', is_read=is_read,
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=at)
+
+        for i, user in enumerate(cls.users):
+            for n in range(i + 1):
+                notify(user, f'{user.username}-{n}', start + timedelta(hours=n + 1))
+        notify(cls.users[0], 'read', start + timedelta(hours=2), is_read=True)
+        notify(cls.users[0], 'day before', start - timedelta(minutes=1))
+        notify(cls.users[0], 'day after', start + timedelta(days=1))
+        notify(cls.no_email, 'nowhere', start + timedelta(hours=1))
+
+    def test_one_digest_per_user(self):
+        sent = list(digest.send_digests(self.day, batch_size=2))
+        self.assertEqual(sent, [(2, 2), (2, 2), (1, 1)])
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), sorted(u.email for u in self.users))
+
+        first = next(m for m in mail.outbox if m.to == [self.users[0].email])
+        self.assertIn('You have 1 unread notification from March 10, 2025', first.body)
+        self.assertIn('- approver0-0 (Vigan)', first.body)
+        for title in ('read', 'day before', 'day after'):
+            self.assertNotIn(f'- {title} ', first.body)
+
+        last = next(m for m in mail.outbox if m.to == [self.users[4].email])
+        self.assertIn('(5)', last.subject)
+        self.assertEqual(last.body.count('\n- '), 3)
+        self.assertIn('...and 2 more.', last.body)
+
+    def test_queries_per_batch_are_fixed(self):
+        with self.assertNumQueries(5):
+            # Users and their notifications for each of two batches, then the empty batch that ends the walk
+            for _ in digest.send_digests(self.day, batch_size=3):
+                pass
+
+    def test_command(self):
+        out = StringIO()
+        call_command('send_notification_digests', '--date', '2025-03-10', '--user', str(self.users[1].id), stdout=out)
+        self.assertIn('Sent 1 digests for 2025-03-10 to 1 users', out.getvalue())
+        self.assertEqual(mail.outbox[0].to, [self.users[1].email])
+
+        with self.assertRaises(CommandError):
+            call_command('send_notification_digests', '--date', 'yesterday', stdout=StringIO())
+
+
+class ApproverMetricsTests(TestCase):
+    """Queue depth, waits and throughput per stage and approver, from the event log."""
+    url = '/api1/approver-metrics/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.po_head = make_user('po_head', user_level='head', employee_type='pangasinan_po')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.director)
+
+    def waiting(self, approver, hours, approval_stage=1):
+        """An order that reached `approver`, at `approval_stage` of the employee's chain, `hours` ago."""
+        order = make_order(self.employee, current_approver=approver, approval_stage=approval_stage)
+        TravelOrderEvent.objects.create(
+            travel_order=order, actor=self.employee, action=TravelOrder.STATUS_PLACED,
+            created_at=timezone.now() - timedelta(hours=hours + 100),
+        )
+        TravelOrderEvent.objects.create(
+            travel_order=order, actor=self.head, action=TravelOrder.STATUS_APPROVED, stage='urdaneta_csc',
+            created_at=timezone.now() - timedelta(hours=hours),
+        )
+        return order
+
+    def test_queue_depth_and_waits(self):
+        for hours in (1, 2, 3, 4, 100):
+            self.waiting(self.po_head, hours)
+        self.waiting(self.director, 10, approval_stage=4)
+        make_order(self.employee, current_approver=self.head)  # filed before the event log: waits since submission
+
+        data = self.client.get(self.url).data
+        stages = {row['stage']: row for row in data['stages']}
+        self.assertEqual(stages['pangasinan_po']['depth'], 5)
+        self.assertEqual(stages['pangasinan_po']['p50_hours'], 3.0)
+        self.assertEqual(stages['pangasinan_po']['p90_hours'], 100.0)
+        self.assertEqual(stages['regional']['max_hours'], 10.0)
+        self.assertEqual(stages['urdaneta_csc']['depth'], 1)
+        self.assertIsNone(stages['tmsd']['p50_hours'])
+
+        self.assertEqual([row['approver'] for row in data['approvers']], [self.po_head.id, self.director.id, self.head.id])
+        self.assertEqual(data['approvers'][0]['name'], 'Po_Head Tester')
+
+        # Six approvals by the CSC head today, one a hundred hours ago
+        self.assertEqual(data['throughput']['datasets'][0]['label'], 'Urdaneta CSC')
+        self.assertEqual(stages['urdaneta_csc']['decided'], 6)
+        self.assertEqual(sum(data['throughput']['datasets'][0]['data']), 6)
+        self.assertEqual(len(data['throughput']['labels']), 30)
+
+    def test_director_fallback_counts_at_the_waiting_stage(self):
+        # TMSD has no head, so the order went to the director while still at the TMSD stage
+        self.waiting(self.director, 7, approval_stage=2)
+        stages = {row['stage']: row for row in self.client.get(self.url).data['stages']}
+        self.assertEqual(stages['tmsd']['depth'], 1)
+        self.assertEqual(stages['tmsd']['max_hours'], 7.0)
+        self.assertEqual(stages['regional']['depth'], 0)
+
+    def test_decided_orders_leave_the_queue(self):
+        order = self.waiting(self.po_head, 5)
+        order.set_status(TravelOrder.STATUS_REJECTED, 'pangasinan_po')
+        order.save()
+        data = self.client.get(self.url).data
+        self.assertEqual(data['approvers'], [])
+
+    def test_cached_and_bounded_queries(self):
+        for hours in range(5):
+            self.waiting(self.po_head, hours)
+        with self.assertNumQueries(3):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_admin_and_director_only(self):
+        self.client.force_authenticate(self.head)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_authenticate(self.director)
+        self.assertEqual(self.client.get(self.url, {'days': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'days': 0}).status_code, 400)
+        self.assertEqual(len(self.client.get(self.url, {'days': 7}).data['throughput']['labels']), 7)
+
+
+class TransitionConflictTests(TestCase):
+    """A transition acting on an order someone else changed since it was read is refused whole."""
+    signature = 'data:image/png;base64,CCCC'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = make_user('employee')
+        cls.head = make_user('head', user_level='head')
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+        cls.bookkeeper = make_user('bookkeeper', user_level='bookkeeper', employee_type=None)
+
+    def setUp(self):
+        invalidate_head_directory()
+        self.client = APIClient()
+
+    def changed_meanwhile(self, transition):
+        """Wrap a workflow step so the order's row moves on between the view's read and its write."""
+        def step(order, *args):
+            TravelOrder.objects.filter(pk=order.pk).update(version=F('version') + 1)
+            return transition(order, *args)
+        return step
+
+    def test_each_transition_bumps_the_version(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.client.force_authenticate(self.head)
+        self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+        self.client.force_authenticate(self.director)
+        self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'reject', 'comment': 'No'}, format='json')
+        self.client.force_authenticate(self.employee)
+        self.client.patch(f'/api1/resubmit-travel-order/{order.id}/', format='json')
+        order.refresh_from_db()
+        self.assertEqual(order.version, 3)
+        self.assertEqual(order.current_approver, self.head)
+
+    def test_stale_approval_writes_nothing(self):
+        order = make_order(self.employee, current_approver=self.head)
+        for user in (self.employee, self.head):
+            get_counters(user)
+        self.client.force_authenticate(self.head)
+        with mock.patch.object(workflow, 'approve', self.changed_meanwhile(workflow.approve)):
+            response = self.client.patch(
+                f'/api1/approve-travel-order/{order.id}/',
+                {'decision': 'approve', 'signature': self.signature}, format='json',
+            )
+
+        self.assertEqual(response.status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual(order.current_approver, self.head)
+        self.assertEqual(order.status_code, TravelOrder.STATUS_PLACED)
+        self.assertFalse(Signature.objects.filter(order=order).exists())
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(TravelOrderEvent.objects.exists())
+        self.assertEqual(stale_counters([self.employee.id, self.head.id, self.director.id]), {})
+
+    def test_stale_final_approval_returns_its_number(self):
+        order = make_order(self.employee, current_approver=self.director)
+        self.client.force_authenticate(self.director)
+        with mock.patch.object(workflow, 'approve', self.changed_meanwhile(workflow.approve)):
+            response = self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(generate_travel_order_number(), f"R1-{timezone.now():%Y%m}-0001")
+
+    def test_stale_final_approval_never_draws_a_number(self):
+        order = make_order(self.employee, current_approver=self.director)
+        self.client.force_authenticate(self.director)
+        with mock.patch.object(workflow, 'approve', self.changed_meanwhile(workflow.approve)), \
+                mock.patch('api1.workflow.generate_travel_order_numbers') as generate:
+            response = self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        generate.assert_not_called()
+
+    def test_final_approval_saves_its_number(self):
+        order = make_order(self.employee, current_approver=self.director)
+        self.client.force_authenticate(self.director)
+        response = self.client.patch(f'/api1/approve-travel-order/{order.id}/', {'decision': 'approve'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.travel_order_number, f"R1-{timezone.now():%Y%m}-0001")
+        self.assertEqual(order.version, 1)
+
+    def test_stale_rejection_writes_nothing(self):
+        order = make_order(self.employee, current_approver=self.head)
+        self.client.force_authenticate(self.head)
+        with mock.patch.object(workflow, 'reject', self.changed_meanwhile(workflow.reject)):
+            response = self.client.patch(
+                f'/api1/approve-travel-order/{order.id}/', {'decision': 'reject', 'comment': 'No'}, format='json',
+            )
+        self.assertEqual(response.status_code, 409)
+        order.refresh_from_db()
+        self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_PENDING)
+        self.assertIsNone(order.rejected_by)
+
+    def test_stale_instance_cannot_save_transition(self):
+        order = make_order(self.employee, current_approver=self.head)
+        first, second = TravelOrder.objects.get(pk=order.pk), TravelOrder.objects.get(pk=order.pk)
+        first.set_status(TravelOrder.STATUS_REJECTED, 'urdaneta_csc')
+        self.assertTrue(first.save_transition(['status_code', 'status_stage', 'status_outcome']))
+        second.current_approver = self.director
+        self.assertFalse(second.save_transition(['current_approver']))
+        order.refresh_from_db()
+        self.assertEqual(order.current_approver, self.head)
+        self.assertEqual(order.status_outcome, TravelOrder.OUTCOME_REJECTED)
+
+    def test_liquidation_is_reviewed_once(self):
+        liquidation = Liquidation.objects.create(
+            travel_order=make_order(self.employee), uploaded_by=self.employee,
+            certificate_of_travel='a.pdf', certificate_of_appearance='b.pdf', after_travel_report='c.pdf',
+        )
+        first, second = Liquidation.objects.get(pk=liquidation.pk), Liquidation.objects.get(pk=liquidation.pk)
+        self.assertTrue(first.review('Pending', status='Rejected', bookkeeper_comment='Missing receipts'))
+        self.assertFalse(second.review('Pending', status='Under Final Audit', bookkeeper_comment=''))
+        liquidation.refresh_from_db()
+        self.assertEqual(liquidation.status, 'Rejected')
+        self.assertEqual(liquidation.bookkeeper_comment, 'Missing receipts')
+
+        self.client.force_authenticate(self.bookkeeper)
+        response = self.client.patch(f'/api1/liquidation/{liquidation.pk}/bookkeeper-review/', {'approve': True}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConcurrentApprovalTests(TransactionTestCase):
+    """Approvers pressing approve on the same order at once: one wins, the rest are told so."""
+    threads = 6
+
+    def test_one_approval_wins(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('In-memory SQLite shares one connection-level lock; run against MySQL or a file database')
+        employee = make_user('employee')
+        head = make_user('head', user_level='head')
+        make_user('director', user_level='director', employee_type='regional')
+        order = make_order(employee, current_approver=head)
+        for user in (employee, head):
+            get_counters(user)
+        invalidate_head_directory()
+        start = threading.Barrier(self.threads)
+        codes, errors = [], []
+
+        def worker():
+            try:
+                client = APIClient()
+                client.force_authenticate(head)
+                start.wait()
+                response = client.patch(
+                    f'/api1/approve-travel-order/{order.id}/',
+                    {'decision': 'approve', 'signature': 'data:image/png;base64,CCCC'}, format='json',
+                )
+                codes.append(response.status_code)
+            except Exception as exc:  # surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(codes.count(200), 1)
+        # Losers either lost the write (409) or read the order after it had moved on (403)
+        self.assertTrue(set(codes) <= {200, 403, 409})
+        order.refresh_from_db()
+        self.assertEqual(order.version, 1)
+        self.assertEqual(Signature.objects.filter(order=order).count(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        outbox.drain()
+        self.assertEqual(Notification.objects.filter(travel_order=order).count(), 2)
+        self.assertEqual(stale_counters([employee.id, head.id]), {})
+
+
+class TravelOrderNumberAllocatorTests(TestCase):
+    def test_continues_after_numbers_already_issued(self):
+        employee = make_user('employee')
+        make_order(employee, travel_order_number='R1-202503-0041')
+        make_order(employee, travel_order_number='R1-202504-0007')
+        self.assertEqual(generate_travel_order_number(date(2025, 3, 9)), 'R1-202503-0042')
+        self.assertEqual(generate_travel_order_numbers(2, date(2025, 3, 9)), ['R1-202503-0043', 'R1-202503-0044'])
+        self.assertEqual(generate_travel_order_number(date(2025, 5, 1)), 'R1-202505-0001')
+
+    def test_allocation_reads_one_row(self):
+        generate_travel_order_number(date(2025, 3, 9))
+        with CaptureQueriesContext(connection) as queries:
+            generate_travel_order_number(date(2025, 3, 9))
+        self.assertFalse([q for q in queries.captured_queries if 'api1_travelorder"' in q['sql'] or 'api1_travelorder`' in q['sql']])
+
+    def test_rolled_back_allocation_is_reused(self):
+        try:
+            with transaction.atomic():
+                generate_travel_order_number(date(2025, 3, 9))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(generate_travel_order_number(date(2025, 3, 9)), 'R1-202503-0001')
+
+    def test_director_created_order_gets_a_number(self):
+        director = make_user('director', user_level='director', employee_type='regional')
+        client = APIClient()
+        client.force_authenticate(director)
+        response = client.post('/api1/travel-orders/', {
+            'destination': 'Laoag City',
+            'purpose': 'Regional visit',
+            'date_travel_from': '2025-01-06',
+            'date_travel_to': '2025-01-08',
+            'prepared_by': director.id,
+            'employees': json.dumps([director.id]),
+            'itinerary': json.dumps([]),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['travel_order_number'], f"R1-{timezone.localdate():%Y%m}-0001")
+
+
+class TravelOrderNumberConcurrencyTests(TransactionTestCase):
+    """Many threads allocating at once get every number exactly once."""
+    threads = 8
+    allocations = 15
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('In-memory SQLite shares one connection-level lock; run against MySQL or a file database')
+        if connection.vendor == 'sqlite' and connection.settings_dict['OPTIONS'].get('transaction_mode') != 'IMMEDIATE':
+            # A deferred transaction that read first cannot take the write lock while another holds it
+            self.skipTest("SQLite needs OPTIONS['transaction_mode'] = 'IMMEDIATE' for concurrent writers")
+
+    def run_workers(self, allocate):
+        """Run `allocate` in each thread, all starting together; returns the numbers they got."""
+        start = threading.Barrier(self.threads)
+        numbers, errors = [], []
+
+        def worker():
+            try:
+                start.wait()
+                numbers.extend(allocate())
+            except Exception as exc:  # surfaced by the assertion below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        return numbers
+
+    def test_no_gaps_or_duplicates_under_concurrency(self):
+        day = date(2025, 6, 1)
+        generate_travel_order_number(day)  # the prefix row exists, so threads only contend on it
+
+        def allocate():
+            numbers = []
+            for i in range(self.allocations):
+                with transaction.atomic():
+                    numbers.extend(generate_travel_order_numbers(1 + i % 3, day))
+            return numbers
+
+        numbers = self.run_workers(allocate)
+        expected = 1 + sum(1 + i % 3 for i in range(self.allocations)) * self.threads
+        self.assertEqual(len(numbers), len(set(numbers)))
+        self.assertEqual(
+            sorted(numbers + ['R1-202506-0001']),
+            [f'R1-202506-{n:04d}' for n in range(1, expected + 1)],
+        )
+
+    def test_first_allocations_of_a_new_prefix(self):
+        # No row for the month yet: every thread may try to create it at once
+        day = date(2025, 7, 1)
+
+        def allocate():
+            with transaction.atomic():
+                return generate_travel_order_numbers(2, day)
+
+        numbers = self.run_workers(allocate)
+        self.assertEqual(sorted(numbers), [f'R1-202507-{n:04d}' for n in range(1, 2 * self.threads + 1)])
+
+
+class MonthlyRollupTests(TestCase):
+    """The chart rollup follows employee links and matches grouping the join directly."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.csc = make_user('csc', employee_type='urdaneta_csc')
+        cls.po = make_user('po', employee_type='launion_po')
+        cls.admin = make_user('admin', user_level='admin', employee_type=None)
+        cls.director = make_user('director', user_level='director', employee_type='regional')
+
+    def chart(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        chart = response.data.get('chart', response.data)
+        return {dataset['label']: dataset['data'][-1] for dataset in chart['datasets']}
+
+    def assertRollupMatchesSource(self):
+        stored = {(row.month, row.employee_type): row.count for row in MonthlyTravelRollup.objects.exclude(count=0)}
+        self.assertEqual(stored, source_rollup())
+
+    def test_rollup_follows_employee_links(self):
+        order = make_order(self.csc, employees=[self.csc, self.po])
+        make_order(self.csc)
+        self.assertRollupMatchesSource()
+        this_month = self.chart(self.admin, '/api1/admin-dashboard/')
+        self.assertEqual(this_month['Pangasinan PO + CSCs'], 2)
+        self.assertEqual(this_month['La Union PO + CSCs'], 1)
+
+        order.employees.set([self.csc])
+        self.assertRollupMatchesSource()
+        self.assertEqual(self.chart(self.director, '/api1/director-dashboard/')['La Union PO + CSCs'], 0)
+
+        self.po.travel_orders.add(order)
+        order.employees.clear()
+        self.assertRollupMatchesSource()
+
+        order.delete()
+        self.assertRollupMatchesSource()
+        self.assertEqual(self.chart(self.admin, '/api1/admin-dashboard/')['Pangasinan PO + CSCs'], 1)
+
+    def test_charts_do_not_group_the_join(self):
+        make_order(self.csc, employees=[self.csc, self.po])
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api1/admin-dashboard/')
+        self.assertFalse([q for q in queries.captured_queries if 'api1_travelorder_employees' in q['sql']])
+
+    def test_backfill_command(self):
+        make_order(self.csc, employees=[self.csc, self.po])
+        MonthlyTravelRollup.objects.update(count=5)
+        with self.assertRaises(CommandError):
+            call_command('backfill_monthly_rollup', '--verify', stdout=StringIO())
+        call_command('backfill_monthly_rollup', stdout=StringIO())
+        call_command('backfill_monthly_rollup', '--verify', stdout=StringIO())
+        self.assertRollupMatchesSource()
+
+        month = timezone.localdate().strftime('%Y-%m')
+        MonthlyTravelRollup.objects.update(count=0)
+        call_command('backfill_monthly_rollup', '--since', month, stdout=StringIO())
+        self.assertRollupMatchesSource()
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN every query the hot endpoints run against a seeded dataset and fail
+    on a full scan of any table that grows with usage.
+    """
+    GROWING_TABLES = {
+        'api1_travelorder', 'api1_travelorder_employees', 'api1_itinerary',
+        'api1_signature', 'api1_notification',
+    }
+    # The unique travel_order_number column's implicit index
+    TRAVEL_ORDER_NUMBER_INDEX = {'sqlite': 'sqlite_autoindex_api1_travelorder_1', 'mysql': 'travel_order_number'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = make_user('head', user_level='head')
+        cls.admin = make_user('admin', user_level='admin', employee_type=None)
+        cls.employees = [make_user(f'employee{i}') for i in range(10)]
+        for i in range(200):
+            employee = cls.employees[i % len(cls.employees)]
+            order = make_order(
+                employee,
+                current_approver=cls.head if i % 10 == 0 else None,
+                signers=[cls.head] if i % 3 else [],
+                date_travel_from=date(2025, 1, 1) + timedelta(days=i),
+                date_travel_to=date(2025, 1, 3) + timedelta(days=i),
+                travel_order_number=f'R1-2025{i % 12 + 1:02d}-{i:04d}',
+            )
+            Notification.objects.create(
+                user=employee, travel_order=order, notification_type='travel_approved',
+                title='Approved', message='Approved', is_read=bool(i % 2),
+            )
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor not in ('sqlite', 'mysql'):
+            self.skipTest(f'No plan inspection for {connection.vendor}')
+        self.client = APIClient()
+
+    def table_accesses(self, sql, params=None):
+        """
+        EXPLAIN `sql` and return a (table, index, full_scan) triple per table it reads.
+        Aliases such as T3 or U0 are resolved to their table, and a walk over a
+        whole index (SQLite "SCAN t USING INDEX", MySQL type "index") counts as a full scan.
+        """
+        aliases = {alias: table for table, alias in re.findall(r'"(\w+)" ([A-Z]\d+)\b', sql)}
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [
+                    (aliases.get(m.group(2), m.group(2)), m.group(3), m.group(1) == 'SCAN')
+                    for row in cursor.fetchall()
+                    if (m := re.match(r'(SCAN|SEARCH) (\w+)(?: USING (?:COVERING )?INDEX (\w+))?', row[-1]))
+                ]
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [col[0] for col in cursor.description]
+            return [
+                (
+                    aliases.get(row[columns.index('table')], row[columns.index('table')]),
+                    row[columns.index('key')],
+                    row[columns.index('type')] in ('ALL', 'index'),
+                )
+                for row in cursor.fetchall()
+            ]
+
+    def assertPlanUses(self, queries, indexes):
+        """
+        Fail on a full scan of a growing table, unless it is an ordered index walk
+        cut short by a LIMIT (one page), and on any expected index no plan uses.
+        """
+        used = set()
+        for sql, params in queries:
+            for table, index, full_scan in self.table_accesses(sql, params):
+                used.add(index)
+                if table in self.GROWING_TABLES and full_scan:
+                    self.assertTrue(index and ' LIMIT ' in sql, f'full scan of {table} (index {index}):\n{sql}')
+        for index in indexes:
+            self.assertIn(index, used, f'{index} unused; plans used {used - {None}}')
+
+    def assertIndexed(self, user, url, *indexes):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertPlanUses(
+            [(query['sql'], None) for query in queries.captured_queries if query['sql'].startswith('SELECT')],
+            indexes,
+        )
+
+    def test_my_travel_orders(self):
+        self.assertIndexed(self.employees[0], '/api1/my-travel-orders/', 'travelorder_prepared_by_idx')
+
+    def test_admin_travels(self):
+        self.assertIndexed(self.admin, '/api1/admin/travels/', 'travelorder_submitted_idx')
+
+    def test_pending_approvals(self):
+        self.assertIndexed(self.head, '/api1/my-pending-approvals/', 'travelorder_approver_idx')
+
+    def test_employee_dashboard(self):
+        self.assertIndexed(
+            self.employees[0], '/api1/employee-dashboard/',
+            'travelorder_prepared_outc_idx', 'travelorder_approver_idx', 'travelorder_travel_dates_idx',
+        )
+
+    def test_head_dashboard(self):
+        self.assertIndexed(
+            self.head, '/api1/head-dashboard/', 'travelorder_prepared_outc_idx', 'travelorder_approver_idx',
+        )
+
+    def test_report(self):
+        self.assertIndexed(
+            self.admin, '/api1/reports/?start_date=2025-03-01&end_date=2025-03-31', 'travelorder_travel_dates_idx',
+        )
+
+    def test_notifications(self):
+        self.assertIndexed(self.employees[0], '/api1/notifications/', 'notification_user_id_idx')
+        self.assertIndexed(self.employees[0], '/api1/notifications/count/', 'notification_user_read_idx')
+
+    def test_my_rejected_travel_orders(self):
+        self.assertIndexed(self.employees[0], '/api1/my-travel-orders/?status_outcome=rejected', 'travelorder_prepared_by_idx')
+
+    def test_travel_order_number_prefix_lookup(self):
+        prefix = 'R1-202503-'
+        queryset = TravelOrder.objects.filter(
+            travel_order_number__gte=prefix, travel_order_number__lt='R1-202503.'
+        ).order_by('-travel_order_number')
+        self.assertEqual(queryset.first().travel_order_number, 'R1-202503-0194')
+        self.assertPlanUses([queryset.query.sql_with_params()], [self.TRAVEL_ORDER_NUMBER_INDEX[connection.vendor]])
+
+    def test_aliased_and_whole_index_scans_are_caught(self):
+        subquery = TravelOrder.objects.filter(employees__in=self.employees[:1]).values('pk')
+        queryset = TravelOrder.objects.filter(pk__in=subquery).order_by('submitted_at')
+        sql, params = queryset.query.sql_with_params()
+        accesses = self.table_accesses(sql, params)
+        self.assertIn(('api1_travelorder', 'travelorder_submitted_idx', True), accesses)
+        self.assertEqual({table for table, _, _ in accesses}, {'api1_travelorder', 'api1_travelorder_employees'})
+        with self.assertRaises(AssertionError):
+            self.assertPlanUses([(sql, params)], [])
@@ -1,17 +1,19 @@
 from django.urls import path
 from .views import (
-    TravelOrderCreateView, ApproveTravelOrderView, ResubmitTravelOrderView,
-    CurrentUserView,TravelOrderDetailUpdateView,
+    TravelOrderCreateView, ApproveTravelOrderView, BulkApproveTravelOrdersView, ResubmitTravelOrderView,
+    CurrentUserView,TravelOrderDetailUpdateView, TravelOrderSignaturesView, TravelOrderTimelineView,
     EmployeeListView, MyTravelOrdersView, TravelOrderApprovalsView,
     FundListCreateView, TransportationCreateView,AdminTravelView,
     FundDetailView,TransportationDetailView, EmployeeDetailUpdateView,
     EmployeePositionCreateView,EmployeePositionDetailView,
     SubmitLiquidationView, BookkeeperReviewView, AccountantReviewView, LiquidationListView,
     TravelOrdersNeedingLiquidationView, LiquidationDetailView, TravelOrderItineraryView,
-    EmployeeDashboardAPIView, AdminDashboard, HeadDashboardAPIView, DirectorDashboardView,TravelOrderReportView,
+    EmployeeDashboardAPIView, AdminDashboard, HeadDashboardAPIView, DashboardCountersView, DirectorDashboardView,TravelOrderReportView,
+    ApproverMetricsView,
     NotificationListView, NotificationMarkReadView, NotificationMarkAllReadView, NotificationCountView,
     login_view, logout_view,
-    refresh_token_view, protected_view, download_evidence, change_password_view
+    refresh_token_view, protected_view, download_evidence, change_password_view, signature_image,
+    download_liquidation_document, notification_stream
 )
 
 urlpatterns = [
@@ -34,6 +36,8 @@ urlpatterns = [
     path('my-travel-orders/', MyTravelOrdersView.as_view(), name='my-travel-orders'),
     path('my-pending-approvals/', TravelOrderApprovalsView.as_view(), name='travel-order-approvals'),
     path('travel-orders/<int:pk>/', TravelOrderDetailUpdateView.as_view(), name='travel-order-detail-update'),
+    path('travel-orders/<int:pk>/signatures/', TravelOrderSignaturesView.as_view(), name='travel-order-signatures'),
+    path('travel-orders/<int:pk>/timeline/', TravelOrderTimelineView.as_view(), name='travel-order-timeline'),
     path('travel-itinerary/<int:travel_order_id>/', TravelOrderItineraryView.as_view(), name='travel-order-itineraries'),
     
     #travels settings
@@ -64,28 +68,38 @@ urlpatterns = [
     # 🔍 Detail view
     path('liquidations/<int:pk>/', LiquidationDetailView.as_view(), name='liquidation-detail'),
 
+    # 📄 Liquidation documents (streamed, permission-checked)
+    path('liquidations/<int:pk>/documents/<str:document>/', download_liquidation_document, name='liquidation-document'),
+
 
 
 
    
     path('approve-travel-order/<int:pk>/', ApproveTravelOrderView.as_view(), name='approve-travel-order'),
+    path('approve-travel-orders/bulk/', BulkApproveTravelOrdersView.as_view(), name='bulk-approve-travel-orders'),
     path('resubmit-travel-order/<int:pk>/', ResubmitTravelOrderView.as_view(), name='resubmit-travel-order'),
 
     #dashboard
     path('employee-dashboard/', EmployeeDashboardAPIView.as_view(), name='employee-dashboard'),
     path('admin-dashboard/', AdminDashboard.as_view(), name='travel-order-chart'),
     path('head-dashboard/', HeadDashboardAPIView.as_view(), name='head-dashboard'),
+    path('dashboard-counters/', DashboardCountersView.as_view(), name='dashboard-counters'),
     path('director-dashboard/', DirectorDashboardView.as_view(), name='director-dashboard'),
+    path('approver-metrics/', ApproverMetricsView.as_view(), name='approver-metrics'),
 
     # Authenticated User Info
     path('user-info/', CurrentUserView.as_view(), name='user-info'),
     
     # Evidence Download
     path('travel-orders/<int:travel_order_id>/evidence/', download_evidence, name='download-evidence'),
+
+    # Signature images (content-addressed)
+    path('signature-images/<str:digest>/', signature_image, name='signature-image'),
     
     # Notifications
     path('notifications/', NotificationListView.as_view(), name='notification-list'),
     path('notifications/<int:pk>/mark-read/', NotificationMarkReadView.as_view(), name='notification-mark-read'),
     path('notifications/mark-all-read/', NotificationMarkAllReadView.as_view(), name='notification-mark-all-read'),
     path('notifications/count/', NotificationCountView.as_view(), name='notification-count'),
+    path('notifications/stream/', notification_stream, name='notification-stream'),
 ]
\ No newline at end of file
@@ -1,143 +1,107 @@
-from .models import CustomUser, EMPLOYEE_TYPE_CHOICES
-
-def build_status_map():
-    base_map = {}
-    for code, label in EMPLOYEE_TYPE_CHOICES:
-        if code == 'regional':
-            base_map[code] = {
-                'approve': 'The travel order has been approved by the Regional Director',
-                'reject': 'The travel order has been rejected by the Regional Director',
-            }
-        elif code == 'tmsd':
-            base_map[code] = {
-                'approve': f'The travel order has been approved by the {label} chief',
-                'reject': f'The travel order has been rejected by the {label} chief',
-            }
-        elif code == 'afsd':
-            base_map[code] = {
-                'approve': f'The travel order has been approved by the {label} Chief',
-                'reject': f'The travel order has been rejected by the {label} Chief',
-            }
-        else:
-            base_map[code] = {
-                'approve': f'The travel order has been approved by the {label} head',
-                'reject': f'The travel order has been rejected by the {label} head',
-            }
-    return base_map
-
-APPROVAL_CHAIN_MAP = {
-    'urdaneta_csc': ['urdaneta_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional'],
-    'sison_csc': ['sison_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional'],
-    'pugo_csc': ['pugo_csc', 'launion_po', 'tmsd', 'afsd', 'regional'],
-    'sudipen_csc': ['sudipen_csc', 'launion_po', 'tmsd', 'afsd', 'regional'],
-    'tagudin_csc': ['tagudin_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional'],
-    'banayoyo_csc': ['banayoyo_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional'],
-    'dingras_csc': ['dingras_csc', 'ilocosnorte_po', 'tmsd', 'afsd', 'regional'],
-
-    'pangasinan_po': ['pangasinan_po', 'tmsd', 'afsd', 'regional'],
-    'ilocossur_po': ['ilocossur_po', 'tmsd', 'afsd', 'regional'],
-    'ilocosnorte_po': ['ilocosnorte_po', 'tmsd', 'afsd', 'regional'],
-    'launion_po': ['launion_po', 'tmsd', 'afsd', 'regional'],
-
-    'tmsd': ['tmsd','afsd', 'regional'],
-    'afsd': ['afsd', 'regional'],
-    'regional': [],
-}
+import copy
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import CustomUser, TravelOrderNumberSequence
+from .routing import ANY_LEVEL, OFFICES, approval_chain
+
+# Chain for a regular employee of each office, derived from the routing data
+APPROVAL_CHAIN_MAP = {office.code: list(approval_chain(office.code, ANY_LEVEL)) for office in OFFICES}
+
 
 def get_approval_chain(user):
     """
     Returns the correct approval chain based on the user's role and type.
+    Directors file no chain; heads start above their own office (see routing.py).
     """
+    return approval_chain(user.employee_type, user.user_level)
+
+
+def travel_order_number_prefix(day=None):
+    day = day or timezone.localdate()
+    return f"R1-{day.strftime('%Y%m')}-"
+
+
+def generate_travel_order_numbers(count, day=None):
+    """Allocate `count` consecutive R1-YYYYMM-NNNN numbers; call inside the transaction saving them."""
+    prefix = travel_order_number_prefix(day)
+    return [f"{prefix}{number:04d}" for number in TravelOrderNumberSequence.allocate(prefix, count)]
+
+
+def generate_travel_order_number(day=None):
+    return generate_travel_order_numbers(1, day)[0]
+
 
-    if user.user_level == 'director':
-        # Director cannot file travel orders
-        return []
-
-    # CSC Employee
-    if user.employee_type == 'urdaneta_csc':
-        if user.user_level == 'head':
-            return ['pangasinan_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['urdaneta_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional']
-        
-    if user.employee_type == 'sison_csc':
-        if user.user_level == 'head':
-            return ['pangasinan_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['sison_csc', 'pangasinan_po', 'tmsd', 'afsd', 'regional']
-
-    if user.employee_type == 'pugo_csc':
-        if user.user_level == 'head':
-            return ['launion_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['pugo_csc', 'launion_po', 'tmsd', 'afsd', 'regional']
-
-    if user.employee_type == 'sudipen_csc':
-        if user.user_level == 'head':
-            return ['launion_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['sudipen_csc', 'launion_po', 'tmsd', 'afsd', 'regional']
-                            
-    if user.employee_type == 'tagudin_csc':
-        if user.user_level == 'head':
-            return ['ilocossur_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['tagudin_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional']
-
-    if user.employee_type == 'banayoyo_csc':
-        if user.user_level == 'head':
-            return ['ilocossur_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['banayoyo_csc', 'ilocossur_po', 'tmsd', 'afsd', 'regional']
-        
-    if user.employee_type == 'dingras_csc':
-        if user.user_level == 'head':
-            return ['ilocosnorte_po', 'tmsd', 'afsd', 'regional']
-        else:
-            return ['dingras_csc', 'ilocosnorte_po', 'tmsd', 'afsd', 'regional']                        
-
-    # PO Employee
-    if user.employee_type == 'pangasinan_po':
-        if user.user_level == 'head':
-            return ['tmsd', 'afsd', 'regional']
-        else:
-            return ['pangasinan_po', 'tmsd', 'afsd', 'regional']
-        
-    if user.employee_type == 'ilocossur_po':
-        if user.user_level == 'head':
-            return ['tmsd', 'afsd', 'regional']
-        else:
-            return ['ilocossur_po', 'tmsd', 'afsd', 'regional']
-
-    if user.employee_type == 'ilocosnorte_po':
-        if user.user_level == 'head':
-            return ['tmsd', 'afsd', 'regional']
-        else:
-            return ['ilocosnorte_po', 'tmsd', 'afsd', 'regional']
-
-    if user.employee_type == 'launion_po':
-        if user.user_level == 'head':
-            return ['tmsd', 'afsd', 'regional']
-        else:
-            return ['launion_po', 'tmsd', 'afsd', 'regional']                        
-
-    # TMSD Employee
-    if user.employee_type == 'tmsd':
-        if user.user_level == 'head':
-            return ['afsd', 'regional']
-        else:
-            return ['tmsd', 'afsd', 'regional']
-
-    # AFSD Employee
-    if user.employee_type == 'afsd':
-        return ['afsd', 'regional']
-
-    # Regional Employee (non-director)
-    if user.employee_type == 'regional':
-        return ['regional']
-
-    # Fallback
-    return []
+def user_id_batches(batch_size, user_ids=None):
+    """Lists of at most `batch_size` user ids: the given ones, or every user in id order, keyset-paged."""
+    if user_ids:
+        yield from (user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size))
+        return
+    last_id = 0
+    while True:
+        batch = list(
+            CustomUser.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+class HeadDirectory:
+    """
+    Heads per office code and the directors, each in id order, loaded with one query.
+
+    Built lazily and shared by the process. signals.py drops it whenever a user's
+    user_level or employee_type changes, and HEAD_DIRECTORY_TTL bounds how long
+    another process's change can go unseen.
+    """
+    LEVELS = ('head', 'director')
+
+    def __init__(self):
+        heads = defaultdict(list)
+        directors = []
+        users = CustomUser.objects.filter(user_level__in=self.LEVELS).order_by('id')
+        for user in users:
+            if user.user_level == 'director':
+                directors.append(user)
+            elif user.employee_type:
+                heads[user.employee_type].append(user)
+        self.heads = {office: tuple(users) for office, users in heads.items()}
+        self.directors = tuple(directors)
+        self.loaded_at = time.monotonic()
+
+    def first(self, users, exclude_id=None):
+        for user in users:
+            if user.id != exclude_id:
+                # Callers assign and save around the result; keep the shared copy pristine
+                return copy.copy(user)
+        return None
+
+
+_head_directory = None
+_head_directory_lock = threading.Lock()
+
+
+def get_head_directory():
+    global _head_directory
+    directory = _head_directory
+    ttl = getattr(settings, 'HEAD_DIRECTORY_TTL', 300)
+    if directory is None or time.monotonic() - directory.loaded_at > ttl:
+        with _head_directory_lock:
+            directory = _head_directory
+            if directory is None or time.monotonic() - directory.loaded_at > ttl:
+                directory = _head_directory = HeadDirectory()
+    return directory
+
+
+def invalidate_head_directory():
+    global _head_directory
+    _head_directory = None
 
 
 def get_next_head(chain, stage, current_user=None):
@@ -145,17 +109,12 @@ def get_next_head(chain, stage, current_user=None):
     Returns the next head approver based on the approval chain and current stage.
     Ensures the same user doesn't approve twice.
     """
-    while stage < len(chain):
-        next_type = chain[stage]
-
-        # Strictly get the head for the next stage
-        qs = CustomUser.objects.filter(employee_type=next_type, user_level='head')
-
-        # Avoid returning the same person again
-        if current_user:
-            qs = qs.exclude(id=current_user.id)
+    directory = get_head_directory()
+    exclude_id = current_user.id if current_user else None
 
-        next_head = qs.first()
+    while stage < len(chain):
+        # Strictly get the head for the next stage, lowest id first
+        next_head = directory.first(directory.heads.get(chain[stage], ()), exclude_id)
         if next_head:
             return next_head
 
@@ -163,11 +122,7 @@ def get_next_head(chain, stage, current_user=None):
         stage += 1
 
     # Final fallback: Director (if not same as current)
-    qs = CustomUser.objects.filter(user_level='director')
-    if current_user:
-        qs = qs.exclude(id=current_user.id)
-
-    return qs.first()
+    return directory.first(directory.directors, exclude_id)
 
 
 
@@ -1,41 +1,63 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.db.models.functions import TruncMonth
-from django.db.models import Count
+from django.db.models import Prefetch
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
 from datetime import timedelta, datetime
-from collections import defaultdict 
 import json
 from django.utils.dateparse import parse_date
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.utils import timezone
 from django.utils.timezone import now
-from .models import TravelOrder, Signature, CustomUser, Fund, Transportation, EmployeePosition, Liquidation, EmployeeSignature, Itinerary, Notification
-from .serializers import TravelOrderSerializer, UserSerializer, FundSerializer, TransportationSerializer, EmployeePositionSerializer, LiquidationSerializer, ItinerarySerializer, TravelOrderSimpleSerializer, TravelOrderReportSerializer, NotificationSerializer
-from .utils import get_approval_chain, get_next_head, build_status_map
+from .models import TravelOrder, TravelOrderEvent, Signature, CustomUser, Fund, Transportation, EmployeePosition, Liquidation, EmployeeSignature, Itinerary, Notification, SignatureImage
+from .serializers import TravelOrderSerializer, UserSerializer, FundSerializer, TransportationSerializer, EmployeePositionSerializer, LiquidationSerializer, ItinerarySerializer, TravelOrderSimpleSerializer, TravelOrderReportSerializer, NotificationSerializer, TravelOrderSummarySerializer, TravelOrderSignaturesSerializer, TravelOrderEventSerializer, SignatureUploadSerializer
+from .utils import get_approval_chain, get_next_head, generate_travel_order_number
+from .pagination import TravelOrderCursorPagination, NotificationFeedPagination
+from .downloads import serve_file
+from .counters import COUNTER_FIELDS, counter_state, record_transition, record_transitions, get_counters
+from . import workflow
+from .rollups import office_chart
+from .notifications import NotificationFanout, unread_changed, unread_count
+from . import push
+from .authentication import CookieJWTAuthentication, CookieJWTTokenUserAuthentication
+from .metrics import approver_metrics
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
 from django.conf import settings
+from django.db import transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
-from django.http import HttpResponse, Http404
-import os
-import mimetypes
-
-
-def create_notification(user, travel_order, notification_type, title, message):
-    """Helper function to create notifications"""
-    Notification.objects.create(
-        user=user,
-        travel_order=travel_order,
-        notification_type=notification_type,
-        title=title,
-        message=message
-    )
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from django.utils.cache import get_conditional_response
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def conflict_response():
+    return Response({"error": "This travel order was changed by someone else. Reload it and try again."}, status=409)
+
+
+def signature_error(request):
+    """Why the request's signature is not an acceptable image, or None if it is (or there is none)."""
+    serializer = SignatureUploadSerializer(data={'signature': request.data.get('signature')})
+    if serializer.is_valid():
+        return None
+    return serializer.errors['signature'][0]
+
+
+def with_status_labels(rows):
+    """Swap the stored status columns of a values() queryset for the display label"""
+    result = []
+    for row in rows:
+        row = dict(row)
+        row['status'] = TravelOrder.status_label(row.pop('status_code'), row.pop('status_stage'))
+        result.append(row)
+    return result
 
 
 @api_view(['POST'])
@@ -198,6 +220,10 @@ class TravelOrderCreateView(APIView):
             except json.JSONDecodeError as e:
                 return Response({'employees': ['Invalid employees format.']}, status=400)
 
+        error = signature_error(request)
+        if error:
+            return Response({'signature': [error]}, status=400)
+
         # Ensure filer is in employees
         if user.id not in data['employees']:
             data['employees'].insert(0, user.id)
@@ -214,30 +240,32 @@ class TravelOrderCreateView(APIView):
             if evidence_file:
                 save_kwargs['evidence'] = evidence_file
                 
-            travel_order = serializer.save(**save_kwargs)
-            travel_order.number_of_employees = travel_order.employees.count()
-
-            # 🔑 Director → auto-generate travel order number
-            if user.user_level == 'director':
-                from .utils import generate_travel_order_number
-                travel_order.travel_order_number = generate_travel_order_number()
-                # No approvers needed
-                travel_order.current_approver = None
-                travel_order.approval_stage = 0
-                travel_order.status = "Travel order is placed"
-
-            travel_order.save()
-
-            # Handle signature
-            signature_data = request.data.get("signature")
-            if signature_data:
-                EmployeeSignature.objects.update_or_create(
-                    order=travel_order,
-                    defaults={
-                        "signed_by": user,
-                        "signature_data": signature_data
-                    }
-                )
+            with transaction.atomic():
+                travel_order = serializer.save(**save_kwargs)
+                travel_order.number_of_employees = travel_order.employees.count()
+
+                # 🔑 Director → auto-generate travel order number
+                if user.user_level == 'director':
+                    travel_order.travel_order_number = generate_travel_order_number()
+                    # No approvers needed
+                    travel_order.current_approver = None
+                    travel_order.approval_stage = 0
+                    travel_order.set_status(TravelOrder.STATUS_PLACED)
+
+                travel_order.save()
+                record_transition(None, travel_order)
+                workflow.transition_event(travel_order, user).save()
+
+                # Handle signature
+                signature_data = request.data.get("signature")
+                if signature_data:
+                    EmployeeSignature.objects.update_or_create(
+                        order=travel_order,
+                        defaults={
+                            "signed_by": user,
+                            "image": SignatureImage.from_data_url(signature_data)
+                        }
+                    )
 
             print("SUCCESS: Travel order created")
             return Response(TravelOrderSerializer(travel_order).data, status=status.HTTP_201_CREATED)
@@ -252,8 +280,8 @@ class TravelOrderDetailUpdateView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def get(self, request, pk):
-        order = get_object_or_404(TravelOrder, pk=pk)
-        serializer = TravelOrderSerializer(order)
+        order = get_object_or_404(TravelOrderSerializer.setup_eager_loading(TravelOrder.objects.all()), pk=pk)
+        serializer = TravelOrderSerializer(order, context={'request': request})
         return Response(serializer.data)
 
     def put(self, request, pk):
@@ -285,6 +313,7 @@ class TravelOrderDetailUpdateView(APIView):
             except json.JSONDecodeError:
                 return Response({'itinerary': ['Invalid itinerary format.']}, status=400)
 
+        before = counter_state(order)
         serializer = TravelOrderSerializer(order, data=data)
         if serializer.is_valid():
             # Handle evidence file if provided
@@ -296,19 +325,55 @@ class TravelOrderDetailUpdateView(APIView):
                 'rejected_by': None,
                 'rejection_comment': '',
                 'rejected_at': None,
-                'status': 'Travel Order Resubmitted',  # ✅ Reset status from 'rejected'
+                # ✅ Reset status from 'rejected'
+                **TravelOrder.status_fields(TravelOrder.STATUS_RESUBMITTED),
             }
             
             if evidence_file:
                 save_kwargs['evidence'] = evidence_file
                 
-            serializer.save(**save_kwargs)
+            try:
+                with transaction.atomic():
+                    # Bump the version before the full save, so an approval racing this edit gets a conflict
+                    workflow.save_decision(order, fields=())
+                    order = serializer.save(**save_kwargs)
+                    record_transition(before, order)
+                    workflow.transition_event(order, request.user).save()
+            except workflow.TransitionConflict:
+                return conflict_response()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
 
 
+class TravelOrderSignaturesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        """Signature images for one order, fetched lazily when the order is opened"""
+        orders = TravelOrder.objects.select_related(
+            'employee_signature__signed_by__employee_position',
+            'employee_signature__image',
+        ).prefetch_related(
+            Prefetch('signature_set', queryset=Signature.objects.select_related('signed_by__employee_position', 'image').order_by('signed_at', 'id'))
+        )
+        order = get_object_or_404(orders, pk=pk)
+        serializer = TravelOrderSignaturesSerializer(order, context={'request': request})
+        return Response(serializer.data)
+
+
+class TravelOrderTimelineView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        """Every transition of one order, oldest first, read from the event log"""
+        events = list(
+            TravelOrderEvent.objects.filter(travel_order_id=pk).select_related('actor').order_by('created_at', 'id')
+        )
+        if not events and not TravelOrder.objects.filter(pk=pk).exists():
+            raise Http404
+        return Response(TravelOrderEventSerializer(events, many=True).data)
+
 
-    
 class FundListCreateView(APIView):
     def get(self, request):
         include_archived = request.query_params.get('include_archived') == 'true'
@@ -421,12 +486,23 @@ class MyTravelOrdersView(APIView):
         user = request.user
 
         if user.user_level == 'admin':
-            orders = TravelOrder.objects.all().order_by('-submitted_at')
+            orders = TravelOrder.objects.all()
         else:
-            orders = TravelOrder.objects.filter(prepared_by=user).order_by('-submitted_at')
-
-        serializer = TravelOrderSerializer(orders.distinct(), many=True)
-        return Response(serializer.data)
+            orders = TravelOrder.objects.filter(prepared_by=user)
+
+        # ?status_outcome=pending|approved|rejected narrows the list on the server
+        outcome = request.query_params.get('status_outcome')
+        if outcome:
+            outcomes = {label.lower(): value for value, label in TravelOrder.OUTCOME_CHOICES}
+            if outcome not in outcomes:
+                return Response({'error': f"status_outcome must be one of: {', '.join(outcomes)}."}, status=400)
+            orders = orders.filter(status_outcome=outcomes[outcome])
+
+        paginator = TravelOrderCursorPagination()
+        orders = TravelOrderSummarySerializer.setup_eager_loading(orders.distinct())
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = TravelOrderSummarySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     
 class TravelOrderItineraryView(APIView):
@@ -446,15 +522,12 @@ class TravelOrderApprovalsView(APIView):
         user = request.user
 
         orders = TravelOrder.objects.filter(
-            current_approver=user
-        ).exclude(
-            status__in=[
-                'The travel order has been approved by the Regional Director',
-                'The travel order has been rejected by the Regional Director',
-            ]
+            current_approver=user,
+            status_outcome=TravelOrder.OUTCOME_PENDING,
         ).order_by('-submitted_at')
 
-        serializer = TravelOrderSerializer(orders.distinct(), many=True)
+        orders = TravelOrderSummarySerializer.setup_eager_loading(orders.distinct())
+        serializer = TravelOrderSummarySerializer(orders, many=True)
         return Response(serializer.data)
 
 
@@ -470,94 +543,43 @@ class ApproveTravelOrderView(APIView):
         if order.current_approver != user:
             return Response({"error": "Unauthorized approval."}, status=403)
 
+        before = counter_state(order)
+
         decision = request.data.get('decision')
         comment = request.data.get('comment')
         signature = request.data.get('signature')
-
-        # Map employee_type to status strings from your STATUS_CHOICES
-        status_map = build_status_map()
-
+        error = signature_error(request)
+        if error:
+            return Response({"error": error}, status=400)
 
         if decision == 'approve':
-            filer = order.prepared_by
-            chain = get_approval_chain(filer)
-            current_stage = chain[order.approval_stage] if order.approval_stage < len(chain) else 'regional'
+            next_head = workflow.approve(order, user)
 
-            next_stage = order.approval_stage + 1
-            next_head = get_next_head(chain, next_stage, current_user=user)
-
-            if current_stage in status_map:
-                order.status = status_map[current_stage]['approve']
+            try:
+                with transaction.atomic():
+                    # Claim the transition first, so a request that lost the race writes nothing
+                    workflow.save_decision(order)
+                    if workflow.assign_travel_order_numbers([order]):
+                        # The conditional UPDATE above holds the row until commit
+                        TravelOrder.objects.filter(pk=order.pk).update(
+                            travel_order_number=order.travel_order_number
+                        )
+                    if signature:
+                        Signature.objects.create(
+                            order=order,
+                            signed_by=user,
+                            image=SignatureImage.from_data_url(signature),
+                            comment=comment 
+                        )
+
+                    record_transition(before, order)
+                    workflow.transition_event(order, user, comment).save()
+                    fanout = NotificationFanout()
+                    workflow.notify_approval(fanout, order, user, next_head)
+                    fanout.defer()
+            except workflow.TransitionConflict:
+                return conflict_response()
 
-            if next_head:
-                order.current_approver = next_head
-                order.approval_stage = next_stage
-            else:
-                # ✅ Final approval by Regional Director
-                order.current_approver = None
-                order.status = status_map['regional']['approve']
-
-                # ✅ Auto-generate travel order number
-                if not order.travel_order_number:
-                    today = timezone.now().date()
-                    prefix = f"R1-{today.strftime('%Y%m')}-"
-                    last_order = TravelOrder.objects.filter(
-                        travel_order_number__startswith=prefix
-                    ).order_by('-travel_order_number').first()
-
-                    if last_order and last_order.travel_order_number:
-                        try:
-                            last_number = int(last_order.travel_order_number.split('-')[-1])
-                            next_number = last_number + 1
-                        except (IndexError, ValueError):
-                            next_number = 1
-                    else:
-                        next_number = 1
-
-                    order.travel_order_number = f"{prefix}{next_number:04d}"
-
-            order.is_resubmitted = False
-
-            if signature:
-                Signature.objects.create(
-                    order=order,
-                    signed_by=user,
-                    signature_data=signature,
-                    comment=comment 
-                )
-
-            order.save()
-            
-            # Create notification for the employee who filed the request
-            if order.prepared_by:
-                create_notification(
-                    user=order.prepared_by,
-                    travel_order=order,
-                    notification_type='travel_approved',
-                    title=f'Travel Request Approved by {user.get_full_name()}',
-                    message=f'Your travel request to {order.destination} has been approved by {user.get_full_name()}.'
-                )
-            
-            # If there's a next approver, notify them
-            if next_head:
-                create_notification(
-                    user=next_head,
-                    travel_order=order,
-                    notification_type='travel_approved',
-                    title=f'New Travel Request for Approval',
-                    message=f'A travel request to {order.destination} by {order.prepared_by.get_full_name()} is ready for your approval.'
-                )
-            else:
-                # Final approval - notify the employee
-                if order.prepared_by:
-                    create_notification(
-                        user=order.prepared_by,
-                        travel_order=order,
-                        notification_type='travel_final_approved',
-                        title=f'Travel Request Finally Approved',
-                        message=f'Your travel request to {order.destination} has been finally approved and travel order number {order.travel_order_number} has been generated.'
-                    )
-            
             return Response({"message": "Travel order approved."}, status=200)
 
 
@@ -565,42 +587,18 @@ class ApproveTravelOrderView(APIView):
             if not comment:
                 return Response({"error": "Rejection comment is required."}, status=400)
 
-            filer = order.prepared_by
-            chain = get_approval_chain(filer)
-            current_stage = chain[order.approval_stage] if order.approval_stage < len(chain) else 'regional'
-
-            if current_stage in status_map:
-                order.status = status_map[current_stage]['reject']
-            else:
-                order.status = 'Rejected'
-
-            order.rejection_comment = comment
-            order.rejected_by = user
-            order.rejected_at = timezone.now()
-            order.current_approver = None
-            order.save()
-            
-            # Create notification for the employee who filed the request
-            if order.prepared_by:
-                create_notification(
-                    user=order.prepared_by,
-                    travel_order=order,
-                    notification_type='travel_rejected',
-                    title=f'Travel Request Rejected by {user.get_full_name()}',
-                    message=f'Your travel request to {order.destination} has been rejected by {user.get_full_name()}. Reason: {comment}'
-                )
-            
-            # Notify previous approvers that their approved request was rejected
-            previous_signatures = Signature.objects.filter(order=order).order_by('-signed_at')
-            for signature in previous_signatures:
-                if signature.signed_by != user:  # Don't notify the current rejector
-                    create_notification(
-                        user=signature.signed_by,
-                        travel_order=order,
-                        notification_type='travel_rejected_by_next_approver',
-                        title=f'Your Approved Travel Request was Rejected',
-                        message=f'The travel request to {order.destination} that you approved has been rejected by {user.get_full_name()}. Reason: {comment}'
-                    )
+            workflow.reject(order, user, comment)
+            try:
+                with transaction.atomic():
+                    workflow.save_decision(order)
+                    record_transition(before, order)
+                    approver_ids = workflow.previous_approvers([order])[order.id]
+                    workflow.transition_event(order, user, comment).save()
+                    fanout = NotificationFanout()
+                    workflow.notify_rejection(fanout, order, user, comment, approver_ids)
+                    fanout.defer()
+            except workflow.TransitionConflict:
+                return conflict_response()
 
             return Response({"message": "Travel order rejected."}, status=200)
 
@@ -610,6 +608,88 @@ class ApproveTravelOrderView(APIView):
 
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class BulkApproveTravelOrdersView(APIView):
+    """Approve or reject many orders waiting on the caller with one signature, in one transaction."""
+    permission_classes = [permissions.IsAuthenticated]
+    max_orders = 500
+
+    def post(self, request):
+        user = request.user
+        ids = request.data.get('ids')
+        decision = request.data.get('decision')
+        comment = request.data.get('comment')
+        signature = request.data.get('signature')
+
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": "ids must be a non-empty list."}, status=400)
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            return Response({"error": "ids must be integers."}, status=400)
+        if len(ids) > self.max_orders:
+            return Response({"error": f"At most {self.max_orders} orders per request."}, status=400)
+        if decision not in ('approve', 'reject'):
+            return Response({"error": "Invalid decision."}, status=400)
+        if decision == 'reject' and not comment:
+            return Response({"error": "Rejection comment is required."}, status=400)
+        error = signature_error(request)
+        if error:
+            return Response({"error": error}, status=400)
+
+        with transaction.atomic():
+            # One query decides which of the orders are the caller's to decide. It locks
+            # them (in id order) until this transaction ends, so single approvals of the same
+            # orders wait and then find the version moved on.
+            orders = list(
+                TravelOrder.objects.select_related('prepared_by').select_for_update(of=('self',)).filter(
+                    id__in=ids, current_approver=user, status_outcome=TravelOrder.OUTCOME_PENDING,
+                ).order_by('id')
+            )
+            before = {order.id: counter_state(order) for order in orders}
+            fanout = NotificationFanout()
+
+            if decision == 'approve':
+                next_heads = {order.id: workflow.approve(order, user) for order in orders}
+                workflow.assign_travel_order_numbers(orders)
+                for order in orders:
+                    workflow.notify_approval(fanout, order, user, next_heads[order.id])
+                if signature and orders:
+                    image = SignatureImage.from_data_url(signature)
+                    Signature.objects.bulk_create([
+                        Signature(order=order, signed_by=user, image=image, comment=comment) for order in orders
+                    ])
+            else:
+                approvers = workflow.previous_approvers(orders)
+                for order in orders:
+                    workflow.reject(order, user, comment)
+                    workflow.notify_rejection(fanout, order, user, comment, approvers[order.id])
+
+            for order in orders:
+                order.version += 1
+            TravelOrder.objects.bulk_update(orders, [*workflow.DECISION_FIELDS, 'version'], batch_size=100)
+            record_transitions([(before[order.id], order) for order in orders])
+            TravelOrderEvent.objects.bulk_create(
+                [workflow.transition_event(order, user, comment) for order in orders], batch_size=500,
+            )
+            fanout.defer()
+
+        decided = {order.id: order for order in orders}
+        results = []
+        for pk in ids:
+            order = decided.get(pk)
+            if order is None:
+                results.append({"id": pk, "ok": False, "error": "Not awaiting your approval."})
+            else:
+                results.append({
+                    "id": pk,
+                    "ok": True,
+                    "status": order.status,
+                    "travel_order_number": order.travel_order_number,
+                })
+        return Response({"results": results}, status=200)
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ResubmitTravelOrderView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -622,9 +702,10 @@ class ResubmitTravelOrderView(APIView):
         if not order.employees.filter(id=user.id).exists():
             return Response({"error": "Unauthorized."}, status=403)
 
-        if 'rejected' not in order.status.lower():
+        if order.status_outcome != TravelOrder.OUTCOME_REJECTED:
             return Response({"error": "Only rejected orders can be resubmitted."}, status=400)
 
+        before = counter_state(order)
 
         # Get approval chain based on the filer
         filer = order.prepared_by
@@ -635,7 +716,7 @@ class ResubmitTravelOrderView(APIView):
             return Response({"error": "No head found to reassign this order to."}, status=400)
 
         # Reset important fields
-        order.status = 'Travel order is placed'
+        order.set_status(TravelOrder.STATUS_PLACED)
         order.current_approver = next_head
         order.approval_stage = 0
         order.is_resubmitted = True
@@ -644,7 +725,13 @@ class ResubmitTravelOrderView(APIView):
         order.rejected_by = None
         order.travel_order_number = None  # Clear the old number if it existed
 
-        order.save()
+        try:
+            with transaction.atomic():
+                workflow.save_decision(order)
+                record_transition(before, order)
+                workflow.transition_event(order, user, action=TravelOrder.STATUS_RESUBMITTED).save()
+        except workflow.TransitionConflict:
+            return conflict_response()
 
         return Response({
             "message": f"Travel order successfully resubmitted to {next_head.username}."
@@ -763,9 +850,11 @@ class AdminTravelView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        travel = TravelOrder.objects.all().order_by('-submitted_at')
-        serializer = TravelOrderSerializer(travel, many=True)
-        return Response(serializer.data)
+        paginator = TravelOrderCursorPagination()
+        travel = TravelOrderSummarySerializer.setup_eager_loading(TravelOrder.objects.all())
+        page = paginator.paginate_queryset(travel, request, view=self)
+        serializer = TravelOrderSummarySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
 
 class SubmitLiquidationView(APIView):
@@ -777,7 +866,7 @@ class SubmitLiquidationView(APIView):
         except TravelOrder.DoesNotExist:
             return Response({'error': 'Travel order not found.'}, status=404)
 
-        serializer = LiquidationSerializer(data=request.data)
+        serializer = LiquidationSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             serializer.save(travel_order=travel_order, uploaded_by=request.user)
             return Response(serializer.data, status=201)
@@ -806,17 +895,17 @@ class BookkeeperReviewView(APIView):
         approve = request.data.get('approve', False)
         comment = request.data.get('comment', '')
 
-        liquidation.is_bookkeeper_approved = approve
-        liquidation.bookkeeper_comment = comment
-        liquidation.reviewed_by_bookkeeper = request.user
-        liquidation.reviewed_at_bookkeeper = timezone.now()
-        
-        if approve:
-            liquidation.status = 'Under Final Audit'
-        else:
-            liquidation.status = 'Rejected'
-            
-        liquidation.save()
+        reviewed = liquidation.review(
+            'Pending',
+            is_bookkeeper_approved=approve,
+            bookkeeper_comment=comment,
+            reviewed_by_bookkeeper=request.user,
+            reviewed_at_bookkeeper=timezone.now(),
+            status='Under Final Audit' if approve else 'Rejected',
+        )
+        if not reviewed:
+            return Response({"error": "This liquidation was already reviewed. Reload it and try again."},
+                          status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Returned to employee for revision.' if not approve else 'Forwarded to accountant.',
@@ -843,17 +932,17 @@ class AccountantReviewView(APIView):
         approve = request.data.get('approve', False)
         comment = request.data.get('comment', '')
 
-        liquidation.is_accountant_approved = approve
-        liquidation.accountant_comment = comment
-        liquidation.reviewed_by_accountant = request.user
-        liquidation.reviewed_at_accountant = timezone.now()
-        
-        if approve:
-            liquidation.status = 'Ready for Claim'
-        else:
-            liquidation.status = 'Rejected'
-            
-        liquidation.save()
+        reviewed = liquidation.review(
+            'Under Final Audit',
+            is_accountant_approved=approve,
+            accountant_comment=comment,
+            reviewed_by_accountant=request.user,
+            reviewed_at_accountant=timezone.now(),
+            status='Ready for Claim' if approve else 'Rejected',
+        )
+        if not reviewed:
+            return Response({"error": "This liquidation was already reviewed. Reload it and try again."},
+                          status=status.HTTP_409_CONFLICT)
         
         return Response({
             'message': 'Liquidation approved and ready for claim.' if approve else 'Rejected by accountant.',
@@ -866,7 +955,7 @@ class LiquidationListView(APIView):
 
     def get(self, request):
         liquidations = Liquidation.objects.select_related('travel_order').all().order_by('-id')
-        serializer = LiquidationSerializer(liquidations, many=True)
+        serializer = LiquidationSerializer(liquidations, many=True, context={'request': request})
         return Response(serializer.data)
     
 
@@ -895,7 +984,7 @@ class LiquidationDetailView(APIView):
 
     def get(self, request, pk):
         liquidation = get_object_or_404(Liquidation, pk=pk)
-        serializer = LiquidationSerializer(liquidation)
+        serializer = LiquidationSerializer(liquidation, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -910,22 +999,7 @@ class EmployeeDashboardAPIView(APIView):
 
         # Filter orders prepared by this user
         queryset = TravelOrder.objects.filter(prepared_by=user)
-
-        total_orders = queryset.count()
-
-        approved_by_director = queryset.filter(
-            status='The travel order has been approved by the Regional Director'
-        ).count()
-
-        disapproved = queryset.filter(
-            status__in=[
-                'The travel order has been rejected by the CSC head.',
-                'The travel order has been rejected by the PO head',
-                'The travel order has been rejected by the TMSD chief',
-                'The travel order has been rejected by the AFSD Chief',
-                'The travel order has been rejected by the Regional Director'
-            ]
-        ).count()
+        counters = get_counters(user)
 
         upcoming_travels = queryset.filter(
             date_travel_from__gte=today,
@@ -935,28 +1009,31 @@ class EmployeeDashboardAPIView(APIView):
             'destination',
             'date_travel_from',
             'date_travel_to',
-            'status'
+            'status_code',
+            'status_stage'
         ).order_by('date_travel_from')
 
         return Response({
-            'total_orders': total_orders,
-            'approved_by_director': approved_by_director,
-            'disapproved': disapproved,
-            'upcoming_travels': list(upcoming_travels),
+            'total_orders': counters.total_orders,
+            'approved_by_director': counters.approved,
+            'disapproved': counters.rejected,
+            'upcoming_travels': with_status_labels(upcoming_travels),
         })
     
 
 
 
-class AdminDashboard(APIView):
+class DashboardCountersView(APIView):
+    """The signed-in user's counter row alone, for badges that need only the figures."""
+    permission_classes = [IsAuthenticated]
+
     def get(self, request):
-        groups = {
-            "Pangasinan PO + CSCs": ['pangasinan_po', 'urdaneta_csc', 'sison_csc'],
-            "La Union PO + CSCs": ['launion_po', 'sudipen_csc', 'pugo_csc'],
-            "Ilocos Sur PO + CSCs": ['ilocossur_po', 'tagudin_csc', 'banayoyo_csc'],
-            "Ilocos Norte PO + CSCs": ['ilocosnorte_po', 'dingras_csc'],
-        }
+        counters = get_counters(request.user)
+        return Response({field: getattr(counters, field) for field in COUNTER_FIELDS})
 
+
+class AdminDashboard(APIView):
+    def get(self, request):
         # Generate list of last 12 months
         now_time = datetime.now()
         month_list = [
@@ -964,37 +1041,18 @@ class AdminDashboard(APIView):
             for i in reversed(range(12))
         ]
 
-        result = defaultdict(lambda: {month: 0 for month in month_list})
-
-        # Travel orders grouped by month and employee_type
-        orders = TravelOrder.objects.filter(submitted_at__isnull=False).annotate(
-            month=TruncMonth('submitted_at')
-        ).values('month', 'employees__employee_type').annotate(
-            count=Count('id')
-        ).order_by('month')
-
-        for entry in orders:
-            month = entry['month'].strftime('%Y-%m')
-            emp_type = entry['employees__employee_type']
-            for group_name, types in groups.items():
-                if emp_type in types:
-                    result[group_name][month] += entry['count']
+        # Travel orders per month and office group, from the monthly rollup
+        chart = office_chart(month_list)
 
         # Summary counts
         completed = TravelOrder.objects.filter(date_travel_to__lt=now().date()).count()
 
         approved_by_director = TravelOrder.objects.filter(
-            status='The travel order has been approved by the Regional Director'
+            status_outcome=TravelOrder.OUTCOME_APPROVED
         ).count()
 
         return Response({
-            "labels": month_list,
-            "datasets": [
-                {
-                    "label": group,
-                    "data": [result[group][month] for month in month_list]
-                } for group in groups
-            ],
+            **chart,
             "completed": completed,
             "approved_by_director": approved_by_director
         })
@@ -1008,30 +1066,22 @@ class HeadDashboardAPIView(APIView):
         start_of_month = today.replace(day=1)
 
         own_orders = TravelOrder.objects.filter(prepared_by=user)
-        pending_approvals = TravelOrder.objects.filter(current_approver=user, status__icontains='placed')
-
-        approved_by_director = own_orders.filter(
-            status='The travel order has been approved by the Regional Director'
-        ).count()
-
-        rejected = own_orders.filter(
-            status__icontains='rejected'
-        ).count()
+        counters = get_counters(user)
 
         current_month_orders = own_orders.filter(
             submitted_at__date__gte=start_of_month
         ).values(
-            'destination', 'date_travel_from', 'date_travel_to', 'status'
+            'destination', 'date_travel_from', 'date_travel_to', 'status_code', 'status_stage'
         )
 
         data = {
             'counts': {
-                'total': own_orders.count(),
-                'approved_by_director': approved_by_director,
-                'rejected': rejected,
-                'pending': pending_approvals.count(),
+                'total': counters.total_orders,
+                'approved_by_director': counters.approved,
+                'rejected': counters.rejected,
+                'pending': counters.pending_approvals,
             },
-            'travel_orders': list(current_month_orders)
+            'travel_orders': with_status_labels(current_month_orders)
         }
 
         return Response(data)
@@ -1045,13 +1095,14 @@ class DirectorDashboardView(APIView):
             return Response({'error': 'Unauthorized'}, status=403)
 
         # === COUNT STATISTICS ===
-        pending = TravelOrder.objects.filter(current_approver=user).count()
+        pending = get_counters(user).pending_approvals
         approved = TravelOrder.objects.filter(
-            status='The travel order has been approved by the Regional Director',
+            status_outcome=TravelOrder.OUTCOME_APPROVED,
             rejected_by=None
         ).count()
         rejected = TravelOrder.objects.filter(
-            status='The travel order has been rejected by the Regional Director',
+            status_outcome=TravelOrder.OUTCOME_REJECTED,
+            status_stage='regional',
             rejected_by=user
         ).count()
 
@@ -1062,35 +1113,7 @@ class DirectorDashboardView(APIView):
             for i in reversed(range(12))
         ]
 
-        groups = {
-            "Pangasinan PO + CSCs": ['pangasinan_po', 'urdaneta_csc', 'sison_csc'],
-            "La Union PO + CSCs": ['launion_po', 'sudipen_csc', 'pugo_csc'],
-            "Ilocos Sur PO + CSCs": ['ilocossur_po', 'tagudin_csc', 'banayoyo_csc'],
-            "Ilocos Norte PO + CSCs": ['ilocosnorte_po', 'dingras_csc'],
-        }
-
-        result = defaultdict(lambda: {month: 0 for month in month_list})
-
-        orders = TravelOrder.objects.filter(submitted_at__isnull=False).annotate(
-            month=TruncMonth('submitted_at')
-        ).values('month', 'employees__employee_type').annotate(count=Count('id'))
-
-        for entry in orders:
-            month = entry['month'].strftime('%Y-%m')
-            emp_type = entry['employees__employee_type']
-            for group_name, types in groups.items():
-                if emp_type in types:
-                    result[group_name][month] += entry['count']
-
-        chart_data = {
-            "labels": month_list,
-            "datasets": [
-                {
-                    "label": group,
-                    "data": [result[group][month] for month in month_list]
-                } for group in groups
-            ]
-        }
+        chart_data = office_chart(month_list)
 
         return Response({
             "stats": {
@@ -1101,6 +1124,23 @@ class DirectorDashboardView(APIView):
             "chart": chart_data
         })
     
+class ApproverMetricsView(APIView):
+    """Queue depth, waiting time and daily decisions per approval stage and approver."""
+    permission_classes = [IsAuthenticated]
+    max_days = 365
+
+    def get(self, request):
+        if request.user.user_level not in ('admin', 'director'):
+            return Response({'error': 'Unauthorized'}, status=403)
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({'error': 'days must be an integer.'}, status=400)
+        if not 1 <= days <= self.max_days:
+            return Response({'error': f'days must be between 1 and {self.max_days}.'}, status=400)
+        return Response(approver_metrics(days))
+
+
 class TravelOrderReportView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -1139,43 +1179,93 @@ def download_evidence(request, travel_order_id):
         if not travel_order.evidence:
             return Response({'error': 'No evidence file found'}, status=status.HTTP_404_NOT_FOUND)
         
-        # Get the file path
-        file_path = travel_order.evidence.path
-        
-        if not os.path.exists(file_path):
+        response = serve_file(request, travel_order.evidence)
+        if response is None:
             return Response({'error': 'File not found on server'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Get file info
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        
-        # Determine content type
-        content_type, _ = mimetypes.guess_type(file_path)
-        if not content_type:
-            content_type = 'application/octet-stream'
-        
-        # Read file and create response
-        with open(file_path, 'rb') as file:
-            response = HttpResponse(file.read(), content_type=content_type)
-            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-            response['Content-Length'] = file_size
-            response['Access-Control-Allow-Origin'] = 'http://localhost:5173'
-            response['Access-Control-Allow-Credentials'] = 'true'
-            return response
+
+        response['Access-Control-Allow-Origin'] = 'http://localhost:5173'
+        response['Access-Control-Allow-Credentials'] = 'true'
+        return response
             
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_liquidation_document(request, pk, document):
+    """
+    Stream one of a liquidation's documents to its uploader, the travellers, or the reviewers
+    """
+    if document not in Liquidation.DOCUMENT_FIELDS:
+        return Response({'error': 'Unknown document'}, status=status.HTTP_404_NOT_FOUND)
+
+    liquidation = get_object_or_404(Liquidation.objects.select_related('travel_order'), pk=pk)
+
+    user = request.user
+    if user.user_level not in ['admin', 'director', 'bookkeeper', 'accountant']:
+        travel_order = liquidation.travel_order
+        if not (liquidation.uploaded_by_id == user.id
+                or travel_order.prepared_by_id == user.id
+                or travel_order.employees.filter(id=user.id).exists()):
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+
+    fieldfile = getattr(liquidation, document)
+    if not fieldfile:
+        return Response({'error': 'No file uploaded'}, status=status.HTTP_404_NOT_FOUND)
+
+    response = serve_file(request, fieldfile, as_attachment=False)
+    if response is None:
+        return Response({'error': 'File not found on server'}, status=status.HTTP_404_NOT_FOUND)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def signature_image(request, digest):
+    """
+    Serve a stored signature image. The URL is content-addressed, so clients may cache it forever.
+    """
+    etag = f'"{digest}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponse(status=304)
+    else:
+        # Only image types are served; a row stored with any other type is never sent back
+        image = get_object_or_404(SignatureImage, digest=digest, content_type__in=SignatureImage.CONTENT_TYPES)
+        response = HttpResponse(bytes(image.data), content_type=image.content_type)
+        response['Content-Disposition'] = f'inline; filename="{image.filename}"'
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
 # --- NOTIFICATION VIEWS ---
 class NotificationListView(APIView):
+    # The token's user id is all this needs, so the user row is not loaded
+    authentication_classes = [CookieJWTTokenUserAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        """Get all notifications for the current user"""
-        notifications = Notification.objects.filter(user=request.user)
-        serializer = NotificationSerializer(notifications, many=True)
-        return Response(serializer.data)
+        """
+        The current user's notifications, newest first, a page at a time: one
+        indexed query per page. `?since_id=` returns only the ones newer than that.
+        Answers 304 when the page is unchanged since the client's ETag.
+        """
+        notifications = NotificationSerializer.setup_eager_loading(
+            Notification.objects.filter(user_id=int(request.user.id))
+        )
+        paginator = NotificationFeedPagination()
+        page = paginator.paginate_queryset(notifications, request, view=self)
+        etag = paginator.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            serializer = NotificationSerializer(page, many=True)
+            response = paginator.get_paginated_response(serializer.data)
+        response['ETag'] = etag
+        # Browsers must revalidate, and shared caches must not keep another user's feed
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
 
 class NotificationMarkReadView(APIView):
@@ -1185,8 +1275,11 @@ class NotificationMarkReadView(APIView):
         """Mark a specific notification as read"""
         try:
             notification = Notification.objects.get(pk=pk, user=request.user)
+            was_unread = not notification.is_read
             notification.is_read = True
             notification.save()
+            if was_unread:
+                transaction.on_commit(lambda: unread_changed(request.user.id, -1))
             return Response({"message": "Notification marked as read"}, status=200)
         except Notification.DoesNotExist:
             return Response({"error": "Notification not found"}, status=404)
@@ -1197,14 +1290,52 @@ class NotificationMarkAllReadView(APIView):
 
     def patch(self, request):
         """Mark all notifications as read for the current user"""
-        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        marked = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        if marked:
+            transaction.on_commit(lambda: unread_changed(request.user.id, -marked))
         return Response({"message": "All notifications marked as read"}, status=200)
 
 
 class NotificationCountView(APIView):
+    # The token's user id is all this needs, so the user row is not loaded
+    authentication_classes = [CookieJWTTokenUserAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        """Get count of unread notifications"""
-        count = Notification.objects.filter(user=request.user, is_read=False).count()
-        return Response({"unread_count": count}, status=200)
\ No newline at end of file
+        """Get count of unread notifications, from the cached counter"""
+        # TokenUser ids come straight from the token claim, which may be a string
+        return Response({"unread_count": unread_count(int(request.user.id))}, status=200)
+
+
+def stream_user(request):
+    """The user and token of the request's access cookie, or None."""
+    try:
+        return CookieJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    Server-sent events for the signed-in user: their unread count on connect, then
+    each new notification and count change as it happens. Needs an ASGI server
+    (project1.asgi): under WSGI Django buffers the whole stream before sending any of it,
+    so there the client is refused and falls back to polling /notifications/count/.
+    """
+    authenticated = await sync_to_async(stream_user)(request)
+    if authenticated is None:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    if not push.SUPPORTED or not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Push is not available on this server.'}, status=503)
+
+    user, token = authenticated
+    count = await sync_to_async(unread_count)(user.id)
+    response = StreamingHttpResponse(
+        push.event_stream(user.id, [('unread_count', {'unread_count': count})], expires_at=token['exp']),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,178 @@
+"""
+Travel order approval transitions, shared by the single and bulk decision views.
+
+The functions here change orders in memory and queue the notifications a
+transition produces on a NotificationFanout; the views decide how to save them
+(one order, or many with bulk_update/bulk_create) and defer the fan-out to the
+outbox in the same transaction.
+
+Single-order transitions are written with save_decision(): a conditional UPDATE
+on the order's version, so of two requests acting on the same read only the
+first wins and the other gets TransitionConflict, which rolls back its
+transaction. No row stays locked past that one statement's transaction. A
+final approval claims the transition this way before it draws a travel order
+number, so a request that lost the race never touches the number sequence.
+
+Every transition also appends a TravelOrderEvent (transition_event()) in the
+same transaction, so the log holds exactly the transitions that committed.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import TravelOrder, TravelOrderEvent
+from .utils import generate_travel_order_numbers, get_approval_chain, get_next_head
+
+# Columns an approve or reject decision writes, for bulk_update
+DECISION_FIELDS = [
+    'status_code', 'status_stage', 'status_outcome', 'current_approver', 'approval_stage',
+    'travel_order_number', 'is_resubmitted', 'rejection_comment', 'rejected_by', 'rejected_at',
+]
+
+# Event actions that start a new pass up the chain, and those that move an order along it
+ROUND_START_ACTIONS = (TravelOrder.STATUS_PLACED, TravelOrder.STATUS_RESUBMITTED)
+APPROVAL_ACTIONS = (TravelOrder.STATUS_APPROVED, TravelOrder.STATUS_FINAL_APPROVED)
+
+
+class TransitionConflict(Exception):
+    """The order changed after it was read; the transition was not applied."""
+
+
+def save_decision(order, fields=DECISION_FIELDS):
+    """Write the transition made on `order`, or raise TransitionConflict if someone else got there first."""
+    if not order.save_transition(fields):
+        raise TransitionConflict(order.pk)
+
+
+def stage_at(chain, approval_stage):
+    """The office an order at `approval_stage` of `chain` waits on; past the chain's end, the director."""
+    return chain[approval_stage] if approval_stage < len(chain) else 'regional'
+
+
+def current_stage(order):
+    chain = get_approval_chain(order.prepared_by)
+    return chain, stage_at(chain, order.approval_stage)
+
+
+def approve(order, user):
+    """Move the order past the user's stage; returns the next head, or None on final approval."""
+    chain, stage = current_stage(order)
+    next_stage = order.approval_stage + 1
+    next_head = get_next_head(chain, next_stage, current_user=user)
+
+    if next_head:
+        order.set_status(TravelOrder.STATUS_APPROVED, stage)
+        order.current_approver = next_head
+        order.approval_stage = next_stage
+    else:
+        # ✅ Final approval by Regional Director
+        order.current_approver = None
+        order.set_status(TravelOrder.STATUS_FINAL_APPROVED, stage)
+
+    order.is_resubmitted = False
+    return next_head
+
+
+def reject(order, user, comment):
+    _, stage = current_stage(order)
+    order.set_status(TravelOrder.STATUS_REJECTED, stage)
+    order.rejection_comment = comment
+    order.rejected_by = user
+    order.rejected_at = timezone.now()
+    order.current_approver = None
+
+
+def assign_travel_order_numbers(orders):
+    """
+    Give finally approved orders without a number the next R1-YYYYMM-NNNN numbers, in order,
+    and return the orders that got one.
+    Must run in the transaction that saves the orders, so a rollback returns the numbers.
+    """
+    pending = [
+        order for order in orders
+        if order.status_code == TravelOrder.STATUS_FINAL_APPROVED and not order.travel_order_number
+    ]
+    if not pending:
+        return pending
+
+    for order, number in zip(pending, generate_travel_order_numbers(len(pending))):
+        order.travel_order_number = number
+    return pending
+
+
+def notify_approval(fanout, order, user, next_head):
+    """Queue the notifications of an approval; `next_head` is None on final approval."""
+    if next_head:
+        # Notify the next approver
+        fanout.add(
+            next_head, order, 'travel_approved',
+            title='New Travel Request for Approval',
+            message=f'A travel request to {order.destination} by {order.prepared_by.get_full_name()} is ready for your approval.'
+        )
+    elif order.prepared_by:
+        # Final approval - notify the employee, instead of the plain "approved by" below
+        fanout.add(
+            order.prepared_by, order, 'travel_final_approved',
+            title='Travel Request Finally Approved',
+            message=f'Your travel request to {order.destination} has been finally approved and travel order number {order.travel_order_number} has been generated.'
+        )
+
+    # Notify the employee who filed the request
+    if order.prepared_by:
+        fanout.add(
+            order.prepared_by, order, 'travel_approved',
+            title=f'Travel Request Approved by {user.get_full_name()}',
+            message=f'Your travel request to {order.destination} has been approved by {user.get_full_name()}.'
+        )
+
+
+def transition_event(order, actor, comment='', action=None):
+    """The (unsaved) event log row for the transition just made on `order`; `action` defaults to its new status."""
+    return TravelOrderEvent(
+        travel_order=order,
+        actor=actor,
+        action=order.status_code if action is None else action,
+        stage=order.status_stage,
+        comment=comment or '',
+    )
+
+
+def previous_approvers(orders):
+    """
+    {order id: [approver ids, newest first]} for the orders' current round, i.e. since
+    they were last placed or resubmitted, read from the event log in one query.
+    """
+    approvers = defaultdict(list)
+    round_started = set()
+    rows = TravelOrderEvent.objects.filter(
+        travel_order__in=orders,
+        action__in=[*ROUND_START_ACTIONS, *APPROVAL_ACTIONS],
+    ).order_by('-created_at', '-id').values_list('travel_order_id', 'action', 'actor_id')
+    for order_id, action, actor_id in rows:
+        if order_id in round_started:
+            continue
+        if action in ROUND_START_ACTIONS:
+            round_started.add(order_id)
+        elif actor_id is not None:
+            approvers[order_id].append(actor_id)
+    return approvers
+
+
+def notify_rejection(fanout, order, user, comment, approver_ids):
+    """Queue the notifications of a rejection, to the filer and the round's earlier approvers."""
+    # Notify the employee who filed the request
+    if order.prepared_by:
+        fanout.add(
+            order.prepared_by, order, 'travel_rejected',
+            title=f'Travel Request Rejected by {user.get_full_name()}',
+            message=f'Your travel request to {order.destination} has been rejected by {user.get_full_name()}. Reason: {comment}'
+        )
+
+    # Notify previous approvers that their approved request was rejected
+    for approver_id in approver_ids:
+        if approver_id != user.id:  # Don't notify the current rejector
+            fanout.add(
+                approver_id, order, 'travel_rejected_by_next_approver',
+                title='Your Approved Travel Request was Rejected',
+                message=f'The travel request to {order.destination} that you approved has been rejected by {user.get_full_name()}. Reason: {comment}'
+            )
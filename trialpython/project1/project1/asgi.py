@@ -3,6 +3,16 @@ ASGI config for project1 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this entry point so notification streams work; under
+WSGI they are refused and the frontend polls instead. For example, with
+uvicorn installed:
+
+    gunicorn project1.asgi:application -k uvicorn.workers.UvicornWorker --workers 4
+
+An open stream holds only a coroutine, not a worker thread. A proxy in front
+must not buffer text/event-stream responses (the view sets X-Accel-Buffering: no
+for nginx) and its read timeout must exceed NOTIFICATION_STREAM_HEARTBEAT.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -121,6 +123,9 @@ SIMPLE_JWT = {
 
 
 WSGI_APPLICATION = 'project1.wsgi.application'
+# Notification streams (/api1/notifications/stream/) need the ASGI entry point; see project1/asgi.py.
+# Under WSGI the stream answers 503 and clients poll the unread count instead.
+ASGI_APPLICATION = 'project1.asgi.application'
 
 
 # Database
@@ -137,6 +142,16 @@ DATABASES = {
     }
 }
 
+# Cache shared by every web worker, ASGI worker and management command (process_outbox included).
+# Unread-notification counts (api1.notifications) are adjusted in place with incr/decr, so a
+# per-process cache such as the LocMemCache default would leave each process with its own counts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://127.0.0.1:6379/1',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -190,5 +205,42 @@ FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
-
-
+# Protected file downloads (travel order evidence, liquidation documents)
+# None streams the file from Django. Set to 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache/lighttpd) to let the web server send it after the
+# permission check; X-Accel-Redirect paths are FILE_DOWNLOAD_ACCEL_PREFIX + file name.
+FILE_DOWNLOAD_OFFLOAD = None
+FILE_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Seconds a process keeps its cached directory of heads and directors (api1.utils.get_head_directory).
+# Saves through the ORM invalidate it at once; the TTL covers changes made by other processes.
+HEAD_DIRECTORY_TTL = 300
+
+# Directory where each ASGI worker with open notification streams binds its socket (api1.push);
+# every process that saves notifications must see the same directory.
+NOTIFICATION_PUSH_DIR = os.path.join(tempfile.gettempdir(), 'project1-push')
+# Seconds between keep-alive comments on an idle notification stream
+NOTIFICATION_STREAM_HEARTBEAT = 20
+
+# Seconds a cached unread-notification count (api1.notifications) lives before it is recounted.
+UNREAD_COUNT_TTL = 600
+
+# Transactional outbox (api1.outbox), drained by `manage.py process_outbox`: seconds an idle
+# worker waits before polling again, attempts before a failing message is left for an admin,
+# and the first retry delay in seconds (doubled on each further failure).
+OUTBOX_POLL_INTERVAL = 1
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_DELAY = 30
+
+# Days a read notification is kept before the prune_notifications command deletes it
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Outgoing mail (the daily notification digest, api1.digest). To run the digest without a
+# mail server, use 'django.core.mail.backends.filebased.EmailBackend' with EMAIL_FILE_PATH,
+# or the locmem backend.
+EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Notifications listed in one digest email; the rest are counted
+NOTIFICATION_DIGEST_MAX_ITEMS = 50
+
+# Seconds the approver queue metrics (api1.metrics.approver_metrics) are served from the cache.
+APPROVER_METRICS_TTL = 60
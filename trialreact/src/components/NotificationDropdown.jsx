@@ -10,7 +10,9 @@ const NotificationDropdown = () => {
     unreadCount, 
     markAsRead, 
     markAllAsRead, 
-    loading 
+    loading,
+    hasMore,
+    loadMoreNotifications
   } = useNotifications();
 
   // Close dropdown when clicking outside
@@ -145,6 +147,14 @@ const NotificationDropdown = () => {
                 </div>
               ))
             )}
+            {!loading && hasMore && (
+              <button
+                onClick={loadMoreNotifications}
+                className="w-full p-3 text-sm text-blue-600 hover:bg-gray-50 text-center"
+              >
+                Load older notifications
+              </button>
+            )}
           </div>
 
           {/* Footer */}
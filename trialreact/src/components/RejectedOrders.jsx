@@ -10,11 +10,18 @@ export default function RejectedOrders() {
   const navigate = useNavigate();
   const [selectedOrder, setSelectedOrder] = useState(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
+  // Cursor pagination state (next/previous links come from the API)
+  const [nextPage, setNextPage] = useState(null);
+  const [previousPage, setPreviousPage] = useState(null);
+  const ordersPerPage = 10;
 
-  const fetchRejectedOrders = async () => {
+  // The server filters to rejected orders, so each page is one small query
+  const fetchRejectedOrders = async (url = `/my-travel-orders/?status_outcome=rejected&page_size=${ordersPerPage}`) => {
     try {
-      const res = await axios.get('/my-travel-orders/');
-      setOrders(res.data.filter(order => order.status.toLowerCase().includes('rejected')));
+      const response = await axios.get(url);
+      setOrders(response.data.results);
+      setNextPage(response.data.next);
+      setPreviousPage(response.data.previous);
     } catch (err) {
       console.error('Failed to fetch rejected orders:', err);
     }
@@ -24,6 +31,18 @@ export default function RejectedOrders() {
     fetchRejectedOrders();
   }, []);
 
+  // List rows are summaries; load the full order (itinerary, fund, ...) before editing
+  const openEditModal = async (orderId) => {
+    try {
+      const res = await axios.get(`/travel-orders/${orderId}/`);
+      setSelectedOrder(res.data);
+      setIsModalOpen(true);
+    } catch (err) {
+      console.error('Failed to load travel order:', err);
+      toast.error('Failed to load travel order.');
+    }
+  };
+
   return (
     <Layout>
       <div className="max-w-6xl mx-auto p-6 mt-10 bg-white rounded-lg shadow-md">
@@ -64,10 +83,7 @@ export default function RejectedOrders() {
                     </td>
                     <td className="px-6 py-4 space-x-2">
                       <button
-                        onClick={() => {
-                          setSelectedOrder(order);
-                          setIsModalOpen(true);
-                        }}
+                        onClick={() => openEditModal(order.id)}
                         className="bg-blue-800 hover:bg-blue-700 text-white py-2 px-4 rounded-md text-sm font-medium"
                       >
                         Edit & Resubmit
@@ -77,6 +93,25 @@ export default function RejectedOrders() {
                 ))}
               </tbody>
             </table>
+            {/* Pagination Controls */}
+            {(previousPage || nextPage) && (
+              <div className="flex justify-end items-center gap-2 px-6 py-4">
+                <button
+                  onClick={() => fetchRejectedOrders(previousPage)}
+                  disabled={!previousPage}
+                  className="px-3 py-1 rounded border text-sm disabled:opacity-50"
+                >
+                  Prev
+                </button>
+                <button
+                  onClick={() => fetchRejectedOrders(nextPage)}
+                  disabled={!nextPage}
+                  className="px-3 py-1 rounded border text-sm disabled:opacity-50"
+                >
+                  Next
+                </button>
+              </div>
+            )}
           </div>
         ) : (
           <p className="text-center text-gray-500 text-lg py-16">No rejected orders found.</p>
@@ -90,7 +125,7 @@ export default function RejectedOrders() {
       setIsModalOpen(false);
       setSelectedOrder(null);
     }}
-    fetchOrders={fetchRejectedOrders}
+    fetchOrders={() => fetchRejectedOrders()}
     mode="edit"
     existingOrder={selectedOrder}
     onRemoveRejected={(id) => {
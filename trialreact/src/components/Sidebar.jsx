@@ -21,39 +21,27 @@ const Sidebar = ({ fetchOrders }) => {
     if (fetchOrders) await fetchOrders();
   };
 
-  // Fetch pending approvals count using axios
+  // Badge counts come from the user's dashboard counter row, one small request
   useEffect(() => {
-  const fetchRejectedCount = async () => {
-    if (user && (user.user_level === 'employee' || user.user_level === 'head')) {
+    const fetchCounters = async () => {
+      if (!user || !['employee', 'head', 'director'].includes(user.user_level)) {
+        return;
+      }
       try {
-        const res = await axios.get('/my-travel-orders/');
-        const rejected = res.data.filter(order =>
-          order.status && order.status.toLowerCase().includes('rejected')
-        );
-        setRejectedCount(rejected.length);
+        const res = await axios.get('/dashboard-counters/');
+        if (user.user_level === 'employee' || user.user_level === 'head') {
+          setRejectedCount(res.data.rejected);
+        }
+        if (user.user_level === 'head' || user.user_level === 'director') {
+          setPendingCount(res.data.pending_approvals);
+        }
       } catch (err) {
-        console.error('Failed to fetch rejected orders:', err);
+        console.error('Failed to fetch dashboard counters:', err);
         setRejectedCount(0);
-      }
-    }
-  };
-
-  fetchRejectedCount();
-}, [user]);
-
-  useEffect(() => {
-    const fetchPendingApprovals = async () => {
-      if (user && (user.user_level === 'head' || user.user_level === 'director')) {
-        try {
-          const res = await axios.get('/my-pending-approvals/', { withCredentials: true });
-          setPendingCount(res.data.length);
-        } catch (err) {
-          console.error('Failed to fetch pending approvals:', err);
-          setPendingCount(0);
-        }
+        setPendingCount(0);
       }
     };
-    fetchPendingApprovals();
+    fetchCounters();
   }, [user]);
 
   return (
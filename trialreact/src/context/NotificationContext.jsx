@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useState, useEffect } from 'react';
+import React, { createContext, useContext, useState, useEffect, useRef } from 'react';
 import axios from '../api/axios';
 import { useAuth } from './AuthContext';
 
@@ -16,17 +16,42 @@ export const NotificationProvider = ({ children }) => {
   const [notifications, setNotifications] = useState([]);
   const [unreadCount, setUnreadCount] = useState(0);
   const [loading, setLoading] = useState(false);
+  const [nextPage, setNextPage] = useState(null);
+  // Newest notification id we hold, so later fetches ask only for what is newer
+  const latestId = useRef(null);
   const { user } = useAuth();
 
-  // Fetch notifications
+  const showPage = (data) => {
+    setNotifications(data.results);
+    setNextPage(data.next);
+    latestId.current = data.results.length ? data.results[0].id : null;
+  };
+
+  // Fetch notifications: the first page, or only the new ones once we have it.
+  // The browser revalidates with the ETag, so an unchanged page costs a 304.
   const fetchNotifications = async () => {
     if (!user) {
       return;
     }
     try {
-      setLoading(true);
-      const response = await axios.get('/notifications/');
-      setNotifications(response.data);
+      // Only the first page shows the loading state; deltas merge in quietly
+      setLoading(latestId.current === null);
+      if (latestId.current === null) {
+        const response = await axios.get('/notifications/');
+        showPage(response.data);
+        return;
+      }
+      const response = await axios.get('/notifications/', { params: { since_id: latestId.current } });
+      const { results, truncated } = response.data;
+      if (truncated) {
+        // Too many arrived to merge: start over from the top
+        const first = await axios.get('/notifications/');
+        showPage(first.data);
+      } else if (results.length) {
+        const ids = new Set(results.map(n => n.id));
+        setNotifications(prev => [...results, ...prev.filter(n => !ids.has(n.id))]);
+        latestId.current = results[0].id;
+      }
     } catch (error) {
       console.error('Error fetching notifications:', error);
     } finally {
@@ -34,6 +59,20 @@ export const NotificationProvider = ({ children }) => {
     }
   };
 
+  // Append the next page of older notifications
+  const loadMoreNotifications = async () => {
+    if (!nextPage) {
+      return;
+    }
+    try {
+      const response = await axios.get(nextPage);
+      setNotifications(prev => [...prev, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Error loading more notifications:', error);
+    }
+  };
+
   // Fetch unread count
   const fetchUnreadCount = async () => {
     if (!user) {
@@ -95,27 +134,86 @@ export const NotificationProvider = ({ children }) => {
       console.log('NotificationContext: No user, clearing notifications');
       // Clear notifications when user logs out
       setNotifications([]);
+      setNextPage(null);
+      latestId.current = null;
       setUnreadCount(0);
     }
   }, [user]);
 
-  // Poll for new notifications every 30 seconds - only when authenticated
+  // Live updates pushed by the server over server-sent events. Falls back to
+  // polling the count every 30 seconds if the stream is not available.
   useEffect(() => {
     if (!user) {
       return;
     }
-    
-    const interval = setInterval(() => {
-      fetchUnreadCount();
-    }, 30000);
 
-    return () => clearInterval(interval);
+    let source = null;
+    let pollInterval = null;
+    let stopped = false;
+
+    const startPolling = () => {
+      if (!pollInterval) {
+        pollInterval = setInterval(fetchUnreadCount, 30000);
+      }
+    };
+
+    const connect = () => {
+      source = new EventSource(`${axios.defaults.baseURL}/notifications/stream/`, { withCredentials: true });
+
+      source.addEventListener('unread_count', (event) => {
+        setUnreadCount(JSON.parse(event.data).unread_count);
+      });
+
+      source.addEventListener('notification', (event) => {
+        const { notification, unread_count } = JSON.parse(event.data);
+        setUnreadCount(unread_count);
+        if (notification.id) {
+          setNotifications(prev => [notification, ...prev.filter(n => n.id !== notification.id)]);
+          latestId.current = Math.max(latestId.current || 0, notification.id);
+        } else {
+          // The server could not tell us the new row's id; fetch what is new
+          fetchNotifications();
+        }
+      });
+
+      // The access cookie ran out: refresh it and reconnect
+      source.addEventListener('expired', async () => {
+        source.close();
+        try {
+          await axios.post('/refresh/');
+        } catch (error) {
+          console.error('Error refreshing token for notifications:', error);
+        }
+        if (!stopped) {
+          connect();
+        }
+      });
+
+      source.onerror = () => {
+        // The browser retries dropped connections itself; a closed source means it gave up
+        if (source.readyState === EventSource.CLOSED) {
+          startPolling();
+        }
+      };
+    };
+
+    connect();
+
+    return () => {
+      stopped = true;
+      if (source) {
+        source.close();
+      }
+      clearInterval(pollInterval);
+    };
   }, [user]);
 
   const value = {
     notifications,
     unreadCount,
     loading,
+    hasMore: Boolean(nextPage),
+    loadMoreNotifications,
     markAsRead,
     markAllAsRead,
     refreshNotifications,
@@ -5,15 +5,18 @@ import { useNavigate } from 'react-router-dom';
 
 const EmployeeTravel = () => {
     const [orders, setOrders] = useState([]);
-    // Pagination state
-    const [currentPage, setCurrentPage] = useState(1);
+    // Cursor pagination state (next/previous links come from the API)
+    const [nextPage, setNextPage] = useState(null);
+    const [previousPage, setPreviousPage] = useState(null);
     const navigate = useNavigate();
     const ordersPerPage = 6;
     
-      const fetchOrders = async () => {
+      const fetchOrders = async (url = `/admin/travels/?page_size=${ordersPerPage}`) => {
         try {
-          const response = await axios.get('/admin/travels/');
-          setOrders(response.data);
+          const response = await axios.get(url);
+          setOrders(response.data.results);
+          setNextPage(response.data.next);
+          setPreviousPage(response.data.previous);
         } catch (error) {
           console.error('Error fetching users:', error);
         }
@@ -23,10 +26,7 @@ const EmployeeTravel = () => {
         fetchOrders();
       }, []);
     
-    // Pagination logic
-    const totalPages = Math.ceil(orders.length / ordersPerPage);
-    const paginatedOrders = orders.slice((currentPage - 1) * ordersPerPage, currentPage * ordersPerPage);
-    const goToPage = (page) => setCurrentPage(page);
+    const paginatedOrders = orders;
 
     // Dummy handleViewOrder for now (should be implemented as needed)
     const handleViewOrder = (order) => {
@@ -98,27 +98,18 @@ const EmployeeTravel = () => {
             </tbody>
           </table>
           {/* Pagination Controls */}
-          {totalPages > 1 && (
+          {(previousPage || nextPage) && (
             <div className="flex justify-end items-center gap-2 px-6 py-4">
               <button
-                onClick={() => goToPage(currentPage - 1)}
-                disabled={currentPage === 1}
+                onClick={() => fetchOrders(previousPage)}
+                disabled={!previousPage}
                 className="px-3 py-1 rounded border text-sm disabled:opacity-50"
               >
                 Prev
               </button>
-              {Array.from({ length: totalPages }, (_, i) => i + 1).map((page) => (
-                <button
-                  key={page}
-                  onClick={() => goToPage(page)}
-                  className={`px-3 py-1 rounded border text-sm ${page === currentPage ? 'bg-blue-800 text-white border-blue-800' : 'bg-white text-blue-800 border-blue-200 hover:bg-blue-50'}`}
-                >
-                  {page}
-                </button>
-              ))}
               <button
-                onClick={() => goToPage(currentPage + 1)}
-                disabled={currentPage === totalPages}
+                onClick={() => fetchOrders(nextPage)}
+                disabled={!nextPage}
                 className="px-3 py-1 rounded border text-sm disabled:opacity-50"
               >
                 Next
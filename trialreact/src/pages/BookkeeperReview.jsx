@@ -82,17 +82,17 @@ export default function BookkeeperReview() {
           </h3>
           <ul className="space-y-2 list-disc pl-5 text-blue-600">
             <li>
-              <a href={fullURL(data.certificate_of_travel)} target="_blank" rel="noopener noreferrer">
+              <a href={data.document_urls?.certificate_of_travel ?? fullURL(data.certificate_of_travel)} target="_blank" rel="noopener noreferrer">
                 Certificate of Travel Completed
               </a>
             </li>
             <li>
-              <a href={fullURL(data.certificate_of_appearance)} target="_blank" rel="noopener noreferrer">
+              <a href={data.document_urls?.certificate_of_appearance ?? fullURL(data.certificate_of_appearance)} target="_blank" rel="noopener noreferrer">
                 Certificate of Appearance
               </a>
             </li>
             <li>
-              <a href={fullURL(data.after_travel_report)} target="_blank" rel="noopener noreferrer">
+              <a href={data.document_urls?.after_travel_report ?? fullURL(data.after_travel_report)} target="_blank" rel="noopener noreferrer">
                 After Travel Report
               </a>
             </li>